@@ -6,16 +6,21 @@ import sys
 from pathlib import Path
 
 import baselog
+from flask import Flask
 
+from .bootstrap import BOOT_SERVICES, Bootstrap
 from .compose import Compose
 from .config import Config
 from .flaskapp import create_app
+from .server import SwitchboxServer
+from .services import LEADER_LOCK_FILENAME, BackgroundServices, LeaderLock
 
 
-def boot_switchbox(logger: logging.Logger, config: Config):
+def boot_switchbox(logger: logging.Logger, config: Config) -> bool:
     """
     this function starts switchbox itself from the internal compose file in the
-    subdeployment directory; this is the 2nd stage of the bootstrap process
+    subdeployment directory; this is the 2nd stage of the bootstrap process.
+    returns whether every service came up
     """
     c = Compose(
         project_dir=Path(os.path.join(os.path.dirname(__file__), "subdeployment")),
@@ -23,10 +28,12 @@ def boot_switchbox(logger: logging.Logger, config: Config):
         default_env={"TRAEFIK_PORT": str(config.port)},
     )
 
-    for service in ("ui", "api", "ares", "cdmdb"):
-        logger.info("starting %s", service)
-        c.up(service)
+    timings = Bootstrap(c, BOOT_SERVICES, timeout=config.boot_timeout).run()
+    if failed := [t.service for t in timings if t.error]:
+        logger.error("services failed to start: %s", ", ".join(failed))
+        return False
     logger.info("background services started; exiting")
+    return True
 
 
 def main() -> int:
@@ -44,8 +51,7 @@ def main() -> int:
 
     if not config.apimode:
         # start the other containers and exit
-        boot_switchbox(logger, config)
-        return 0
+        return 0 if boot_switchbox(logger, config) else 1
 
     # if we're still here we're in API mode, meaning we've been started from
     # the subdeployment directory; in API mode we act as a backing service for
@@ -54,10 +60,32 @@ def main() -> int:
     app = create_app(config)
 
     # if you want to change which port the end-users browse to, see config.port
-    app.run(host="0.0.0.0", port=8000, debug=config.debug)  # nosec B104
+    if config.server == "gunicorn":
+        SwitchboxServer(app, config).run()
+        return 0
 
+    serve_flask(app, config)
     return 0
 
 
+def serve_flask(app: Flask, config: Config):
+    """
+    serve the app with flask's development server; the background services
+    are run under the same leader lock as with gunicorn and, with the debug
+    reloader, only in the child process which serves the app (and which is
+    replaced on every reload), never in the parent watching for changes
+    """
+    services = BackgroundServices(config)
+    leader = LeaderLock(config.job_dir / LEADER_LOCK_FILENAME, services.start)
+    if not config.debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        leader.start()
+    try:
+        app.run(host="0.0.0.0", port=8000, debug=config.debug)  # nosec B104
+    finally:
+        if leader.acquired.is_set():
+            services.stop()
+        leader.release()
+
+
 if __name__ == "__main__":
     sys.exit(main())
@@ -1,7 +1,10 @@
 """flask bleuprints representing various parts of the API"""
 
 from .healthz import healthz
+from .images import images
 from .job import job
+from .metrics import metrics
 from .params import params
+from .storage import storage
 
-__all__ = ["healthz", "params", "job"]
+__all__ = ["healthz", "images", "params", "job", "metrics", "storage"]
@@ -0,0 +1,38 @@
+"""images endpoint reporting the pull state of the job service images"""
+
+import logging
+from pathlib import Path
+
+from flask import Blueprint, current_app
+
+from ..images import WARM_SERVICES, ImageState, load_image_states, now
+
+logger = logging.getLogger(__name__)
+images = Blueprint("images", __name__)
+
+
+@images.route("/", methods=["GET"])
+def get_images():
+    """
+    the state of each job service image: the pinned digest, when the image was
+    built and last pulled, and the age (in seconds) of both
+    """
+    states = load_image_states(Path(current_app.config["JOB_DIR"]))
+    current = now()
+    result = []
+    for service in WARM_SERVICES:
+        state = states.get(service) or ImageState(service=service)
+        result.append(
+            {
+                **state.model_dump(mode="json"),
+                "age": (
+                    (current - state.created).total_seconds() if state.created else None
+                ),
+                "since_pull": (
+                    (current - state.pulled_at).total_seconds()
+                    if state.pulled_at
+                    else None
+                ),
+            }
+        )
+    return {"images": result}
@@ -1,28 +1,128 @@
 """rest endpoint for CRUD operations on docker container jobs"""
 
+import codecs
+import datetime
 import logging
-from functools import cache
+import re
 from pathlib import Path
+from typing import Optional
 
-from flask import Blueprint, current_app, request
+from flask import (
+    Blueprint,
+    Response,
+    abort,
+    current_app,
+    make_response,
+    request,
+    stream_with_context,
+    url_for,
+)
+from werkzeug.http import is_resource_modified
 
-from ..models.job import Job, get_job, list_jobs
-from ..utils.data import get_etl_input_params
+from ..models.job import (
+    ACTIVE_STATUSES,
+    Job,
+    JobBusyError,
+    JobDir,
+    JobItem,
+    ensure_fresh_statuses,
+    get_catalog,
+    get_job,
+    query_jobs,
+    recent_phase_stats,
+)
+from ..scheduler import JobQueue, launch_executor, prepare_executor
+from ..utils.blobs import BlobStore, job_usage
+from ..utils.logindex import LogIndex, level_code
+from ..utils.upload import UploadError, ingest_multipart
+from .params import current_param_spec
 
 logger = logging.getLogger(__name__)
 job = Blueprint("job", __name__)
 
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+MAX_LOG_CONTEXT = 50
+
 
-@cache
 def base_job_dir() -> Path:
     """helper function which returns the configured JOB_DIR"""
     return Path(current_app.config["JOB_DIR"])
 
 
+def existing_job_dir(job_id: str) -> JobDir:
+    """the JobDir of an existing job; aborts with a 404 for unknown job ids"""
+    if job_id.startswith(".") or not (base_job_dir() / job_id).is_dir():
+        abort(404)
+    return JobDir.open(base_job_dir(), job_id)
+
+
+def datetime_arg(name: str) -> Optional[datetime.datetime]:
+    """parse an ISO 8601 query parameter; aborts with a 400 if it is malformed"""
+    if (value := request.args.get(name)) is None:
+        return None
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except ValueError:
+        abort(400, f"{name} must be an ISO 8601 date/time")
+
+
 @job.route("/", methods=["GET"])
 def get_job_list():
-    """list jobs currently on the system"""
-    return {"jobs": [m.model_dump() for m in list_jobs(base_job_dir())]}
+    """
+    list jobs currently on the system, one page at a time, ordered by start
+    time; the query parameters are:
+      limit: page size (default 100, max 1000)
+      cursor: the next_cursor value of the previous page
+      order: asc (default) or desc
+      status: comma-separated statuses to include
+      source_name: only jobs with this source name
+      since, until: ISO 8601 bounds on the job start time
+      fields: comma-separated JobItem fields to include
+    responses carry an ETag & Last-Modified which change whenever any job does
+    """
+    base = base_job_dir()
+    ensure_fresh_statuses(base)
+    changed, count = get_catalog(base).version()
+    etag = f"{changed:.6f}-{count}"
+    last_modified = datetime.datetime.fromtimestamp(changed, tz=datetime.timezone.utc)
+    if not is_resource_modified(
+        request.environ, etag=etag, last_modified=last_modified
+    ):
+        response = Response(status=304)
+    else:
+        fields = None
+        if field_arg := request.args.get("fields"):
+            fields = set(field_arg.split(","))
+            if unknown := fields - set(JobItem.model_fields):
+                abort(400, f"unknown field(s): {', '.join(sorted(unknown))}")
+        statuses = request.args.get("status", "")
+        try:
+            page = query_jobs(
+                base,
+                limit=min(
+                    max(request.args.get("limit", DEFAULT_PAGE_SIZE, type=int), 1),
+                    MAX_PAGE_SIZE,
+                ),
+                cursor=request.args.get("cursor"),
+                statuses=[s for s in statuses.split(",") if s],
+                source_name=request.args.get("source_name"),
+                since=datetime_arg("since"),
+                until=datetime_arg("until"),
+                descending=request.args.get("order", "asc") == "desc",
+            )
+        except ValueError as err:
+            abort(400, str(err))
+        response = make_response(
+            {
+                "jobs": [m.model_dump(include=fields) for m in page.jobs],
+                "next_cursor": page.next_cursor,
+            }
+        )
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.headers["Cache-Control"] = "no-cache"
+    return response
 
 
 @job.route("/", methods=["POST"])
@@ -31,38 +131,269 @@ def create_job():
 
     # not specifying a job_id means we make a new job (and job_dir)
     newjob = Job.open(base_path=base_job_dir())
+    newjob.job_dir.timeline().record("upload")
+
+    csv_columns = current_param_spec().csv_columns
+
+    boundary = request.mimetype_params.get("boundary")
+    if request.mimetype == "multipart/form-data" and boundary:
+        # csv parts are streamed straight into the job's data directory, with
+        # their headers checked as soon as they arrive
+        try:
+            request_data, inputs = ingest_multipart(
+                request.stream,
+                boundary.encode("latin-1"),
+                newjob.job_dir.data_subdir,
+                csv_columns,
+            )
+        except UploadError as err:
+            logger.warning("rejecting upload for job %s: %s", newjob.job_id, err)
+            newjob.job_dir.remove()
+            return {"error": str(err), "param": err.param_name}, 400
+        except Exception:
+            # (e.g. the client went away); the job must not be left behind
+            newjob.job_dir.remove()
+            raise
+    else:
+        request_data, inputs = request.form.to_dict(), []
+
+    # the priority is for the queue, it is not passed on to the etl
+    try:
+        priority = int(request_data.pop("priority", 0) or 0)
+    except ValueError:
+        newjob.job_dir.remove()
+        return {"error": "priority must be an integer", "param": "priority"}, 400
+    # as is force, which reruns a job whose results are cached
+    force = request_data.pop("force", "").lower() in ("1", "true", "yes", "on")
+
+    if current_app.config["DEDUP_INPUTS"]:
+        # identical uploads (e.g. of resubmitted jobs) share one copy on disk
+        store = BlobStore.for_job_dir(base_job_dir())
+        for item in inputs:
+            store.adopt(Path(item.path), item.sha256)
 
-    request_data = request.form.to_dict()
     newjob.job_dir.set_config(request_data)
+    newjob.job_dir.set_inputs(inputs)
+
+    # queue the job; if an etl slot is free it is launched in the background,
+    # the launch's progress (or failure) is reported through the job status
+    queue = JobQueue(
+        base_job_dir(),
+        max_running=current_app.config["MAX_CONCURRENT_ETL"],
+        native=current_app.config["NATIVE_LAUNCHER"],
+        executor=launch_executor(current_app.config["LAUNCH_WORKERS"]),
+        preflight=current_app.config["PREFLIGHT"],
+        params_file=(
+            Path(current_app.config["PARAMS_FILE"])
+            if current_app.config.get("PARAMS_FILE")
+            else None
+        ),
+        normalize=current_app.config["NORMALIZE_INPUTS"],
+        columnar=current_app.config["COLUMNAR_INPUTS"],
+        dedup=current_app.config["DEDUP_INPUTS"],
+        result_cache=current_app.config["RESULT_CACHE"],
+        vocab_dir=(
+            Path(current_app.config["VOCAB_DIR"])
+            if current_app.config.get("VOCAB_DIR")
+            else None
+        ),
+        preparer=prepare_executor(current_app.config["PREPARE_WORKERS"]),
+    )
+    status = queue.submit(newjob, priority=priority, force=force)
 
-    params = get_etl_input_params()
-    for param_name, param_value in params.params.items():
-        logger.debug("incoming param %s (%s)", param_name, param_value.param_type)
-        if param_value.param_type == "csv":
-            if (file_data := request.files.get(param_name)) is not None:
-                output_path = newjob.job_dir.data_subdir / f"{param_name}.csv"
-                logger.debug("incoming file %s; writing to %s", param_name, output_path)
-                file_data.save(output_path)
+    if status.status == "cached":
+        # nothing to run, the results are those of the earlier job
+        response = make_response(
+            {"job_id": newjob.job_id, "status": status.model_dump()}, 201
+        )
+        response.headers["Content-Location"] = url_for(
+            ".read_job", job_id=status.cached_from
+        )
+    else:
+        response = make_response(
+            {"job_id": newjob.job_id, "status": status.model_dump()}, 202
+        )
+    response.headers["Location"] = url_for(".read_job", job_id=newjob.job_id)
+    return response
 
-    # start the job
-    status = newjob.start()
 
-    return {"job_id": newjob.job_id, "status": status.model_dump()}
+@job.route("/timeline", methods=["GET"])
+def read_phase_stats():
+    """
+    percentiles of the time jobs spend in each phase, across the most recently
+    started jobs (the limit query parameter, default 100, max 1000)
+    """
+    limit = min(
+        max(request.args.get("limit", DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE
+    )
+    stats = recent_phase_stats(base_job_dir(), limit)
+    return {"limit": limit, "phases": [item.model_dump() for item in stats]}
 
 
 @job.route("/<job_id>", methods=["GET"])
 def read_job(job_id: str):
     """get the contents of a job"""
-    return get_job(base_job_dir(), job_id).model_dump()
+    existing_job_dir(job_id)
+    return get_job(
+        base_job_dir(), job_id, csv_params=list(current_param_spec().csv_columns)
+    ).model_dump()
+
+
+@job.route("/<job_id>/preflight", methods=["GET"])
+def read_job_preflight(job_id: str):
+    """the pre-flight validation report of the job's input files"""
+    if (report := existing_job_dir(job_id).get_preflight()) is None:
+        abort(404, "the job's inputs were not validated")
+    return report.model_dump()
+
+
+@job.route("/<job_id>/usage", methods=["GET"])
+def read_job_usage(job_id: str):
+    """the disk usage of the job's files, including what it shares with others"""
+    return job_usage(existing_job_dir(job_id).host_path).model_dump()
+
+
+@job.route("/<job_id>/log", methods=["GET"])
+def read_job_log(job_id: str):
+    """
+    stream the job's log; the range served is selected by the query parameters
+    offset & length (bytes), line (zero-based line number) or tail (last N
+    lines). with follow=1 the response is a server-sent event stream which
+    pushes newly appended log data for as long as the job is running
+    """
+    job_dir = existing_job_dir(job_id)
+    reader = job_dir.log_reader()
+
+    if (tail := request.args.get("tail", type=int)) is not None:
+        offset = reader.tail_offset(tail)
+    elif (line := request.args.get("line", type=int)) is not None:
+        offset = reader.line_offset(line)
+    else:
+        offset = request.args.get("offset", default=0, type=int)
+        if request.headers.get("Last-Event-ID", "").isdigit():
+            offset = int(request.headers["Last-Event-ID"])
+    offset = min(max(offset, 0), reader.size)
+
+    if request.args.get("follow", type=int):
+
+        def is_active() -> bool:
+            # a queued job's log is followed until its etl has run
+            status = job_dir.get_status().status
+            return status in ("queued", "launching", *ACTIVE_STATUSES)
+
+        def events():
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            for position, data in reader.follow(offset, is_active):
+                if not data:
+                    yield ": keepalive\n\n"
+                    continue
+                text = decoder.decode(data)
+                lines = "".join(f"data: {line}\n" for line in text.split("\n"))
+                yield f"id: {position + len(data)}\n{lines}\n"
+            yield "event: end\ndata:\n\n"
+
+        return Response(
+            stream_with_context(events()),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    length = request.args.get("length", type=int)
+    if length is None or length > reader.size - offset:
+        length = reader.size - offset
+    return Response(
+        stream_with_context(reader.read(offset, max(length, 0))),
+        mimetype="text/plain",
+        headers={
+            "Content-Length": str(max(length, 0)),
+            "X-Log-Offset": str(offset),
+            "X-Log-Size": str(reader.size),
+        },
+    )
+
+
+@job.route("/<job_id>/log/search", methods=["GET"])
+def search_job_log(job_id: str):
+    """
+    search the job's log, a page of matching lines at a time; the query
+    parameters are:
+      q: the text to look for (by default, every line matches)
+      regex: 1 to take q as a regular expression
+      ignore_case: 1 for a case-insensitive search
+      level: comma-separated log levels to include (debug, info, warning,
+        error, critical); a line without a level marker (e.g. one of a
+        traceback) has the level of the line it continues
+      since, until: ISO 8601 bounds on the time the lines were logged
+      context: the lines to include before & after each match (max 50)
+      limit: page size (default 100, max 1000)
+      start: the line to search from, e.g. the next_line of the previous page
+    the search uses an index of the log, which is extended with any lines
+    logged since the previous search
+    """
+    job_dir = existing_job_dir(job_id)
+
+    pattern = None
+    if query := request.args.get("q"):
+        flags = re.MULTILINE | (
+            re.IGNORECASE if request.args.get("ignore_case", type=int) else 0
+        )
+        if not request.args.get("regex", type=int):
+            query = re.escape(query)
+        try:
+            pattern = re.compile(query.encode("utf-8"), flags)
+        except re.error as err:
+            abort(400, f"invalid regular expression: {err}")
+    try:
+        levels = [
+            level_code(name)
+            for name in request.args.get("level", "").split(",")
+            if name
+        ]
+    except ValueError:
+        abort(400, "level must be among debug, info, warning, error & critical")
+
+    result = (
+        LogIndex(job_dir.log_reader())
+        .update()
+        .search(
+            pattern,
+            levels=levels,
+            since=datetime_arg("since"),
+            until=datetime_arg("until"),
+            context=min(
+                max(request.args.get("context", 0, type=int), 0), MAX_LOG_CONTEXT
+            ),
+            start_line=max(request.args.get("start", 0, type=int), 0),
+            limit=min(
+                max(request.args.get("limit", DEFAULT_PAGE_SIZE, type=int), 1),
+                MAX_PAGE_SIZE,
+            ),
+        )
+    )
+    return result.model_dump()
 
 
 @job.route("/<job_id>", methods=["DELETE"])
 def delete_job(job_id: str):
-    """delete the job with the given job_id"""
-    logger.debug("passing on delete_job with id=%s", job_id)
+    """delete the job with the given job_id, stopping it first"""
+    existing_job_dir(job_id)
+    try:
+        Job.open(job_id, base_job_dir()).delete()
+    except JobBusyError as err:
+        abort(409, str(err))
+    logger.info("deleted job %s", job_id)
+    return Response(status=204)
 
 
 @job.route("/<job_id>/stop", methods=["POST"])
-def stop_job(job_id: int):
-    """Stop etl job"""
-    logger.debug("passing on stop with id=%s", job_id)
+def stop_job(job_id: str):
+    """
+    stop the job: one which is waiting to be launched is cancelled, running
+    containers are stopped; answers 409 while the job is being launched
+    """
+    existing_job_dir(job_id)
+    try:
+        status = Job.open(job_id, base_job_dir()).stop()
+    except JobBusyError as err:
+        abort(409, str(err))
+    return {"job_id": job_id, "status": status.model_dump()}
@@ -0,0 +1,91 @@
+"""metrics endpoint serving prometheus-style metrics, and the timing of requests"""
+
+import logging
+import time
+from pathlib import Path
+
+from flask import Blueprint, Response, current_app, g, request
+
+from ..metrics import (
+    CONTENT_TYPE,
+    HTTP_DURATION,
+    HTTP_REQUEST_SIZE,
+    HTTP_RESPONSE_SIZE,
+    METRICS_DIRNAME,
+    REGISTRY,
+    Gauge,
+    Snapshot,
+    merge,
+    render,
+    spooled_snapshots,
+)
+from ..models.job import PENDING_STATUSES, get_catalog
+from ..scheduler import RUNNING_STATUSES
+
+logger = logging.getLogger(__name__)
+metrics = Blueprint("metrics", __name__)
+
+
+@metrics.before_app_request
+def start_timer():
+    """note when the handling of a request began"""
+    g.request_started = time.perf_counter()
+
+
+@metrics.after_app_request
+def observe_request(response: Response) -> Response:
+    """record the duration and sizes of a request"""
+    if (started := g.pop("request_started", None)) is None:
+        return response
+    route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    HTTP_DURATION.observe(
+        time.perf_counter() - started, request.method, route, str(response.status_code)
+    )
+    if request.content_length:
+        HTTP_REQUEST_SIZE.observe(request.content_length, request.method, route)
+    if not response.is_streamed and response.content_length is not None:
+        HTTP_RESPONSE_SIZE.observe(response.content_length, request.method, route)
+    return response
+
+
+def job_gauges(base_path: Path) -> Snapshot:
+    """the number of jobs by status, read from the catalog when scraped"""
+    catalog = get_catalog(base_path)
+    jobs = Gauge("switchbox_jobs", "jobs by status", ("status",))
+    stages = Gauge(
+        "switchbox_aresindexer_jobs", "jobs by aresindexer status", ("status",)
+    )
+    queue_depth = Gauge(
+        "switchbox_queue_depth", "jobs waiting to be launched (incl. their checks)"
+    )
+    running = Gauge("switchbox_running_jobs", "job containers running", ("stage",))
+    counts = catalog.status_counts()
+    stage_counts = catalog.status_counts("aresindexer_status")
+    for status, count in counts.items():
+        jobs.set(count, status)
+    for status, count in stage_counts.items():
+        if status:
+            stages.set(count, status)
+    queue_depth.set(sum(counts.get(status, 0) for status in PENDING_STATUSES))
+    running.set(sum(counts.get(status, 0) for status in RUNNING_STATUSES), "etl")
+    running.set(
+        sum(stage_counts.get(status, 0) for status in RUNNING_STATUSES), "aresindexer"
+    )
+    return {
+        gauge.name: gauge.export() for gauge in (jobs, stages, queue_depth, running)
+    }
+
+
+@metrics.route("/", methods=["GET"])
+def get_metrics():
+    """
+    the metrics of all api workers in the prometheus text exposition format;
+    those of the other workers are as of their last spooling (METRICS_INTERVAL)
+    """
+    base_path = Path(current_app.config["JOB_DIR"])
+    snapshot = merge(
+        REGISTRY.snapshot(),
+        *spooled_snapshots(base_path / METRICS_DIRNAME),
+        job_gauges(base_path),
+    )
+    return Response(render(snapshot), content_type=CONTENT_TYPE)
@@ -1,21 +1,36 @@
 """params endpoint which gives the UI a list of input values the ETL requires"""
 
 import logging
+from pathlib import Path
 
-from flask import Blueprint, make_response
+from flask import Blueprint, Response, current_app, request
+from werkzeug.http import is_resource_modified
 
-from ..utils.data import get_etl_input_params
+from ..utils.data import ParamSpec, get_param_spec
 
 logger = logging.getLogger(__name__)
 params = Blueprint("params", __name__)
 
 
+def current_param_spec() -> ParamSpec:
+    """the param spec of the app: the configured override, or the built-in one"""
+    params_file = current_app.config.get("PARAMS_FILE")
+    return get_param_spec(Path(params_file) if params_file else None)
+
+
 @params.route("/", methods=["GET"])
 def get_etl_params():
-    """return the params yaml document as json"""
-    # something about flask's internal jsonification mangles key order when we
-    # just return model_dump() so we need to jsonify ourselves using the
-    # pydantic json dumper
-    response = make_response(get_etl_input_params().model_dump_json())
-    response.headers["Content-Type"] = "application/json"
+    """
+    return the params yaml document as json; the document is prebuilt, so this
+    only compares ETags (answering 304) or sends the stored bytes
+    """
+    spec = current_param_spec()
+    if not is_resource_modified(request.environ, etag=spec.digest):
+        response = Response(status=304)
+    else:
+        # pydantic's json dumper (unlike flask's jsonification) keeps the key
+        # order of the spec, so the document was prebuilt with it
+        response = Response(spec.json_bytes, content_type="application/json")
+    response.set_etag(spec.digest)
+    response.headers["Cache-Control"] = "no-cache"
     return response
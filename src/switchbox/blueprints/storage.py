@@ -0,0 +1,38 @@
+"""storage endpoint reporting (and reclaiming) the disk usage of the jobs"""
+
+import logging
+import shutil
+from pathlib import Path
+
+from flask import Blueprint, current_app
+
+from ..utils.blobs import BlobStore
+
+logger = logging.getLogger(__name__)
+storage = Blueprint("storage", __name__)
+
+
+def blob_store() -> BlobStore:
+    """the blob store of the configured JOB_DIR"""
+    return BlobStore.for_job_dir(Path(current_app.config["JOB_DIR"]))
+
+
+@storage.route("/", methods=["GET"])
+def get_storage():
+    """
+    the disk usage of the job directory's volume, and of the blob store along
+    with the bytes deduplication saves
+    """
+    disk = shutil.disk_usage(current_app.config["JOB_DIR"])
+    usage = blob_store().usage()
+    return {
+        "disk": {"total": disk.total, "used": disk.used, "free": disk.free},
+        "blobs": {**usage.model_dump(), "saved_bytes": usage.saved_bytes},
+    }
+
+
+@storage.route("/gc", methods=["POST"])
+def collect_garbage():
+    """remove the blobs which no job uses any more"""
+    removed, freed = blob_store().collect()
+    return {"removed": removed, "freed_bytes": freed}
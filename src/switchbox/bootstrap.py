@@ -0,0 +1,261 @@
+"""starting the switchbox services concurrently, in dependency order and health-gated"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+from docker.errors import DockerException, ImageNotFound
+from pydantic import BaseModel
+
+from .compose import ONEOFF_LABEL, PROJECT_LABEL, SERVICE_LABEL, Compose
+
+logger = logging.getLogger(__name__)
+
+# the services which make up a running switchbox; their dependencies (e.g.
+# traefik) are started along with them
+BOOT_SERVICES = ("ui", "api", "ares", "cdmdb")
+
+
+class BootError(Exception):
+    """raised when a service can't be brought up"""
+
+
+class ServiceTiming(BaseModel):
+    """how long (in seconds) each step of bringing up a service took"""
+
+    service: str
+    pull: Optional[float] = None
+    create: Optional[float] = None
+    # time spent waiting for the dependencies to be ready
+    waited: Optional[float] = None
+    start: Optional[float] = None
+    healthy: Optional[float] = None
+    # when the service was ready, relative to the start of the bootstrap
+    ready_at: Optional[float] = None
+    error: str = ""
+
+
+def dependency_graph(
+    config: Mapping[str, Any], services: Sequence[str]
+) -> Dict[str, Dict[str, str]]:
+    """
+    the given services and everything they (transitively) depend on, each
+    mapped to its direct dependencies and their depends_on conditions
+    """
+    graph: Dict[str, Dict[str, str]] = {}
+    pending = list(services)
+    while pending:
+        service = pending.pop()
+        if service in graph:
+            continue
+        depends_on = config["services"][service].get("depends_on") or {}
+        graph[service] = {
+            name: (dep or {}).get("condition", "service_started")
+            for name, dep in depends_on.items()
+        }
+        pending.extend(graph[service])
+    return graph
+
+
+def format_report(timings: Sequence[ServiceTiming]) -> List[str]:
+    """the lines of a table of the given timings"""
+    columns = ("pull", "create", "waited", "start", "healthy", "ready_at")
+    width = max([len("service"), *(len(t.service) for t in timings)])
+    lines = [f"{'service':<{width}} " + " ".join(f"{c:>8}" for c in columns)]
+    for timing in sorted(timings, key=lambda t: t.ready_at or float("inf")):
+        values = [getattr(timing, column) for column in columns]
+        line = f"{timing.service:<{width}} " + " ".join(
+            f"{'-':>8}" if value is None else f"{value:>8.1f}" for value in values
+        )
+        if timing.error:
+            line += f"  FAILED: {timing.error}"
+        lines.append(line)
+    return lines
+
+
+class Bootstrap:
+    """
+    brings up a set of compose services and their dependencies: the images are
+    pulled and containers created for all of them at once, then each is started
+    as soon as its depends_on conditions are met, and considered ready once its
+    healthcheck passes (or, without one, once it is running)
+    """
+
+    compose: Compose
+    services: Sequence[str]
+    poll_interval: float = 1.0
+
+    def __init__(
+        self,
+        compose: Compose,
+        services: Sequence[str] = BOOT_SERVICES,
+        timeout: float = 300.0,
+    ) -> None:
+        self.compose = compose
+        self.services = services
+        self.timeout = timeout
+        self.timings: Dict[str, ServiceTiming] = {}
+        # how far each service has come: started, healthy, completed or failed
+        self._states: Dict[str, str] = {}
+        self._changed = threading.Condition()
+        self._began = 0.0
+
+    def run(self) -> List[ServiceTiming]:
+        """bring the services up; returns the timing of each service"""
+        self._began = time.monotonic()
+        config = self.compose.config(resolve_image_digests=False).model_dump()
+        graph = dependency_graph(config, self.services)
+        self.timings = {service: ServiceTiming(service=service) for service in graph}
+        self.remove_orphans(config)
+
+        with ThreadPoolExecutor(
+            max_workers=len(graph), thread_name_prefix="bootstrap"
+        ) as pool:
+            for service, depends_on in graph.items():
+                pool.submit(
+                    self.boot_service, service, config["services"][service], depends_on
+                )
+
+        for line in format_report(list(self.timings.values())):
+            logger.info("%s", line)
+        return list(self.timings.values())
+
+    def boot_service(
+        self, service: str, svc_config: Mapping[str, Any], depends_on: Mapping[str, str]
+    ):
+        """bring up one service, recording the time taken by each step"""
+        timing = self.timings[service]
+        try:
+            step = time.monotonic()
+            if not self.image_present(svc_config["image"]):
+                logger.info("pulling %s", service)
+                self.compose.pull(service)
+            timing.pull = time.monotonic() - step
+
+            step = time.monotonic()
+            self.compose.create(service)
+            timing.create = time.monotonic() - step
+
+            step = time.monotonic()
+            for dependency, condition in depends_on.items():
+                self.wait_for(service, dependency, condition)
+            timing.waited = time.monotonic() - step
+
+            step = time.monotonic()
+            container_id = self.start(service)
+            timing.start = time.monotonic() - step
+            self.set_state(service, "started")
+
+            step = time.monotonic()
+            state = self.wait_ready(service, container_id)
+            timing.healthy = time.monotonic() - step
+            timing.ready_at = time.monotonic() - self._began
+            self.set_state(service, state)
+            logger.info("%s is %s", service, state)
+        except Exception as err:  # pylint: disable=broad-exception-caught
+            logger.error("unable to bring up %s: %s", service, err)
+            timing.error = str(err)
+            self.set_state(service, "failed")
+
+    def image_present(self, image: str) -> bool:
+        """whether the given image is available locally"""
+        try:
+            self.compose.docker.api.inspect_image(image)
+        except ImageNotFound:
+            return False
+        return True
+
+    def set_state(self, service: str, state: str):
+        """record the progress of a service and wake those waiting on it"""
+        with self._changed:
+            self._states[service] = state
+            self._changed.notify_all()
+
+    def wait_for(self, service: str, dependency: str, condition: str):
+        """block until the dependency meets the given depends_on condition"""
+        wanted = {
+            "service_started": ("started", "healthy", "completed"),
+            "service_healthy": ("healthy",),
+            "service_completed_successfully": ("completed",),
+        }.get(condition, ("started", "healthy", "completed"))
+        with self._changed:
+            met = self._changed.wait_for(
+                lambda: self._states.get(dependency) in (*wanted, "failed"),
+                timeout=self.timeout,
+            )
+            if not met:
+                raise BootError(f"timed out waiting for {dependency}")
+            if self._states[dependency] == "failed":
+                raise BootError(f"dependency {dependency} failed")
+        logger.debug("%s: %s is %s", service, dependency, self._states[dependency])
+
+    def container_id(self, service: str) -> str:
+        """the id of the (non one-off) container of the given service"""
+        containers = self.compose.docker.api.containers(
+            all=True,
+            filters={
+                "label": [
+                    f"{PROJECT_LABEL}={self.compose.project_name}",
+                    f"{SERVICE_LABEL}={service}",
+                    f"{ONEOFF_LABEL}=False",
+                ]
+            },
+        )
+        if not containers:
+            raise BootError(f"no container was created for {service}")
+        return str(containers[0]["Id"])
+
+    def start(self, service: str) -> str:
+        """start the service's container unless it is running; returns its id"""
+        container_id = self.container_id(service)
+        api = self.compose.docker.api
+        if api.inspect_container(container_id)["State"]["Status"] != "running":
+            logger.info("starting %s", service)
+            api.start(container_id)
+        return container_id
+
+    def wait_ready(self, service: str, container_id: str) -> str:
+        """
+        wait for the container to pass its healthcheck (or, without one, to be
+        running); returns "healthy", or "completed" for a container which exited
+        successfully
+        """
+        deadline = time.monotonic() + self.timeout
+        while True:
+            state = self.compose.docker.api.inspect_container(container_id)["State"]
+            if state["Status"] == "exited":
+                if state.get("ExitCode") == 0:
+                    return "completed"
+                raise BootError(f"{service} exited with {state.get('ExitCode')}")
+            health = (state.get("Health") or {}).get("Status")
+            if state["Status"] == "running" and health in (None, "healthy"):
+                return "healthy"
+            if time.monotonic() >= deadline:
+                raise BootError(f"{service} not healthy (status {health or 'none'})")
+            time.sleep(self.poll_interval)
+
+    def remove_orphans(self, config: Mapping[str, Any]):
+        """
+        remove the project's service containers for services which are no
+        longer defined (like 'docker compose up --remove-orphans')
+        """
+        api = self.compose.docker.api
+        containers = api.containers(
+            all=True,
+            filters={
+                "label": [
+                    f"{PROJECT_LABEL}={self.compose.project_name}",
+                    f"{ONEOFF_LABEL}=False",
+                ]
+            },
+        )
+        for container in containers:
+            service = (container.get("Labels") or {}).get(SERVICE_LABEL)
+            if service and service not in config["services"]:
+                logger.info("removing orphan container of %s", service)
+                try:
+                    api.remove_container(container["Id"], force=True)
+                except DockerException:
+                    logger.exception("unable to remove %s", container["Id"])
@@ -3,12 +3,16 @@
 import logging
 import os
 import subprocess  # nosec B404
+import time
+from functools import cache
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple, TypeAlias
 
 import docker
 from pydantic import BaseModel, ConfigDict
 
+from .metrics import COMPOSE_DURATION, COMPOSE_FAILURES, observe_docker_response
+
 EnvDict: TypeAlias = Optional[Dict[str, str]]
 DockerClient: TypeAlias = docker.client.DockerClient
 DockerContainer: TypeAlias = docker.models.containers.Container
@@ -16,6 +20,30 @@ DockerContainer: TypeAlias = docker.models.containers.Container
 
 logger = logging.getLogger(__name__)
 
+PROJECT_LABEL = "com.docker.compose.project"
+SERVICE_LABEL = "com.docker.compose.service"
+ONEOFF_LABEL = "com.docker.compose.oneoff"
+
+# requests' default pool keeps 10 connections, one of which is held by the
+# events stream for as long as it is followed
+DOCKER_POOL_SIZE = 16
+
+
+@cache
+def shared_docker_client() -> DockerClient:
+    """
+    the process-wide docker client; sharing it means the api version is only
+    negotiated once and its keep-alive connection pool is reused by all callers
+    """
+    client = docker.from_env(max_pool_size=DOCKER_POOL_SIZE)
+    # time every docker api call made through it
+    client.api.hooks["response"].append(observe_docker_response)
+    return client
+
+
+# pooled connections must not be shared with a forked child process
+os.register_at_fork(after_in_child=shared_docker_client.cache_clear)
+
 
 class ComposeConfig(BaseModel):
     """container class for 'docker compose config' output"""
@@ -40,7 +68,9 @@ class Compose:
     ) -> None:
         self.project_dir = project_dir
         self.project_name = project_name if project_name else project_dir.name
-        self.docker = docker_client if docker_client is not None else docker.from_env()
+        self.docker = (
+            docker_client if docker_client is not None else shared_docker_client()
+        )
         self.default_env = {} if default_env is None else default_env
 
     def compose(
@@ -63,14 +93,22 @@ class Compose:
             *subcmd,
         ]
         logger.debug("running docker compose; command:%s; env:%s", command, env)
-        return subprocess.run(  # nosec B603
-            command,
-            env=subprocess_env,
-            capture_output=True,
-            check=True,
-            encoding="utf-8",
-            cwd=cwd,
-        )
+        subcommand = subcmd[0] if subcmd else ""
+        started = time.perf_counter()
+        try:
+            return subprocess.run(  # nosec B603
+                command,
+                env=subprocess_env,
+                capture_output=True,
+                check=True,
+                encoding="utf-8",
+                cwd=cwd,
+            )
+        except (OSError, subprocess.CalledProcessError):
+            COMPOSE_FAILURES.inc(subcommand)
+            raise
+        finally:
+            COMPOSE_DURATION.observe(time.perf_counter() - started, subcommand)
 
     def ps(self) -> List[DockerContainer]:
         """
@@ -91,6 +129,7 @@ class Compose:
         env: EnvDict = None,
         rm: bool = False,
         volumes: Optional[List[str]] = None,
+        labels: Optional[Dict[str, str]] = None,
     ) -> subprocess.CompletedProcess[str]:
         """call docker compose run"""
         subprocess_env, run_env_flags = self.format_env(env)
@@ -107,6 +146,9 @@ class Compose:
         if volumes:
             for vol in volumes:
                 flags.append(f"--volume={vol}")
+        if labels:
+            for key, value in labels.items():
+                flags.append(f"--label={key}={value}")
         if container_args is None:
             container_args = []
         return self.compose(
@@ -136,15 +178,38 @@ class Compose:
         ]
         return self.compose(*subcmd, env=subprocess_env)
 
-    def config(self) -> ComposeConfig:
+    def pull(self, service_name: str) -> subprocess.CompletedProcess[str]:
+        """call docker compose pull"""
+        return self.compose("pull", "--quiet", service_name, env={})
+
+    def create(
+        self,
+        service_name: str,
+        env: EnvDict = None,
+    ) -> subprocess.CompletedProcess[str]:
+        """
+        call docker compose up without starting anything: (re)create the
+        service's container only, leaving its dependencies and start to the
+        caller
+        """
+        # an empty env still has the default env applied
+        subprocess_env, up_env_flags = self.format_env(env if env is not None else {})
+        subcmd = [
+            "up",
+            "--no-start",
+            "--no-deps",
+            "--quiet-pull",
+            *up_env_flags,
+            service_name,
+        ]
+        return self.compose(*subcmd, env=subprocess_env)
+
+    def config(self, resolve_image_digests: bool = True) -> ComposeConfig:
         """call docker compose config"""
-        return ComposeConfig.model_validate_json(
-            self.compose(
-                "config",
-                "--format=json",
-                "--resolve-image-digests",
-            ).stdout
-        )
+        flags = ["--format=json"]
+        if resolve_image_digests:
+            flags.append("--resolve-image-digests")
+        return ComposeConfig.model_validate_json(self.compose("config", *flags).stdout)
 
     def format_env(self, env: EnvDict) -> Tuple[EnvDict, List[str]]:
         """
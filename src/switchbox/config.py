@@ -34,6 +34,13 @@ class Config(BaseCfg):
         default=Path("/data/jobs"),
         doc="directory where file uploads are stored",
     )
+    params_file: str = opt(
+        default="",
+        doc=(
+            "a yaml file to use as the etl parameter spec instead of the "
+            "built-in one; it is reloaded whenever it changes"
+        ),
+    )
     apimode: bool = opt(
         default=False,
         doc=(
@@ -41,7 +48,155 @@ class Config(BaseCfg):
             "of the startup process"
         ),
     )
+    boot_timeout: int = opt(
+        default=300,
+        doc=(
+            "seconds each service gets to become healthy (and each dependent "
+            "to wait for it) when switchbox starts"
+        ),
+    )
     port: int = opt(
         default=8000,
         doc="the network port to expose the services on",
     )
+    native_launcher: bool = opt(
+        default=True,
+        doc=(
+            "create job containers directly through the docker api instead of "
+            "with 'docker compose run' (which remains the fallback)"
+        ),
+    )
+    max_concurrent_etl: int = opt(
+        default=1,
+        doc="the number of etl jobs which may run at once; others are queued",
+    )
+    max_concurrent_aresindexer: int = opt(
+        default=1,
+        doc="the number of aresindexer runs which may run at once",
+    )
+    image_refresh_interval: int = opt(
+        default=6 * 3600,
+        doc=(
+            "seconds between background pulls of the etl and aresindexer "
+            "images (they are also pulled at startup); 0 pulls only at startup"
+        ),
+    )
+    preflight: bool = opt(
+        default=True,
+        doc=(
+            "validate the input files of each job (encoding, delimiter, "
+            "headers, rows, dates) before it is queued"
+        ),
+    )
+    dedup_inputs: bool = opt(
+        default=True,
+        doc=(
+            "store each distinct input file once, in the job directory's blob "
+            "store, and hardlink it into the jobs which use it"
+        ),
+    )
+    vocab_dir: str = opt(
+        default="",
+        doc=(
+            "the etl's vocabulary directory, as mounted in the api; it is "
+            "fingerprinted so that the etl only reloads the vocabulary when it "
+            "has changed (without it, the etl image digest stands in for it)"
+        ),
+    )
+    result_cache: bool = opt(
+        default=True,
+        doc=(
+            "don't rerun a job whose input files, config and etl image match "
+            "an earlier successful job; it refers to that job's results instead"
+        ),
+    )
+    normalize_inputs: bool = opt(
+        default=False,
+        doc=(
+            "rewrite the input files of each job as utf-8, comma-delimited csv "
+            "before it is queued, so the etl always reads one format"
+        ),
+    )
+    columnar_inputs: bool = opt(
+        default=False,
+        doc="also write a parquet copy of each normalized input file (needs pyarrow)",
+    )
+    retention_interval: int = opt(
+        default=3600,
+        doc=(
+            "seconds between applications of the retention policy to finished "
+            "jobs (the retention_* options); 0 disables it"
+        ),
+    )
+    retention_compress_after: int = opt(
+        default=86400,
+        doc=(
+            "seconds after a job finished that its data and logs are "
+            "compressed; 0 never compresses them"
+        ),
+    )
+    retention_codec: str = opt(
+        default="gzip",
+        doc="how finished jobs are compressed (zstd needs zstandard)",
+        choices=["gzip", "zstd"],
+    )
+    retention_max_age: int = opt(
+        default=0,
+        doc="seconds after a job finished that it is removed; 0 keeps jobs",
+    )
+    retention_max_jobs: int = opt(
+        default=0,
+        doc="the number of finished jobs kept (the oldest go first); 0 keeps all",
+    )
+    retention_quota_gb: int = opt(
+        default=0,
+        doc=(
+            "gigabytes the job directory may use before the oldest finished "
+            "jobs are removed; 0 means no quota"
+        ),
+    )
+    metrics_interval: int = opt(
+        default=10,
+        doc=(
+            "seconds between the api workers sharing their metrics with each "
+            "other (the metrics endpoint is served by any one worker)"
+        ),
+    )
+    launch_workers: int = opt(
+        default=2,
+        doc="the number of job launches each api worker carries out at once",
+    )
+    prepare_workers: int = opt(
+        default=2,
+        doc=(
+            "the number of jobs each api worker validates or normalizes at once "
+            "(apart from the launches)"
+        ),
+    )
+    server: str = opt(
+        default="gunicorn",
+        doc=(
+            "how to serve the api: gunicorn (multi-worker, for production) or "
+            "flask (the single-process development server)"
+        ),
+        choices=["gunicorn", "flask"],
+    )
+    workers: int = opt(
+        default=4,
+        doc="the number of api server worker processes",
+    )
+    threads: int = opt(
+        default=8,
+        doc="the number of request-handling threads in each api worker",
+    )
+    request_timeout: int = opt(
+        default=300,
+        doc=(
+            "seconds an api worker may be unresponsive (e.g. stuck on a "
+            "request) before it is restarted"
+        ),
+    )
+    graceful_timeout: int = opt(
+        default=30,
+        doc="seconds api workers get to finish their requests on shutdown/reload",
+    )
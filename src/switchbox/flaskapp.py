@@ -6,7 +6,7 @@ import os
 # from celery import Celery
 from flask import Blueprint, Flask
 
-from .blueprints import healthz, job, params
+from .blueprints import healthz, images, job, metrics, params, storage
 from .config import Config
 
 logger = logging.getLogger(__name__)
@@ -19,8 +19,11 @@ def create_app(config: Config):
 
     api = Blueprint("api", __name__, url_prefix="/api")
     api.register_blueprint(healthz, url_prefix="/healthz")
+    api.register_blueprint(images, url_prefix="/images")
     api.register_blueprint(job, url_prefix="/job")
+    api.register_blueprint(metrics, url_prefix="/metrics")
     api.register_blueprint(params, url_prefix="/params")
+    api.register_blueprint(storage, url_prefix="/storage")
     app.register_blueprint(api)
 
     # celery = Celery("hello", broker="amqp://guest@localhost//")
@@ -0,0 +1,173 @@
+"""keeping the job service images pulled, and pinning launches to their digests"""
+
+import datetime
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Literal, Optional, Sequence
+
+from docker.errors import DockerException
+from docker.utils import parse_repository_tag
+from pydantic import BaseModel
+
+from .compose import Compose
+from .launcher import ServiceLauncher
+
+logger = logging.getLogger(__name__)
+
+# the images of these services are kept pulled
+WARM_SERVICES = ("etl", "aresindexer")
+# where the state of the images is shared with the api workers
+IMAGES_FILENAME = ".images.json"
+
+
+def now() -> datetime.datetime:
+    """the current time, timezone-aware"""
+    return datetime.datetime.now(tz=datetime.timezone.utc)
+
+
+class ImageState(BaseModel):
+    """what is known about the image of a job service"""
+
+    service: str
+    image: str = ""
+    status: Literal["unknown", "pulling", "present", "failed"] = "unknown"
+    # the repo digest (image@sha256:...) launches are pinned to
+    digest: str = ""
+    image_id: str = ""
+    # when the image was built
+    created: Optional[datetime.datetime] = None
+    # when the image was last pulled (or found to be current)
+    pulled_at: Optional[datetime.datetime] = None
+    error: str = ""
+
+
+def images_file(base: Path) -> Path:
+    """the file the image states for the given job directory are kept in"""
+    return base / IMAGES_FILENAME
+
+
+def load_image_states(base: Path) -> Dict[str, ImageState]:
+    """the saved image states, by service"""
+    try:
+        with open(images_file(base), "rt", encoding="utf-8") as imagesfh:
+            data = json.load(imagesfh)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    return {service: ImageState(**state) for service, state in data.items()}
+
+
+def save_image_states(base: Path, states: Dict[str, ImageState]):
+    """replace the saved image states"""
+    path = images_file(base)
+    temp_file = path.with_name(f"{path.name}.{os.getpid()}")
+    with open(temp_file, "wt", encoding="utf-8") as imagesfh:
+        json.dump({k: v.model_dump(mode="json") for k, v in states.items()}, imagesfh)
+    os.replace(temp_file, path)
+
+
+def image_pins(base: Path) -> Dict[str, str]:
+    """the digest each service's launches are pinned to, for those known"""
+    return {
+        service: state.digest
+        for service, state in load_image_states(base).items()
+        if state.digest
+    }
+
+
+class ImageWarmer:
+    """
+    pulls the images of the job services at startup and then on a schedule, so
+    that job launches don't wait for pulls; the resulting digests are saved for
+    the launches to be pinned to
+    """
+
+    base_path: Path
+    services: Sequence[str]
+
+    def __init__(
+        self,
+        base_path: Path,
+        compose: Compose,
+        services: Sequence[str] = WARM_SERVICES,
+        interval: float = 6 * 3600,
+    ) -> None:
+        self.base_path = base_path
+        self.compose = compose
+        self.services = services
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """begin warming in a background thread"""
+        self._thread = threading.Thread(
+            target=self.run, name="image-warmer", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """stop the schedule (an ongoing pull is not interrupted)"""
+        self._stop.set()
+
+    def run(self):
+        """warm the images now and then every interval"""
+        while not self._stop.is_set():
+            self.warm()
+            if self.interval <= 0:
+                return
+            self._stop.wait(self.interval)
+
+    def warm(self) -> List[ImageState]:
+        """pull and pin the image of every service; returns their states"""
+        return [self.warm_service(service) for service in self.services]
+
+    def update_state(self, service: str, **values) -> ImageState:
+        """change the saved state of the given service's image"""
+        with self._lock:
+            states = load_image_states(self.base_path)
+            state = states.get(service) or ImageState(service=service)
+            states[service] = ImageState.model_validate(
+                {**state.model_dump(), **values}
+            )
+            save_image_states(self.base_path, states)
+            return states[service]
+
+    def warm_service(self, service: str) -> ImageState:
+        """pull the service's image and record its digest"""
+        api = self.compose.docker.api
+        try:
+            image = ServiceLauncher(self.compose).service_spec(service).image
+            self.update_state(service, image=image, status="pulling", error="")
+            repository, tag = parse_repository_tag(image)
+            logger.info("pulling %s for %s", image, service)
+            api.pull(repository, tag=tag or "latest")
+            info = api.inspect_image(image)
+        except Exception as err:  # pylint: disable=broad-exception-caught
+            if not isinstance(err, DockerException):
+                logger.exception("unable to warm the %s image", service)
+            else:
+                logger.error("unable to pull the %s image: %s", service, err)
+            return self.update_state(service, status="failed", error=str(err))
+
+        digest = next(
+            (
+                d
+                for d in info.get("RepoDigests") or []
+                if d.startswith(f"{repository}@")
+            ),
+            "",
+        )
+        state = self.update_state(
+            service,
+            status="present",
+            digest=digest,
+            image_id=info["Id"],
+            created=info.get("Created"),
+            pulled_at=now(),
+        )
+        logger.info("%s image is %s", service, digest or info["Id"])
+        return state
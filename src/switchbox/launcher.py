@@ -0,0 +1,316 @@
+"""launching compose services as one-off containers through the docker sdk"""
+
+import hashlib
+import logging
+import secrets
+import subprocess  # nosec B404
+import threading
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+from docker.errors import DockerException
+from docker.types import Mount
+from pydantic import BaseModel, ConfigDict
+
+from .compose import (
+    ONEOFF_LABEL,
+    PROJECT_LABEL,
+    SERVICE_LABEL,
+    Compose,
+    DockerClient,
+    EnvDict,
+)
+
+logger = logging.getLogger(__name__)
+
+# called with a description of each step of a launch as it is taken
+ProgressCallback = Callable[[str], None]
+
+# the files in a project directory which influence its compose config
+PROJECT_FILES = ("compose.yml", ".env")
+
+
+class LaunchFallback(Exception):
+    """raised when a service can't be launched natively; compose should do it"""
+
+
+class ServiceSpec(BaseModel):
+    """everything needed to create a container for a compose service"""
+
+    model_config = ConfigDict(frozen=True)
+
+    service: str
+    image: str
+    environment: Dict[str, str] = {}
+    labels: Dict[str, str] = {}
+    mounts: List[Dict[str, Any]] = []
+    networks: List[str] = []
+    command: Optional[List[str]] = None
+    entrypoint: Optional[List[str]] = None
+    working_dir: Optional[str] = None
+    user: Optional[str] = None
+    nano_cpus: Optional[int] = None
+    mem_limit: Optional[int | str] = None
+    pids_limit: Optional[int] = None
+    shm_size: Optional[int | str] = None
+    depends_on: Dict[str, str] = {}
+
+
+def size_value(value: Any) -> Optional[int | str]:
+    """compose emits byte sizes as either numbers or numeric strings"""
+    if value is None:
+        return None
+    return int(value) if str(value).isdigit() else str(value)
+
+
+def build_spec(
+    config: Mapping[str, Any], project_name: str, service: str
+) -> ServiceSpec:
+    """translate one service of a 'docker compose config' document to a ServiceSpec"""
+    svc = config["services"][service]
+    volumes = config.get("volumes") or {}
+    networks = config.get("networks") or {}
+
+    mounts = []
+    for vol in svc.get("volumes") or []:
+        source = vol.get("source", "")
+        if vol["type"] == "volume":
+            source = (volumes.get(source) or {}).get("name", f"{project_name}_{source}")
+        elif vol["type"] != "bind":
+            raise LaunchFallback(f"unsupported volume type {vol['type']}")
+        mounts.append(
+            {
+                "target": vol["target"],
+                "source": source,
+                "type": vol["type"],
+                "read_only": bool(vol.get("read_only", False)),
+            }
+        )
+
+    limits = ((svc.get("deploy") or {}).get("resources") or {}).get("limits") or {}
+    cpus = limits.get("cpus")
+    return ServiceSpec(
+        service=service,
+        image=svc["image"],
+        environment={
+            key: str(value)
+            for key, value in (svc.get("environment") or {}).items()
+            if value is not None
+        },
+        labels={str(k): str(v) for k, v in (svc.get("labels") or {}).items()},
+        mounts=mounts,
+        networks=[
+            (networks.get(name) or {}).get("name", f"{project_name}_{name}")
+            for name in (svc.get("networks") or {})
+        ],
+        command=svc.get("command"),
+        entrypoint=svc.get("entrypoint"),
+        working_dir=svc.get("working_dir"),
+        user=svc.get("user"),
+        nano_cpus=int(float(cpus) * 1e9) if cpus else None,
+        mem_limit=size_value(limits.get("memory")),
+        pids_limit=limits.get("pids"),
+        shm_size=size_value(svc.get("shm_size")),
+        depends_on={
+            name: (dep or {}).get("condition", "service_started")
+            for name, dep in (svc.get("depends_on") or {}).items()
+        },
+    )
+
+
+_spec_cache: Dict[Tuple[str, ...], Mapping[str, Any]] = {}
+_spec_cache_lock = threading.Lock()
+
+
+class ServiceLauncher:
+    """
+    creates and starts one-off service containers directly through the docker
+    api, using the service definitions from 'docker compose config'; falls
+    back to 'docker compose run' whenever that isn't possible
+    """
+
+    compose: Compose
+
+    def __init__(
+        self, compose: Compose, images: Optional[Mapping[str, str]] = None
+    ) -> None:
+        self.compose = compose
+        # per service, a (pinned) image to use instead of the configured one
+        self.images = images or {}
+
+    @property
+    def docker(self) -> DockerClient:
+        """the docker client shared with the compose instance"""
+        return self.compose.docker
+
+    def config_key(self) -> Tuple[str, ...]:
+        """
+        the cache key for the project's compose config: the content hash of the
+        project files and the environment used to interpolate them
+        """
+        digest = hashlib.sha256()
+        for name in PROJECT_FILES:
+            path = self.compose.project_dir / name
+            if path.exists():
+                digest.update(path.read_bytes())
+        env = sorted((self.compose.default_env or {}).items())
+        return (
+            str(self.compose.project_dir),
+            self.compose.project_name,
+            digest.hexdigest(),
+            repr(env),
+        )
+
+    def project_config(self) -> Mapping[str, Any]:
+        """the (cached) compose config of the project"""
+        key = self.config_key()
+        with _spec_cache_lock:
+            if (config := _spec_cache.get(key)) is None:
+                logger.debug("resolving compose config for %s", key)
+                config = self.compose.config(resolve_image_digests=False).model_dump()
+                _spec_cache[key] = config
+        return config
+
+    def service_spec(self, service: str) -> ServiceSpec:
+        """the ServiceSpec of the given service"""
+        try:
+            spec = build_spec(self.project_config(), self.compose.project_name, service)
+        except (KeyError, TypeError, ValueError) as err:
+            raise LaunchFallback(f"unusable config for {service}: {err}") from err
+        if image := self.images.get(service):
+            spec = spec.model_copy(update={"image": image})
+        return spec
+
+    def check_ready(self, spec: ServiceSpec):
+        """ensure the image and the dependencies of the service are in place"""
+        api = self.docker.api
+        try:
+            api.inspect_image(spec.image)
+        except DockerException as err:
+            raise LaunchFallback(f"image {spec.image} unavailable: {err}") from err
+
+        for dependency, condition in spec.depends_on.items():
+            containers = api.containers(
+                filters={
+                    "label": [
+                        f"{PROJECT_LABEL}={self.compose.project_name}",
+                        f"{SERVICE_LABEL}={dependency}",
+                    ],
+                    "status": "running",
+                }
+            )
+            if not containers:
+                raise LaunchFallback(f"dependency {dependency} is not running")
+            if condition == "service_healthy" and not any(
+                "(healthy)" in c.get("Status", "") for c in containers
+            ):
+                raise LaunchFallback(f"dependency {dependency} is not healthy")
+
+    def create(
+        self,
+        spec: ServiceSpec,
+        env: EnvDict = None,
+        labels: Optional[Mapping[str, str]] = None,
+    ) -> str:
+        """create (but don't start) a container for the service; returns its id"""
+        api = self.docker.api
+        project = self.compose.project_name
+        host_config = api.create_host_config(
+            mounts=[Mount(**mount) for mount in spec.mounts],
+            nano_cpus=spec.nano_cpus,
+            mem_limit=spec.mem_limit,
+            pids_limit=spec.pids_limit,
+            shm_size=spec.shm_size,
+        )
+        networking_config = None
+        if spec.networks:
+            # the types-docker stub mistypes this argument, it is a mapping of
+            # network name to endpoint config
+            networking_config = api.create_networking_config(
+                {  # type: ignore[arg-type]
+                    spec.networks[0]: api.create_endpoint_config(aliases=[spec.service])
+                }
+            )
+        container = api.create_container(
+            spec.image,
+            command=spec.command,
+            entrypoint=spec.entrypoint,
+            working_dir=spec.working_dir,
+            user=spec.user,
+            name=f"{project}-{spec.service}-run-{secrets.token_hex(6)}",
+            detach=True,
+            environment={**spec.environment, **(env or {})},
+            labels={
+                **spec.labels,
+                PROJECT_LABEL: project,
+                SERVICE_LABEL: spec.service,
+                ONEOFF_LABEL: "True",
+                **(labels or {}),
+            },
+            host_config=host_config,
+            networking_config=networking_config,
+        )
+        container_id = str(container["Id"])
+        for network in spec.networks[1:]:
+            api.connect_container_to_network(
+                container_id, network, aliases=[spec.service]
+            )
+        return container_id
+
+    def run_native(
+        self,
+        service: str,
+        env: EnvDict = None,
+        labels: Optional[Mapping[str, str]] = None,
+        progress: Optional[ProgressCallback] = None,
+    ) -> str:
+        """launch the service through the docker api; returns the container id"""
+        report = progress or (lambda step: None)
+        report("resolving the service config")
+        spec = self.service_spec(service)
+        report("checking the image and dependencies")
+        self.check_ready(spec)
+        report("creating the container")
+        container_id = self.create(spec, env=env, labels=labels)
+        report("starting the container")
+        try:
+            self.docker.api.start(container_id)
+        except DockerException:
+            self.docker.api.remove_container(container_id, force=True)
+            raise
+        return container_id
+
+    def run(
+        self,
+        service: str,
+        env: EnvDict = None,
+        labels: Optional[Mapping[str, str]] = None,
+        native: bool = True,
+        progress: Optional[ProgressCallback] = None,
+    ) -> str:
+        """
+        launch a detached one-off container for the given service, natively if
+        possible or with 'docker compose run' otherwise; returns the container
+        id. progress, if given, is told about each step as it is taken
+        """
+        if native:
+            try:
+                return self.run_native(
+                    service, env=env, labels=labels, progress=progress
+                )
+            except LaunchFallback as err:
+                logger.info("launching %s with compose: %s", service, err)
+            except DockerException:
+                logger.exception("native launch of %s failed", service)
+        if progress is not None:
+            progress("running docker compose (pulling images if needed)")
+        try:
+            result = self.compose.run(
+                service,
+                detach=True,
+                env=dict(env) if env else None,
+                labels=dict(labels) if labels else None,
+            )
+        except subprocess.CalledProcessError as err:
+            logger.error("docker compose run failed: %s", err.stderr)
+            raise
+        return result.stdout.strip()
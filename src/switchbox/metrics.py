@@ -0,0 +1,416 @@
+"""prometheus-style metrics of the api, its docker interactions and the jobs"""
+
+import json
+import logging
+import math
+import os
+import re
+import threading
+from bisect import bisect_left
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, TypeAlias
+
+logger = logging.getLogger(__name__)
+
+Labels: TypeAlias = Tuple[str, ...]
+# a metric as exported: kind, doc, label names, buckets and [labels, value] pairs
+Snapshot: TypeAlias = Dict[str, Dict[str, Any]]
+
+# where each server worker spools its metrics for the others, in the job dir
+METRICS_DIRNAME = ".metrics"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# seconds; api requests, compose subcommands and docker api calls
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# bytes; 64B to 256MiB
+SIZE_BUCKETS = tuple(64 * 4**i for i in range(12))
+# seconds; etl and aresindexer runs, 1m to 2d
+STAGE_BUCKETS = (60, 300, 900, 1800, 3600, 7200, 14400, 28800, 57600, 86400, 172800)
+
+
+class Metric:
+    """a named family of values, one per combination of label values"""
+
+    kind: str = "untyped"
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Labels, Any] = {}
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """forget all values"""
+        with self._lock:
+            self._values = {}
+
+    def export(self) -> Dict[str, Any]:
+        """the metric as a json-serializable dict"""
+        with self._lock:
+            values = [[list(labels), value] for labels, value in self._values.items()]
+        return {
+            "kind": self.kind,
+            "doc": self.doc,
+            "labelnames": list(self.labelnames),
+            "values": values,
+        }
+
+
+class Counter(Metric):
+    """a value which only goes up"""
+
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1):
+        """add to the value with the given label values"""
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    """a value which is set"""
+
+    kind = "gauge"
+
+    def set(self, value: float, *labels: str):
+        """set the value with the given label values"""
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(Metric):
+    """
+    a distribution of observations over fixed buckets; each value is kept as
+    [per-bucket counts (the last one above the largest bucket), sum, count]
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        doc: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, doc, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels: str):
+        """add an observation to the distribution with the given label values"""
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            if (entry := self._values.get(labels)) is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def export(self) -> Dict[str, Any]:
+        with self._lock:
+            values = [
+                [list(labels), [list(counts), total, count]]
+                for labels, (counts, total, count) in self._values.items()
+            ]
+        return {
+            "kind": self.kind,
+            "doc": self.doc,
+            "labelnames": list(self.labelnames),
+            "buckets": list(self.buckets),
+            "values": values,
+        }
+
+
+class MetricsRegistry:
+    """the metrics of a process"""
+
+    def __init__(self) -> None:
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        """add a metric"""
+        if metric.name in self.metrics:
+            raise ValueError(f"metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, doc: str, labelnames: Sequence[str] = ()) -> Counter:
+        """register a new counter"""
+        metric = Counter(name, doc, labelnames)
+        self.register(metric)
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        doc: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        """register a new histogram"""
+        metric = Histogram(name, doc, labelnames, buckets)
+        self.register(metric)
+        return metric
+
+    def reset(self):
+        """forget the values of all metrics"""
+        for metric in self.metrics.values():
+            metric.reset()
+
+    def snapshot(self) -> Snapshot:
+        """the current values of all metrics"""
+        return {name: metric.export() for name, metric in self.metrics.items()}
+
+
+def merge(*snapshots: Snapshot) -> Snapshot:
+    """
+    add up the snapshots of several processes; counters and histograms are
+    summed, while for gauges the value of the last snapshot wins
+    """
+    merged: Snapshot = {}
+    for snapshot in snapshots:
+        for name, exported in snapshot.items():
+            if name not in merged:
+                merged[name] = {**exported, "values": {}}
+            target = merged[name]
+            for labels, value in exported["values"]:
+                key = tuple(labels)
+                if exported["kind"] == "gauge" or key not in target["values"]:
+                    target["values"][key] = json.loads(json.dumps(value))
+                elif exported["kind"] == "histogram":
+                    counts, total, count = target["values"][key]
+                    target["values"][key] = [
+                        [a + b for a, b in zip(counts, value[0])],
+                        total + value[1],
+                        count + value[2],
+                    ]
+                else:
+                    target["values"][key] += value
+    for exported in merged.values():
+        exported["values"] = [
+            [list(labels), value] for labels, value in exported["values"].items()
+        ]
+    return merged
+
+
+def format_value(value: float) -> str:
+    """a sample value in the text exposition format"""
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    """the {name="value",...} part of a sample"""
+    if not names:
+        return ""
+    pairs = (
+        f'{name}="{escape_label(str(value))}"' for name, value in zip(names, values)
+    )
+    return "{" + ",".join(pairs) + "}"
+
+
+def escape_label(value: str) -> str:
+    """a label value escaped for the text exposition format"""
+    return value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def render(snapshot: Snapshot) -> str:
+    """the snapshot in the prometheus text exposition format"""
+    lines: List[str] = []
+    for name, exported in sorted(snapshot.items()):
+        lines.append(f"# HELP {name} {exported['doc']}")
+        lines.append(f"# TYPE {name} {exported['kind']}")
+        names = exported["labelnames"]
+        for labels, value in sorted(exported["values"]):
+            if exported["kind"] != "histogram":
+                lines.append(
+                    f"{name}{format_labels(names, labels)} {format_value(value)}"
+                )
+                continue
+            counts, total, count = value
+            cumulative = 0
+            for bound, bucket_count in zip(
+                [*exported["buckets"], math.inf], counts, strict=True
+            ):
+                cumulative += bucket_count
+                bucket_labels = format_labels(
+                    [*names, "le"], [*labels, format_value(bound)]
+                )
+                lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+            lines.append(
+                f"{name}_sum{format_labels(names, labels)} {format_value(total)}"
+            )
+            lines.append(f"{name}_count{format_labels(names, labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def pid_alive(pid: int) -> bool:
+    """whether a process with the given pid exists"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class MetricsSpool:
+    """
+    shares the metrics of a server worker with the other workers, which each
+    serve the metrics endpoint: every interval the worker's snapshot is
+    written to a file named after its pid, and the files of the other (live)
+    workers are read back when the endpoint is served
+    """
+
+    directory: Path
+    interval: float = 10.0
+
+    def __init__(
+        self,
+        directory: Path,
+        registry: Optional[MetricsRegistry] = None,
+        interval: float = 10.0,
+    ) -> None:
+        self.directory = directory
+        self.registry = REGISTRY if registry is None else registry
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def path(self) -> Path:
+        """the spool file of this process"""
+        return self.directory / f"{os.getpid()}.json"
+
+    def start(self):
+        """begin spooling in a background thread"""
+        self._thread = threading.Thread(
+            target=self.run, name="metrics-spool", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """stop spooling and withdraw this process's spool file"""
+        self._stop.set()
+        self.path.unlink(missing_ok=True)
+
+    def run(self):
+        """write the snapshot every interval"""
+        while not self._stop.wait(self.interval):
+            try:
+                self.write()
+            except OSError:
+                logger.exception("unable to spool the metrics to %s", self.path)
+
+    def write(self):
+        """replace this process's spool file with its current snapshot"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        temp_file = self.path.with_name(f".{self.path.name}")
+        with open(temp_file, "wt", encoding="utf-8") as spoolfh:
+            json.dump(self.registry.snapshot(), spoolfh)
+        os.replace(temp_file, self.path)
+
+
+def spooled_snapshots(directory: Path) -> List[Snapshot]:
+    """
+    the spooled snapshots of the other live processes; the files of processes
+    which are gone are removed
+    """
+    snapshots: List[Snapshot] = []
+    if not directory.is_dir():
+        return snapshots
+    for path in directory.glob("*.json"):
+        if not path.stem.isdigit() or int(path.stem) == os.getpid():
+            continue
+        if not pid_alive(int(path.stem)):
+            path.unlink(missing_ok=True)
+            continue
+        try:
+            with open(path, "rt", encoding="utf-8") as spoolfh:
+                snapshots.append(json.load(spoolfh))
+        except (OSError, json.JSONDecodeError):
+            logger.debug("skipping unreadable metrics spool %s", path)
+    return snapshots
+
+
+# matches the api version prefix of docker api paths
+DOCKER_VERSION_RE = re.compile(r"^/v[0-9.]+")
+# the docker api endpoints with no object id in their path
+DOCKER_COLLECTION_ACTIONS = ("json", "create", "prune", "load", "search", "get")
+
+
+def docker_endpoint(path: str) -> str:
+    """
+    the docker api path with object ids and names replaced, e.g.
+    /v1.45/containers/0123abcd/json -> containers/{id}/json
+    """
+    parts = DOCKER_VERSION_RE.sub("", path.split("?", 1)[0]).strip("/").split("/")
+    if len(parts) == 1 or (len(parts) == 2 and parts[1] in DOCKER_COLLECTION_ACTIONS):
+        return "/".join(parts)
+    if len(parts) == 2:
+        return f"{parts[0]}/{{id}}"
+    return f"{parts[0]}/{{id}}/{parts[-1]}"
+
+
+def observe_docker_response(response, *_args, **_kwargs):
+    """
+    a requests response hook timing each docker api call (up to the response
+    headers; a streamed body, like that of the events stream, isn't included)
+    """
+    DOCKER_DURATION.observe(
+        response.elapsed.total_seconds(),
+        response.request.method,
+        docker_endpoint(response.request.path_url),
+        str(response.status_code),
+    )
+    return response
+
+
+# the metrics of this process
+REGISTRY = MetricsRegistry()
+# values counted in the server's master process are not the workers'
+os.register_at_fork(after_in_child=REGISTRY.reset)
+
+HTTP_DURATION = REGISTRY.histogram(
+    "switchbox_http_request_duration_seconds",
+    "time taken to handle api requests (up to the start of streamed bodies)",
+    ("method", "route", "status"),
+)
+HTTP_REQUEST_SIZE = REGISTRY.histogram(
+    "switchbox_http_request_size_bytes",
+    "size of api request bodies",
+    ("method", "route"),
+    SIZE_BUCKETS,
+)
+HTTP_RESPONSE_SIZE = REGISTRY.histogram(
+    "switchbox_http_response_size_bytes",
+    "size of api response bodies (streamed bodies are not included)",
+    ("method", "route"),
+    SIZE_BUCKETS,
+)
+COMPOSE_DURATION = REGISTRY.histogram(
+    "switchbox_compose_duration_seconds",
+    "time taken by docker compose subcommands",
+    ("subcommand",),
+)
+COMPOSE_FAILURES = REGISTRY.counter(
+    "switchbox_compose_failures_total",
+    "docker compose subcommands which failed",
+    ("subcommand",),
+)
+DOCKER_DURATION = REGISTRY.histogram(
+    "switchbox_docker_request_duration_seconds",
+    "time taken by docker api calls",
+    ("method", "endpoint", "status"),
+)
+STAGE_DURATION = REGISTRY.histogram(
+    "switchbox_job_stage_duration_seconds",
+    "run time of the etl and aresindexer containers of jobs",
+    ("stage", "outcome"),
+    STAGE_BUCKETS,
+)
@@ -0,0 +1,328 @@
+"""sqlite-backed catalog of job metadata, used to avoid rescanning job directories"""
+
+import datetime
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+CATALOG_FILENAME = ".catalog.sqlite3"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    start_datetime TEXT NOT NULL DEFAULT '',
+    status TEXT NOT NULL DEFAULT 'created',
+    container_id TEXT NOT NULL DEFAULT '',
+    source_name TEXT NOT NULL DEFAULT '',
+    source_date TEXT NOT NULL DEFAULT '',
+    updated_at REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS results (
+    cache_key TEXT PRIMARY KEY,
+    job_id TEXT NOT NULL,
+    recorded_at REAL NOT NULL DEFAULT 0
+);
+"""
+
+# columns added after the jobs table was first released; they are added to
+# existing catalogs when they are opened
+ADDED_COLUMNS = {
+    "aresindexer_status": "TEXT NOT NULL DEFAULT ''",
+    "priority": "INTEGER NOT NULL DEFAULT 0",
+    "queued_at": "REAL NOT NULL DEFAULT 0",
+    "finished_at": "REAL NOT NULL DEFAULT 0",
+}
+
+# the columns which are copied from a job's status
+STATUS_COLUMNS = (
+    "status",
+    "start_datetime",
+    "container_id",
+    "aresindexer_status",
+    "priority",
+    "queued_at",
+    "finished_at",
+)
+
+INDEXES = """
+CREATE INDEX IF NOT EXISTS jobs_start_datetime ON jobs (start_datetime, job_id);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);
+CREATE INDEX IF NOT EXISTS jobs_container_id ON jobs (container_id);
+CREATE INDEX IF NOT EXISTS jobs_aresindexer_status ON jobs (aresindexer_status);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority DESC, queued_at);
+CREATE INDEX IF NOT EXISTS results_job_id ON results (job_id);
+"""
+
+
+def format_datetime(value: Any) -> str:
+    """normalize a datetime (or a datetime-ish string) for storage in the catalog"""
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return str(value) if value is not None else ""
+
+
+class JobCatalog:
+    """
+    an index of the jobs in a job directory; the job directory itself remains
+    the source of truth, the catalog can always be rebuilt from it
+    """
+
+    path: Path
+
+    def __init__(self, base_path: Path) -> None:
+        self.path = base_path / CATALOG_FILENAME
+        self._local = threading.local()
+
+    def connect(self) -> sqlite3.Connection:
+        """return this thread's connection to the catalog database"""
+        conn: Optional[sqlite3.Connection] = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            existing = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column, definition in ADDED_COLUMNS.items():
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {definition}")
+            conn.executescript(INDEXES)
+            self._local.conn = conn
+        return conn
+
+    def get_meta(self, key: str) -> Optional[str]:
+        """read a value from the catalog's key/value table"""
+        row = (
+            self.connect()
+            .execute("SELECT value FROM meta WHERE key = ?", (key,))
+            .fetchone()
+        )
+        return None if row is None else str(row["value"])
+
+    def set_meta(self, key: str, value: str):
+        """write a value into the catalog's key/value table"""
+        self.connect().execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+            (key, value),
+        )
+
+    def is_built(self) -> bool:
+        """whether the catalog has been populated from the job directory"""
+        return self.get_meta("built_at") is not None
+
+    def add_job(self, job_id: str):
+        """register a new (empty) job"""
+        self.connect().execute(
+            "INSERT INTO jobs (job_id, updated_at) VALUES (?, ?) "
+            "ON CONFLICT (job_id) DO NOTHING",
+            (job_id, time.time()),
+        )
+
+    def update_config(self, job_id: str, source_name: str, source_date: str):
+        """record the catalogued parts of a job's config"""
+        self.connect().execute(
+            "INSERT INTO jobs (job_id, source_name, source_date, updated_at) "
+            "VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (job_id) DO UPDATE SET "
+            "source_name = excluded.source_name, "
+            "source_date = excluded.source_date, "
+            "updated_at = excluded.updated_at",
+            (job_id, source_name, source_date, time.time()),
+        )
+
+    def update_status(self, job_id: str, **values: Any):
+        """record the catalogued parts of a job's status (see STATUS_COLUMNS)"""
+        if unknown := set(values) - set(STATUS_COLUMNS):
+            raise ValueError(f"unknown status column(s): {unknown}")
+        values = {**values, "updated_at": time.time()}
+        if "start_datetime" in values:
+            values["start_datetime"] = format_datetime(values["start_datetime"])
+        if "container_id" in values:
+            values["container_id"] = str(values["container_id"] or "")
+        columns = ", ".join(values)
+        placeholders = ", ".join("?" for _ in values)
+        updates = ", ".join(f"{col} = excluded.{col}" for col in values)
+        # the column names are checked against STATUS_COLUMNS above
+        self.connect().execute(  # nosec B608
+            f"INSERT INTO jobs (job_id, {columns}) VALUES (?, {placeholders}) "
+            f"ON CONFLICT (job_id) DO UPDATE SET {updates}",
+            (job_id, *values.values()),
+        )
+
+    def claim_next(
+        self,
+        column: str,
+        waiting: str,
+        claimed: str,
+        active: Sequence[str],
+        limit: int,
+        order_by: str = "updated_at, job_id",
+        active_with_container: Sequence[str] = (),
+    ) -> Optional[str]:
+        """
+        atomically (across threads and processes) move the first job whose
+        status column is waiting to claimed, provided fewer than limit jobs
+        have a claimed or active status (or one of the active_with_container
+        statuses and a container); returns the claimed job_id, if any
+        """
+        if column not in STATUS_COLUMNS:
+            raise ValueError(f"unknown status column {column}")
+        busy = (claimed, *active)
+        conn = self.connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            running = conn.execute(
+                f"SELECT COUNT(*) FROM jobs WHERE {column} IN "  # nosec B608
+                f"({', '.join('?' for _ in busy)}) OR ({column} IN "
+                f"({', '.join('?' for _ in active_with_container)}) "
+                "AND container_id != '')",
+                (*busy, *active_with_container),
+            ).fetchone()[0]
+            row = None
+            if running < limit:
+                row = conn.execute(
+                    f"SELECT job_id FROM jobs WHERE {column} = ? "  # nosec B608
+                    f"ORDER BY {order_by} LIMIT 1",
+                    (waiting,),
+                ).fetchone()
+            if row is not None:
+                conn.execute(
+                    f"UPDATE jobs SET {column} = ?, updated_at = ? "  # nosec B608
+                    "WHERE job_id = ?",
+                    (claimed, time.time(), row["job_id"]),
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return None if row is None else str(row["job_id"])
+
+    def remove_job(self, job_id: str):
+        """drop a job (and the results recorded for it) from the catalog"""
+        conn = self.connect()
+        conn.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+        conn.execute("DELETE FROM results WHERE job_id = ?", (job_id,))
+
+    def record_result(self, cache_key: str, job_id: str):
+        """note that the job with the given result cache key ran successfully"""
+        self.connect().execute(
+            "INSERT INTO results (cache_key, job_id, recorded_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (cache_key) DO UPDATE SET "
+            "job_id = excluded.job_id, recorded_at = excluded.recorded_at",
+            (cache_key, job_id, time.time()),
+        )
+
+    def cached_result(self, cache_key: str) -> Optional[str]:
+        """the id of the job recorded for the given result cache key, if any"""
+        row = (
+            self.connect()
+            .execute("SELECT job_id FROM results WHERE cache_key = ?", (cache_key,))
+            .fetchone()
+        )
+        return None if row is None else str(row["job_id"])
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        """all catalogued jobs, ordered by start time"""
+        rows = self.connect().execute(
+            "SELECT * FROM jobs ORDER BY start_datetime, job_id"
+        )
+        return [dict(row) for row in rows]
+
+    def query_jobs(
+        self,
+        limit: int,
+        after: Optional[Tuple[str, str]] = None,
+        statuses: Sequence[str] = (),
+        source_name: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        descending: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """
+        a page of catalogued jobs ordered by start time; after is the
+        (start_datetime, job_id) of the last job on the previous page
+        """
+        clauses = []
+        values: List[Any] = []
+        if after is not None:
+            comparison = "<" if descending else ">"
+            clauses.append(f"(start_datetime, job_id) {comparison} (?, ?)")
+            values.extend(after)
+        if statuses:
+            clauses.append(f"status IN ({', '.join('?' for _ in statuses)})")
+            values.extend(statuses)
+        if source_name is not None:
+            clauses.append("source_name = ?")
+            values.append(source_name)
+        if since is not None:
+            clauses.append("start_datetime >= ?")
+            values.append(since)
+        if until is not None:
+            clauses.append("start_datetime < ?")
+            values.append(until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        direction = "DESC" if descending else "ASC"
+        rows = self.connect().execute(
+            f"SELECT * FROM jobs {where} "  # nosec B608
+            f"ORDER BY start_datetime {direction}, job_id {direction} LIMIT ?",
+            (*values, limit),
+        )
+        return [dict(row) for row in rows]
+
+    def version(self) -> Tuple[float, int]:
+        """the time of the most recent change to any job and the number of jobs"""
+        row = (
+            self.connect()
+            .execute("SELECT MAX(updated_at) AS changed, COUNT(*) AS count FROM jobs")
+            .fetchone()
+        )
+        return float(row["changed"] or 0), int(row["count"])
+
+    def job_for_container(self, container_id: str) -> Optional[str]:
+        """the id of the job whose container has the given (full or short) id"""
+        row = (
+            self.connect()
+            .execute(
+                "SELECT job_id FROM jobs WHERE container_id != '' AND "
+                "(container_id = ? OR ? LIKE container_id || '%')",
+                (container_id, container_id),
+            )
+            .fetchone()
+        )
+        return None if row is None else str(row["job_id"])
+
+    def jobs_with_status(
+        self, *statuses: str, column: str = "status"
+    ) -> List[Dict[str, Any]]:
+        """
+        the catalogued jobs which currently have one of the given statuses in
+        the given status column
+        """
+        if column not in STATUS_COLUMNS:
+            raise ValueError(f"unknown status column {column}")
+        placeholders = ", ".join("?" for _ in statuses)
+        rows = self.connect().execute(
+            f"SELECT * FROM jobs WHERE {column} IN ({placeholders})",  # nosec B608
+            statuses,
+        )
+        return [dict(row) for row in rows]
+
+    def status_counts(self, column: str = "status") -> Dict[str, int]:
+        """the number of catalogued jobs with each status in the given column"""
+        if column not in STATUS_COLUMNS:
+            raise ValueError(f"unknown status column {column}")
+        rows = self.connect().execute(
+            f"SELECT {column} AS status, COUNT(*) AS count "  # nosec B608
+            f"FROM jobs GROUP BY {column}"
+        )
+        return {str(row["status"]): int(row["count"]) for row in rows}
@@ -1,28 +1,58 @@
 """models related to docker container jobs"""
 
+import base64
 import datetime
+import fcntl
 import json
 import logging
 import os
-import subprocess  # nosec B404
+import shutil
+import threading
 import time
+from contextlib import contextmanager
+from functools import partial
 from pathlib import Path
 from typing import (
+    Callable,
     Dict,
+    Iterator,
     List,
     Literal,
     Mapping,
     Optional,
     Self,
     Sequence,
+    Tuple,
     TypeAlias,
     Union,
 )
 
-from docker import APIClient
+from docker.errors import NotFound
 from pydantic import BaseModel
 
-from ..compose import Compose
+from ..compose import PROJECT_LABEL, Compose, DockerClient, shared_docker_client
+from ..images import image_pins
+from ..launcher import ServiceLauncher
+from ..utils.blobs import BlobStore
+from ..utils.logs import LogReader
+from ..utils.progress import (
+    PROGRESS_FILENAME,
+    ETLProgress,
+    ProgressTracker,
+    etl_progress,
+    load_progress,
+    table_history,
+)
+from ..utils.timeline import (
+    FINISHED_PHASE,
+    TIMELINE_FILENAME,
+    PhaseSpan,
+    PhaseStats,
+    Timeline,
+    phase_stats,
+)
+from ..vocab import decide_reload, vocab_fingerprint
+from .catalog import JobCatalog, format_datetime
 
 logger = logging.getLogger(__name__)
 
@@ -52,6 +82,13 @@ class JobItem(BaseModel):
     source_date: str
 
 
+class JobPage(BaseModel):
+    """container class for a page of the list_jobs api call"""
+
+    jobs: List[JobItem]
+    next_cursor: Optional[str] = None
+
+
 class JobDetail(BaseModel):
     """container class for the get_job api call"""
 
@@ -63,50 +100,271 @@ class JobDetail(BaseModel):
     sourceDate: str
     etlVersion: str
     cdmVersion: str
+    # only the tail of the log is included; see the job log endpoint for the rest
     log: str
-
-
-def make_job_id() -> str:
-    """generate a new job_id which can be used as a JobDir subdirectory"""
-    return str(int(time.time()))
+    logSize: int
+    # the phases the job went through, and how long each took
+    timeline: List[PhaseSpan] = []
+    # how far the etl has got, as parsed from its log
+    progress: Optional[ETLProgress] = None
+
+
+# the number of earlier runs the etl's remaining time is estimated from
+PROGRESS_HISTORY_JOBS = 20
+
+# the amount of log included in a JobDetail
+DETAIL_LOG_LINES = 100
+DETAIL_LOG_BYTES = 64 * 1024
+
+
+def make_job_id(base: Optional[Path] = None) -> str:
+    """
+    generate a new job_id which can be used as a JobDir subdirectory; given the
+    job directory, the subdirectory is created, with the id moved on by a second
+    for as long as it is taken (so jobs created in the same second differ)
+    """
+    job_id = int(time.time())
+    if base is None:
+        return str(job_id)
+    base.mkdir(parents=True, exist_ok=True)
+    while True:
+        try:
+            (base / str(job_id)).mkdir()
+            return str(job_id)
+        except FileExistsError:
+            job_id += 1
+
+
+JOB_ID_LABEL = "switchbox.job_id"
+
+ACTIVE_STATUSES = ("created", "running", "paused", "restarting")
+# statuses of jobs which are on their way to being launched
+PENDING_STATUSES = ("validating", "normalizing", "queued")
+# jobs with these statuses are done with, once their aresindexer stage is too
+FINISHED_STATUSES = ("exited", "dead", "invalid", "failed", "cached", "cancelled")
+SETTLED_STAGES = ("", "exited", "dead", "skipped", "failed")
+
+# serializes read-modify-write cycles on job status files between threads;
+# between processes (server workers) they are serialized with a lock file
+status_lock = threading.RLock()
+STATUS_LOCK_FILENAME = ".status.lock"
+# the job dir whose lock file each thread holds, for re-entrant updates
+_status_flocks = threading.local()
+
+# set while a background watcher keeps job statuses current from the docker
+# events stream; when it is set, reads are served from the saved status alone
+status_tracking = threading.Event()
+# the catalog meta key under which the pid of the tracking process is shared
+# with the other processes serving the same job directory
+TRACKING_META = "tracking_pid"
+
+
+def set_tracking(base: Path, active: bool):
+    """record whether this process's watcher keeps the statuses in base current"""
+    catalog = get_catalog(base)
+    if active:
+        status_tracking.set()
+        catalog.set_meta(TRACKING_META, str(os.getpid()))
+    else:
+        status_tracking.clear()
+        if catalog.get_meta(TRACKING_META) == str(os.getpid()):
+            catalog.set_meta(TRACKING_META, "")
+
+
+def is_tracking(base: Path) -> bool:
+    """whether a watcher in this or another process keeps the statuses current"""
+    if status_tracking.is_set():
+        return True
+    pid = get_catalog(base).get_meta(TRACKING_META)
+    if not pid or not pid.isdigit() or int(pid) == os.getpid():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
 
 
 def inspect_container(container_id: str):
     """ask docker for the status of the given container"""
-    client = APIClient()
-    return client.inspect_container(container_id)
-
-
-def list_jobs(base: Path) -> List[JobItem]:
-    """list the JobItem(s) found in the given job directory"""
-    result = []
+    return shared_docker_client().api.inspect_container(container_id)
+
+
+def same_container(saved_id: Optional[Union[str, int]], container_id: str) -> bool:
+    """whether a saved (possibly short) container id refers to the given container"""
+    return bool(saved_id) and container_id.startswith(str(saved_id).strip())
+
+
+def refresh_job_statuses(
+    base: Path,
+    project_name: str = "switchbox",
+    docker_client: Optional[DockerClient] = None,
+) -> int:
+    """
+    bring the saved status of every active job up to date using one filtered
+    container listing; only the containers whose state differs from the saved
+    status are inspected. returns the number of jobs whose status changed
+    """
+    catalog = get_catalog(base)
+    active = [
+        row for row in catalog.jobs_with_status(*ACTIVE_STATUSES) if row["container_id"]
+    ]
+    if not active:
+        return 0
+
+    client = docker_client if docker_client is not None else shared_docker_client()
+    summaries = client.api.containers(
+        all=True, filters={"label": f"{PROJECT_LABEL}={project_name}"}
+    )
+    changed = 0
+    for row in active:
+        summary = next(
+            (c for c in summaries if c["Id"].startswith(row["container_id"])), None
+        )
+        if summary is None:
+            logger.warning(
+                "container %s of job %s no longer exists",
+                row["container_id"],
+                row["job_id"],
+            )
+            continue
+        if summary["State"] == row["status"]:
+            continue
+        state = client.api.inspect_container(summary["Id"])["State"]
+        JobDir.open(base, row["job_id"]).update_status(
+            partial(JobStatus.with_container_state, state=state)
+        )
+        changed += 1
+    return changed
+
+
+_catalogs: Dict[Path, JobCatalog] = {}
+_catalogs_lock = threading.RLock()
+# sqlite connections must not be shared with forked (server worker) processes
+os.register_at_fork(after_in_child=_catalogs.clear)
+
+
+def get_catalog(base: Path) -> JobCatalog:
+    """
+    return the process-wide catalog for the given job directory; the first time
+    a job directory is seen without a catalog, the catalog is built from the
+    existing job subdirectories
+    """
+    with _catalogs_lock:
+        if (catalog := _catalogs.get(base)) is None:
+            base.mkdir(parents=True, exist_ok=True)
+            catalog = JobCatalog(base)
+            if not catalog.is_built():
+                rebuild_catalog(base, catalog)
+            _catalogs[base] = catalog
+        return catalog
+
+
+def rebuild_catalog(base: Path, catalog: JobCatalog):
+    """(re)populate the given catalog from the job subdirectories of base"""
+    logger.info("building job catalog from %s", base)
+    count = 0
     for subdir in base.iterdir():
+        if subdir.name.startswith("."):
+            continue
         if not subdir.is_dir():
             logger.warning("unrecognized entity in job directory: %s", subdir)
             continue
-        job_id = subdir.name
-        job = Job.open(job_id, base)
-        config = job.job_dir.get_config()
-        status = job.job_dir.get_latest_status()
-
-        result.append(
-            JobItem(
-                job_id=job_id,
-                start_datetime=status.start_dt,
-                status=status.status,
-                source_name=str(config.get("cdm_source_name", "")),
-                source_date=str(config.get("source_release_date", "")),
-            )
-        )
-    return result
+        job_dir = JobDir.open(base, subdir.name)
+        catalog.add_job(job_dir.job_id)
+        job_dir.catalog_config(job_dir.get_config(), catalog)
+        job_dir.catalog_status(job_dir.get_status(), catalog)
+        count += 1
+    catalog.set_meta("built_at", datetime.datetime.now().isoformat())
+    logger.info("job catalog built with %s job(s)", count)
+
+
+def job_item(row: Mapping) -> JobItem:
+    """convert a catalog row into a JobItem"""
+    return JobItem(
+        job_id=row["job_id"],
+        start_datetime=row["start_datetime"] or datetime.datetime.min,
+        status=row["status"],
+        source_name=row["source_name"],
+        source_date=row["source_date"],
+    )
+
+
+def ensure_fresh_statuses(base: Path):
+    """
+    without a watcher, jobs which may still be changing need a refresh from
+    docker before the catalog can answer for them
+    """
+    if not is_tracking(base):
+        refresh_job_statuses(base)
+
+
+def list_jobs(base: Path) -> List[JobItem]:
+    """list the JobItem(s) found in the given job directory"""
+    ensure_fresh_statuses(base)
+    return [job_item(row) for row in get_catalog(base).list_jobs()]
+
+
+def encode_cursor(row: Mapping) -> str:
+    """an opaque pagination cursor pointing just after the given catalog row"""
+    raw = json.dumps([row["start_datetime"], row["job_id"]]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """the (start_datetime, job_id) position encoded in a pagination cursor"""
+    try:
+        start_datetime, job_id = json.loads(base64.urlsafe_b64decode(cursor))
+    except (ValueError, TypeError) as err:
+        raise ValueError(f"invalid cursor: {cursor}") from err
+    return str(start_datetime), str(job_id)
+
+
+def query_jobs(
+    base: Path,
+    limit: int,
+    cursor: Optional[str] = None,
+    statuses: Sequence[str] = (),
+    source_name: Optional[str] = None,
+    since: Optional[datetime.datetime] = None,
+    until: Optional[datetime.datetime] = None,
+    descending: bool = False,
+) -> JobPage:
+    """
+    a page of the jobs in the given job directory, ordered by start time;
+    raises ValueError for an invalid cursor
+    """
+    rows = get_catalog(base).query_jobs(
+        limit + 1,
+        after=decode_cursor(cursor) if cursor else None,
+        statuses=statuses,
+        source_name=source_name,
+        since=format_datetime(since) if since else None,
+        until=format_datetime(until) if until else None,
+        descending=descending,
+    )
+    return JobPage(
+        jobs=[job_item(row) for row in rows[:limit]],
+        next_cursor=encode_cursor(rows[limit - 1]) if len(rows) > limit else None,
+    )
 
 
-def get_job(base: Path, job_id: str) -> JobDetail:
-    """get the data from the job with the given id in the given job directory"""
+def get_job(base: Path, job_id: str, csv_params: Sequence[str] = ()) -> JobDetail:
+    """
+    get the data from the job with the given id in the given job directory;
+    csv_params are the names of the etl's csv params, the tables its progress
+    is measured in
+    """
     job = Job.open(job_id, base)
     config = job.job_dir.get_config()
     status = job.job_dir.get_latest_status()
-    log = job.job_dir.get_log()
+    reader = job.job_dir.log_reader()
+    log_start = max(
+        reader.tail_offset(DETAIL_LOG_LINES), reader.size - DETAIL_LOG_BYTES
+    )
+    log = reader.read_bytes(log_start).decode("utf-8", "replace")
 
     return JobDetail(
         id=job_id,
@@ -118,18 +376,235 @@ def get_job(base: Path, job_id: str) -> JobDetail:
         etlVersion="1.0.0",
         cdmVersion="5.4",
         log=log,
+        logSize=reader.size,
+        timeline=job.job_dir.timeline().spans(),
+        progress=etl_progress(
+            ProgressTracker(reader, job.job_dir.host_path).update(),
+            csv_params,
+            {item.param_name: item.rows for item in job.job_dir.get_inputs()},
+            (
+                recent_table_seconds(base)
+                if status.status in (*PENDING_STATUSES, "launching", *ACTIVE_STATUSES)
+                else {}
+            ),
+        ),
     )
 
 
-class JobStatus(BaseModel):
-    """file structure for job_dir status file"""
+def recent_table_seconds(
+    base: Path, limit: int = PROGRESS_HISTORY_JOBS
+) -> Dict[str, float]:
+    """the median time each etl table took, across the most recent finished jobs"""
+    rows = get_catalog(base).query_jobs(limit, statuses=["exited"], descending=True)
+    return table_history(
+        load_progress(base / row["job_id"] / PROGRESS_FILENAME) for row in rows
+    )
+
+
+def recent_phase_stats(base: Path, limit: int) -> List[PhaseStats]:
+    """percentile phase durations across the most recently started jobs"""
+    rows = get_catalog(base).query_jobs(limit, descending=True)
+    # (not through JobDir.open, which would recreate a job removed meanwhile)
+    return phase_stats(
+        Timeline(base / row["job_id"] / TIMELINE_FILENAME).events() for row in rows
+    )
+
+
+class ContainerState(BaseModel):
+    """the state of a job container, as saved in the job_dir status file"""
 
     container_id: Optional[Union[str, int]] = 0
-    status: ContainerStatus = "created"
+    status: str = "created"
     exit_code: int = -255
     start_dt: datetime.datetime = datetime.datetime.min
     exit_dt: datetime.datetime = datetime.datetime.min
 
+    def with_container_state(self, state: Mapping) -> Self:
+        """
+        return a copy of this status updated from the "State" section of a
+        docker container inspection
+        """
+        return self.model_validate(
+            {
+                **self.model_dump(),
+                "status": state["Status"],
+                "exit_code": state["ExitCode"],
+                "start_dt": state.get("StartedAt", self.start_dt),
+                "exit_dt": state.get("FinishedAt", self.exit_dt),
+            }
+        )
+
+
+JobState: TypeAlias = Literal[
+    # the input files are being checked before the job is queued
+    "validating",
+    # the input files failed the pre-flight checks; see the preflight report
+    "invalid",
+    # the input files are being rewritten in the canonical csv form
+    "normalizing",
+    # waiting for an etl slot
+    "queued",
+    # admitted, the etl container is being launched
+    "launching",
+    # the etl container could not be launched
+    "failed",
+    # an identical job ran successfully before; see cached_from
+    "cached",
+    # stopped before its etl was launched
+    "cancelled",
+    ContainerStatus,
+]
+
+StageState: TypeAlias = Literal[
+    # the etl is still to finish
+    "waiting",
+    # the stage is due to be launched
+    "pending",
+    # admitted, the stage container is being launched
+    "launching",
+    # the etl failed so the stage was not run
+    "skipped",
+    # the stage could not be launched
+    "failed",
+    ContainerStatus,
+]
+
+
+class StageStatus(ContainerState):
+    """the status of a post-etl stage of a job (e.g. the aresindexer run)"""
+
+    container_id: Optional[Union[str, int]] = None
+    status: StageState = "waiting"
+    attempts: int = 0
+    error: str = ""
+
+
+class JobStatus(ContainerState):
+    """file structure for job_dir status file"""
+
+    status: JobState = "created"
+    # what the launch of the etl is doing, while the job is "launching"
+    launch_step: str = ""
+    error: str = ""
+    priority: int = 0
+    queued_dt: Optional[datetime.datetime] = None
+    admitted_dt: Optional[datetime.datetime] = None
+    aresindexer: Optional[StageStatus] = None
+    # the job's inputs, config & etl image, for the result cache
+    cache_key: str = ""
+    # the earlier job whose results stand in for this one's
+    cached_from: str = ""
+    # the vocabulary the etl was launched with, and whether it was to reload it
+    vocab_fingerprint: str = ""
+    reload_vocab: Optional[bool] = None
+    # the process validating, normalizing or launching the job (see
+    # scheduler.current_owner), so that only a dead owner's work is taken over
+    owner: str = ""
+    # when the job & its aresindexer stage were done with (see set_status)
+    finished_dt: Optional[datetime.datetime] = None
+
+    def with_launch_step(self, step: str) -> Optional[Self]:
+        """this status with the given launch step, while the launch is ongoing"""
+        if self.container_id:
+            # launched already, the watcher has seen its container
+            return None
+        return self.model_copy(update={"launch_step": step})
+
+
+def job_phase(status: JobStatus) -> str:
+    """
+    the phase of a job with the given status; transitions between phases are
+    recorded in the job's timeline as its status is updated
+    """
+    stage = status.aresindexer
+    if status.status in PENDING_STATUSES:
+        return status.status
+    if status.status == "launching" or (
+        status.status == "created" and status.container_id
+    ):
+        # the launch steps include pulling images and waiting for the cdmdb
+        return f"launching: {status.launch_step}" if status.launch_step else "launching"
+    if status.status in ACTIVE_STATUSES:
+        # a job without a container is still being uploaded
+        return "etl" if status.container_id else "upload"
+    if status.status in ("exited", "dead") and stage is not None:
+        return stage_phase(stage)
+    return FINISHED_PHASE
+
+
+def stage_phase(stage: StageStatus) -> str:
+    """the phase of a job whose etl has exited, by its aresindexer stage"""
+    if stage.status in ("waiting", "pending"):
+        return "etl exited" if stage.status == "waiting" else "aresindexer queued"
+    if stage.status == "launching" or (
+        stage.status == "created" and stage.container_id
+    ):
+        return "aresindexer launching"
+    if stage.status in ACTIVE_STATUSES:
+        return "aresindexer"
+    return FINISHED_PHASE
+
+
+def phase_start(status: JobStatus, phase: str) -> Optional[datetime.datetime]:
+    """
+    when docker says the phase started, for the phases which begin with a
+    container starting or exiting; None means now
+    """
+    stage = status.aresindexer
+    if phase == "etl":
+        return status.start_dt
+    if phase == "etl exited" or (
+        phase == FINISHED_PHASE and stage is None and status.container_id
+    ):
+        return status.exit_dt
+    if phase == "aresindexer" and stage is not None:
+        return stage.start_dt
+    if phase == FINISHED_PHASE and stage is not None and stage.container_id:
+        return stage.exit_dt
+    return None
+
+
+class InputFile(BaseModel):
+    """description of an uploaded input file, as recorded at ingestion"""
+
+    param_name: str
+    filename: str
+    path: str
+    sha256: str
+    size: int
+    rows: int
+    delimiter: str = ""
+    columns: List[str] = []
+
+
+class FileReport(BaseModel):
+    """the pre-flight validation result of one input file"""
+
+    param_name: str
+    filename: str = ""
+    encoding: str = ""
+    delimiter: str = ""
+    rows: int = 0
+    columns: List[str] = []
+    # problems which would fail the etl
+    errors: List[str] = []
+    # oddities which the etl may get past
+    warnings: List[str] = []
+
+    @property
+    def ok(self) -> bool:
+        """whether the file passed"""
+        return not self.errors
+
+
+class PreflightReport(BaseModel):
+    """the pre-flight validation result of a job's input files"""
+
+    ok: bool
+    files: List[FileReport]
+    # seconds the validation took
+    elapsed: float = 0.0
+
 
 class MountRef(BaseModel):
     """named volume/bind-mount container"""
@@ -157,13 +632,15 @@ class JobDir(BaseModel):
         log_subdir = host_path / "log"
         config_file = host_path / "config.json"
         status_file = host_path / "status.json"
+        # (a new job's directory may have been created to reserve its id)
+        is_new = not status_file.exists()
 
         data_subdir.mkdir(parents=True, exist_ok=True)
         log_subdir.mkdir(parents=True, exist_ok=True)
         config_file.touch(exist_ok=True)
         status_file.touch(exist_ok=True)
 
-        return cls(
+        job_dir = cls(
             host_path=host_path,
             data_subdir=data_subdir,
             log_subdir=log_subdir,
@@ -171,11 +648,41 @@ class JobDir(BaseModel):
             status_file=status_file,
             job_id=job_id,
         )
+        if is_new:
+            get_catalog(base_path).add_job(job_id)
+        return job_dir
+
+    @property
+    def catalog(self) -> JobCatalog:
+        """the catalog of the job directory this job_dir lives in"""
+        return get_catalog(self.host_path.parent)
+
+    def catalog_config(self, values: JobConfig, catalog: Optional[JobCatalog] = None):
+        """copy the catalogued fields of the given config into the catalog"""
+        (catalog or self.catalog).update_config(
+            self.job_id,
+            source_name=str(values.get("cdm_source_name", "")),
+            source_date=str(values.get("source_release_date", "")),
+        )
+
+    def catalog_status(self, status: JobStatus, catalog: Optional[JobCatalog] = None):
+        """copy the catalogued fields of the given status into the catalog"""
+        (catalog or self.catalog).update_status(
+            self.job_id,
+            status=status.status,
+            start_datetime=status.start_dt,
+            container_id=status.container_id,
+            aresindexer_status=status.aresindexer.status if status.aresindexer else "",
+            priority=status.priority,
+            queued_at=status.queued_dt.timestamp() if status.queued_dt else 0,
+            finished_at=status.finished_dt.timestamp() if status.finished_dt else 0,
+        )
 
     def set_config(self, values: JobConfig):
         """replace the config file in the job_dir with the given values"""
         with open(self.config_file, "wt", encoding="utf-8") as cfgfh:
             json.dump(values, cfgfh, indent=2)
+        self.catalog_config(values)
 
     def get_config(self) -> JobConfig:
         """the parsed contents of the job_dir config file"""
@@ -189,18 +696,17 @@ class JobDir(BaseModel):
     def get_latest_status(self) -> JobStatus:
         """get the status of a container (and ensure it is up-to-date info)"""
         saved_status = self.get_status()
-        if not saved_status.container_id or saved_status.status == "exited":
+        if (
+            not saved_status.container_id
+            or saved_status.status == "exited"
+            or is_tracking(self.host_path.parent)
+        ):
             return saved_status
 
         container_info = inspect_container(str(saved_status.container_id).strip())
-
-        saved_status.status = container_info["State"]["Status"]
-        saved_status.exit_code = container_info["State"]["ExitCode"]
-        saved_status.start_dt = container_info["State"]["StartedAt"]
-        saved_status.exit_dt = container_info["State"]["FinishedAt"]
-
-        self.set_status(saved_status)
-        return saved_status
+        return self.update_status(
+            partial(JobStatus.with_container_state, state=container_info["State"])
+        )
 
     def get_status(self) -> JobStatus:
         """returns the status of the job in the given job_dir"""
@@ -211,25 +717,111 @@ class JobDir(BaseModel):
                 return JobStatus(**json_data)
         return JobStatus()
 
-    def get_log(self) -> str:
-        """returns the text content of the etl job log"""
-        # Ensure the directory exists and is a directory
-        if not self.log_subdir.exists() or not self.log_subdir.is_dir():
-            raise ValueError("log_subdir a valid directory")
-
-        # Gather all text contents from files in the directory
-        log_data = ""
-        for file_path in self.log_subdir.iterdir():
-            if file_path.is_file():
-                with file_path.open("r", encoding="utf-8") as file:
-                    log_data += file.read()
+    @property
+    def inputs_file(self) -> Path:
+        """file describing the input files which were uploaded with the job"""
+        return self.host_path / "inputs.json"
+
+    def set_inputs(self, inputs: Sequence[InputFile]):
+        """record the descriptions of the job's uploaded input files"""
+        with open(self.inputs_file, "wt", encoding="utf-8") as inputsfh:
+            json.dump([i.model_dump() for i in inputs], inputsfh, indent=2)
+
+    def get_inputs(self) -> List[InputFile]:
+        """the descriptions of the job's uploaded input files"""
+        if not self.inputs_file.exists():
+            return []
+        with open(self.inputs_file, "rt", encoding="utf-8") as inputsfh:
+            return [InputFile(**item) for item in json.load(inputsfh)]
+
+    @property
+    def preflight_file(self) -> Path:
+        """the pre-flight validation report of the job's input files"""
+        return self.host_path / "preflight.json"
+
+    def set_preflight(self, report: PreflightReport):
+        """store the given pre-flight report with the job"""
+        with open(self.preflight_file, "wt", encoding="utf-8") as reportfh:
+            reportfh.write(report.model_dump_json(indent=2))
+
+    def get_preflight(self) -> Optional[PreflightReport]:
+        """the job's pre-flight report, if it was validated"""
+        if not self.preflight_file.exists():
+            return None
+        with open(self.preflight_file, "rt", encoding="utf-8") as reportfh:
+            return PreflightReport.model_validate_json(reportfh.read())
+
+    def remove(self):
+        """delete the job_dir and everything in it, and the blobs it alone used"""
+        inputs = self.get_inputs() if self.host_path.is_dir() else []
+        # uncatalogued first, so that the job's containers can't be traced to it
+        self.catalog.remove_job(self.job_id)
+        shutil.rmtree(self.host_path, ignore_errors=True)
+        if inputs:
+            BlobStore.for_job_dir(self.host_path.parent).collect(
+                item.sha256 for item in inputs
+            )
 
-        return log_data
+    def log_reader(self) -> LogReader:
+        """a reader for the etl job log"""
+        return LogReader(self.log_subdir)
+
+    def timeline(self) -> Timeline:
+        """the job's phase timeline"""
+        return Timeline(self.host_path / TIMELINE_FILENAME)
+
+    def update_status(
+        self, change: Callable[[JobStatus], Optional[JobStatus]]
+    ) -> JobStatus:
+        """
+        replace the job's saved status with the result of calling change on it,
+        without interference from other threads updating the same status; when
+        change returns None the saved status is left as it is
+        """
+        with self.locked_status():
+            status = self.get_status()
+            # (change may modify the status in place)
+            phase = job_phase(status)
+            if (changed := change(status)) is None:
+                return status
+            self.set_status(changed)
+            if (new_phase := job_phase(changed)) != phase:
+                self.timeline().record(new_phase, phase_start(changed, new_phase))
+            return changed
+
+    @contextmanager
+    def locked_status(self) -> Iterator[None]:
+        """hold the job's status lock, both within and between processes"""
+        with status_lock:
+            if getattr(_status_flocks, "held", None) == self.host_path:
+                # re-entered by the holder
+                yield
+                return
+            with open(self.host_path / STATUS_LOCK_FILENAME, "ab") as lockfh:
+                fcntl.flock(lockfh, fcntl.LOCK_EX)
+                _status_flocks.held = self.host_path
+                try:
+                    yield
+                finally:
+                    _status_flocks.held = None
+                    fcntl.flock(lockfh, fcntl.LOCK_UN)
 
     def set_status(self, status: JobStatus):
-        """returns the status of the job in the given job_dir"""
-        with open(self.status_file, "wt", encoding="utf-8") as statusfh:
+        """replace the status file in the job_dir with the given status"""
+        stage = status.aresindexer.status if status.aresindexer else ""
+        finished = status.status in FINISHED_STATUSES and stage in SETTLED_STAGES
+        if finished != (status.finished_dt is not None):
+            status.finished_dt = (
+                datetime.datetime.now(tz=datetime.timezone.utc) if finished else None
+            )
+        # written aside and renamed into place so readers never see it partially
+        temp_file = self.status_file.with_name(
+            f".{self.status_file.name}.{os.getpid()}.{threading.get_ident()}"
+        )
+        with open(temp_file, "wt", encoding="utf-8") as statusfh:
             statusfh.write(status.model_dump_json(indent=2))
+        os.replace(temp_file, self.status_file)
+        self.catalog_status(status)
 
 
 class Job(BaseModel):
@@ -257,7 +849,7 @@ class Job(BaseModel):
     ) -> Self:
         """return a new instance of Job with the given values"""
         base_path = Path("/data/jobs") if not base_path else base_path
-        job_id = make_job_id() if not job_id else job_id
+        job_id = make_job_id(base_path) if not job_id else job_id
         job_dir = JobDir.open(base_path, job_id)
         if not mounts:
             mounts = []
@@ -277,19 +869,13 @@ class Job(BaseModel):
             status=status,
         )
 
-    def start(self) -> JobStatus:
-        """start the etl job"""
-
-        project_dir = Path(
-            os.path.normpath(
-                os.path.join(os.path.dirname(__file__), "..", "subdeployment")
-            )
-        )
-
-        c = Compose(
-            project_dir=project_dir,
-            project_name="switchbox",
-        )
+    def start(self, native: bool = True, vocab_dir: Optional[Path] = None) -> JobStatus:
+        """
+        start the etl job; with native the container is created through the
+        docker api rather than with 'docker compose run' where possible. unless
+        the job's config says otherwise, the etl reloads the vocabulary only
+        when it differs from the one in the cdmdb (see vocab_dir)
+        """
         environment = {
             "LOG_DIR": str(self.job_dir.log_subdir),
             "DATADIR": str(self.job_dir.data_subdir),
@@ -297,31 +883,117 @@ class Job(BaseModel):
             **{k.upper(): str(v) for k, v in self.job_dir.get_config().items()},
         }
 
-        result = c.run(
+        def report(step: str):
+            logger.debug("launching job %s: %s", self.job_id, step)
+            self.job_dir.update_status(partial(JobStatus.with_launch_step, step=step))
+
+        base = self.job_dir.host_path.parent
+        report("fingerprinting vocabulary")
+        fingerprint, reload_vocab = decide_reload(
+            get_catalog(base),
+            vocab_fingerprint(base, vocab_dir),
+            environment.get("RELOAD_VOCAB"),
+        )
+        if reload_vocab is not None:
+            environment["RELOAD_VOCAB"] = "1" if reload_vocab else ""
+            logger.info("job %s reloads the vocabulary: %s", self.job_id, reload_vocab)
+
+        # after the etl exits the job supervisor runs the aresindexer; this is
+        # recorded before the launch so that a quick exit can't be missed
+        def await_etl(status: JobStatus) -> JobStatus:
+            status.aresindexer = StageStatus()
+            status.vocab_fingerprint = fingerprint
+            status.reload_vocab = reload_vocab
+            return status
+
+        self.job_dir.update_status(await_etl)
+
+        # the etl runs on the image the warmer pulled, if it has
+        launcher = ServiceLauncher(job_compose(), images=image_pins(base))
+        container_id = launcher.run(
             "etl",
-            detach=True,
             env=environment,
-        )
-        container_id = result.stdout.strip()
-
-        # after the etl exits we run ares
-        start_afterrunner(
-            container_id,
-            str(project_dir),
-            ["docker", "compose", "run", "--rm", "aresindexer"],
+            labels={JOB_ID_LABEL: self.job_id},
+            native=native,
+            progress=report,
         )
 
-        status = self.job_dir.get_status()
-        status.container_id = container_id
-        status.status = "running"
-        self.job_dir.set_status(status)
+        # the status watcher may have already recorded this container
+        def record_container(status: JobStatus) -> Optional[JobStatus]:
+            status.launch_step = ""
+            if same_container(status.container_id, container_id):
+                return status
+            status.container_id = container_id
+            status.status = "running"
+            return status
+
+        return self.job_dir.update_status(record_container)
+
+    @staticmethod
+    def cancel(status: JobStatus) -> Optional[JobStatus]:
+        """cancel a job whose etl isn't launched yet, or its pending stage"""
+        if status.status in PENDING_STATUSES:
+            status.status = "cancelled"
+            status.launch_step = ""
+        elif status.aresindexer is None or status.aresindexer.status not in (
+            "waiting",
+            "pending",
+        ):
+            return None
+        if status.aresindexer is not None:
+            status.aresindexer.status = "skipped"
         return status
 
-
-def start_afterrunner(target_container_id: str, workdir: str, command: List[str]):
-    """after the targeted container exits, cd to the given workdir and run the given command"""
-    command = ["/after_runner.sh", target_container_id, workdir, *command]
-    # pylint: disable=subprocess-popen-preexec-fn
-    with subprocess.Popen(command, preexec_fn=os.setsid):  # nosec B603
-        # using "with" here to control resource allocation (to make pylint happy)
-        pass
+    def containers(self) -> List[str]:
+        """the ids of the job's etl & aresindexer containers, running or not"""
+        status = self.job_dir.get_status()
+        ids = [status.container_id]
+        if status.aresindexer is not None:
+            ids.append(status.aresindexer.container_id)
+        return [str(container_id) for container_id in ids if container_id]
+
+    def stop(self, timeout: int = 10) -> JobStatus:
+        """
+        stop the job: a job which is still to be launched is cancelled, and its
+        running containers are stopped (their exit is recorded by the watcher);
+        a job which is being launched can't be stopped until it has been
+        """
+        status = self.job_dir.get_status()
+        if status.status == "launching" or (
+            status.aresindexer is not None and status.aresindexer.status == "launching"
+        ):
+            raise JobBusyError(f"job {self.job_id} is being launched")
+        self.job_dir.update_status(self.cancel)
+        for container_id in self.containers():
+            api = shared_docker_client().api
+            try:
+                if api.inspect_container(container_id)["State"]["Running"]:
+                    logger.info(
+                        "stopping container %s of job %s", container_id, self.job_id
+                    )
+                    api.stop(container_id, timeout=timeout)
+            except NotFound:
+                pass
+        return self.job_dir.get_status()
+
+    def delete(self, timeout: int = 10):
+        """stop the job and remove its containers, then remove the job itself"""
+        self.stop(timeout=timeout)
+        for container_id in self.containers():
+            try:
+                shared_docker_client().api.remove_container(container_id, force=True)
+            except NotFound:
+                pass
+        self.job_dir.remove()
+
+
+class JobBusyError(Exception):
+    """raised when a job can't be changed while it is being launched"""
+
+
+def job_compose() -> Compose:
+    """the Compose instance for the subdeployment project the jobs run in"""
+    project_dir = Path(
+        os.path.normpath(os.path.join(os.path.dirname(__file__), "..", "subdeployment"))
+    )
+    return Compose(project_dir=project_dir, project_name="switchbox")
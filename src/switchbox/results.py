@@ -0,0 +1,79 @@
+"""the etl result cache: finding an earlier, identical, successful run of a job"""
+
+import hashlib
+import json
+import logging
+from pathlib import Path
+from typing import Optional, Sequence
+
+from .images import image_pins
+from .models.job import InputFile, JobConfig, JobDir, JobStatus, get_catalog
+
+logger = logging.getLogger(__name__)
+
+# the catalog meta key of the cache key of the run whose results are in the
+# cdmdb & output volume, which every run overwrites
+LOADED_RESULTS_KEY = "loaded_results"
+
+
+def result_key(inputs: Sequence[InputFile], config: JobConfig, etl_digest: str) -> str:
+    """
+    the cache key of a job: a hash of its input files' hashes, its config and
+    the digest of the etl image it would run on
+    """
+    document = {
+        "inputs": sorted((item.param_name, item.sha256) for item in inputs),
+        "config": config,
+        "etl": etl_digest,
+    }
+    encoded = json.dumps(document, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def job_result_key(job_dir: JobDir) -> str:
+    """
+    the cache key of the given job, as submitted; empty when the etl image
+    hasn't been pinned to a digest, as its results can't be matched then
+    """
+    etl_digest = image_pins(job_dir.host_path.parent).get("etl", "")
+    if not etl_digest:
+        return ""
+    return result_key(job_dir.get_inputs(), job_dir.get_config(), etl_digest)
+
+
+def cached_result(base_path: Path, cache_key: str) -> Optional[str]:
+    """
+    the id of an earlier job which ran successfully with the given key,
+    provided its results haven't been overwritten by a later run since
+    """
+    if not cache_key:
+        return None
+    catalog = get_catalog(base_path)
+    if catalog.get_meta(LOADED_RESULTS_KEY) != cache_key:
+        return None
+    job_id = catalog.cached_result(cache_key)
+    if job_id is not None and not (base_path / job_id).is_dir():
+        return None
+    return job_id
+
+
+def forget_loaded_results(base_path: Path):
+    """note that an etl is about to overwrite the results of the previous run"""
+    get_catalog(base_path).set_meta(LOADED_RESULTS_KEY, "")
+
+
+def record_result(base_path: Path, job_id: str, status: JobStatus):
+    """
+    remember the job's results for later submissions, if it ran successfully:
+    both the etl and the aresindexer exited cleanly; they are those in the
+    cdmdb until the next run is launched
+    """
+    stage = status.aresindexer
+    if not status.cache_key or status.exit_code != 0:
+        return
+    if stage is None or stage.status != "exited" or stage.exit_code != 0:
+        return
+    catalog = get_catalog(base_path)
+    catalog.record_result(status.cache_key, job_id)
+    catalog.set_meta(LOADED_RESULTS_KEY, status.cache_key)
+    logger.debug("recorded the results of job %s", job_id)
@@ -0,0 +1,193 @@
+"""retention of finished jobs: compressing their files, then removing old jobs"""
+
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel
+
+from .models.job import FINISHED_STATUSES, SETTLED_STAGES, Job, JobDir, get_catalog
+from .utils.blobs import job_usage
+from .utils.compression import available_codec, compress_dir
+
+logger = logging.getLogger(__name__)
+
+# present in the directory of a job whose files have been compressed
+COMPRESSED_MARKER = ".compressed"
+
+
+class RetentionPolicy(BaseModel):
+    """what is kept of finished jobs; zero disables a limit"""
+
+    # seconds after a job finished that its data & logs are compressed
+    compress_after: float = 86400
+    codec: str = "gzip"
+    # seconds after a job finished that it is removed
+    max_age: float = 0
+    # the number of finished jobs which are kept
+    max_jobs: int = 0
+    # bytes the job directory may take up before the oldest jobs are removed
+    quota: int = 0
+
+
+class RetentionReport(BaseModel):
+    """what a retention sweep did"""
+
+    compressed: List[str] = []
+    removed: List[str] = []
+    freed_bytes: int = 0
+
+
+def finished_jobs(base_path: Path) -> List[Dict[str, Any]]:
+    """the catalogued jobs which are done with, the longest finished first"""
+    rows = [
+        row
+        for row in get_catalog(base_path).jobs_with_status(*FINISHED_STATUSES)
+        if row["aresindexer_status"] in SETTLED_STAGES
+    ]
+    return sorted(rows, key=lambda row: (finished_at(row), row["job_id"]))
+
+
+def finished_at(row: Dict[str, Any]) -> float:
+    """
+    when a catalogued job was done with; jobs which finished before this was
+    recorded go by their last update instead
+    """
+    return row["finished_at"] or row["updated_at"]
+
+
+def dir_usage(path: Path) -> int:
+    """the bytes the files under path take up on disk, each inode counted once"""
+    seen = set()
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            stat = os.lstat(os.path.join(dirpath, filename))
+            if (stat.st_dev, stat.st_ino) not in seen:
+                seen.add((stat.st_dev, stat.st_ino))
+                total += stat.st_blocks * 512
+    return total
+
+
+class Retention:
+    """
+    periodically compresses the data & logs of finished jobs and removes the
+    finished jobs which fall outside the policy's age, count and disk quota
+    limits (the longest finished first); it runs in a background thread at
+    the lowest cpu priority
+    """
+
+    base_path: Path
+    policy: RetentionPolicy
+    # pause between jobs, leaving the disk to others
+    pause: float = 0.1
+
+    def __init__(
+        self, base_path: Path, policy: RetentionPolicy, interval: float = 3600
+    ) -> None:
+        self.base_path = base_path
+        self.policy = policy
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """begin sweeping in a background thread"""
+        self._thread = threading.Thread(target=self.run, name="retention", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """stop sweeping, waiting for the job being processed"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def run(self):
+        """sweep now and then every interval"""
+        try:
+            # on linux this lowers the priority of just this thread
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+        except OSError:
+            logger.debug("unable to lower the priority of the retention thread")
+        while not self._stop.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception:  # pylint: disable=broad-exception-caught
+                logger.exception("retention sweep failed")
+
+    def sweep(self) -> RetentionReport:
+        """apply the policy to the finished jobs"""
+        policy = self.policy
+        report = RetentionReport()
+        rows = finished_jobs(self.base_path)
+        current = time.time()
+
+        doomed = set()
+        if policy.max_age:
+            doomed |= {
+                row["job_id"]
+                for row in rows
+                if current - finished_at(row) > policy.max_age
+            }
+        if policy.max_jobs and len(rows) > policy.max_jobs:
+            doomed |= {row["job_id"] for row in rows[: len(rows) - policy.max_jobs]}
+        if policy.quota:
+            usage = dir_usage(self.base_path)
+            for row in rows:
+                if usage <= policy.quota:
+                    break
+                if row["job_id"] not in doomed:
+                    doomed.add(row["job_id"])
+                    usage -= job_usage(self.base_path / row["job_id"]).exclusive_bytes
+
+        for row in rows:
+            if self._stop.is_set():
+                break
+            job_id = row["job_id"]
+            if job_id in doomed:
+                report.freed_bytes += self.remove_job(job_id)
+                report.removed.append(job_id)
+            elif (
+                policy.compress_after
+                and current - finished_at(row) > policy.compress_after
+                and not (self.base_path / job_id / COMPRESSED_MARKER).exists()
+            ):
+                report.freed_bytes += self.compress_job(job_id)
+                report.compressed.append(job_id)
+            else:
+                continue
+            self._stop.wait(self.pause)
+
+        if report.removed or report.compressed:
+            logger.info(
+                "retention removed %s job(s) and compressed %s, freeing %s bytes",
+                len(report.removed),
+                len(report.compressed),
+                report.freed_bytes,
+            )
+        return report
+
+    def remove_job(self, job_id: str) -> int:
+        """remove a job and its containers; returns the bytes freed"""
+        job = Job.open(job_id, self.base_path)
+        freed = job_usage(job.job_dir.host_path).exclusive_bytes
+        logger.info("retention is removing job %s", job_id)
+        job.delete()
+        return freed
+
+    def compress_job(self, job_id: str) -> int:
+        """compress the data & logs of a job; returns the bytes saved"""
+        job_dir = JobDir.open(self.base_path, job_id)
+        codec = available_codec(self.policy.codec)
+        before = job_usage(job_dir.host_path).exclusive_bytes
+        # input files linked to their blobs (see utils.blobs) are left as
+        # they are, so that they stay shared with the store
+        compress_dir(job_dir.data_subdir, codec, linked=False)
+        compress_dir(job_dir.log_subdir, codec)
+        (job_dir.host_path / COMPRESSED_MARKER).touch()
+        after = job_usage(job_dir.host_path).exclusive_bytes
+        logger.debug("compressed job %s: %s -> %s bytes", job_id, before, after)
+        return max(before - after, 0)
@@ -0,0 +1,435 @@
+"""admission control for etl jobs: a persistent, prioritized job queue"""
+
+import datetime
+import logging
+import os
+from concurrent.futures import Executor, ThreadPoolExecutor
+from functools import cache, partial
+from pathlib import Path
+from typing import List, Optional
+
+from .metrics import pid_alive
+from .models.job import Job, JobDir, JobState, JobStatus, PreflightReport, get_catalog
+from .results import cached_result, forget_loaded_results, job_result_key
+from .utils.blobs import BlobStore
+from .utils.data import get_param_spec
+from .utils.normalize import CANONICAL_DELIMITER, NormalizedFile, normalize_inputs
+from .utils.timeline import BOOT_ID
+from .utils.validate import DEFAULT_DATE_FORMAT, validate_inputs
+
+logger = logging.getLogger(__name__)
+
+# states in which a container holds one of the concurrency slots; jobs which
+# are being launched, or whose container is created but not yet started, hold
+# one too
+RUNNING_STATUSES = ("running", "paused", "restarting")
+
+
+def process_start(pid: int) -> int:
+    """
+    when the given process started, in clock ticks since boot, which tells it
+    apart from a later process given the same pid; 0 if it can't be told
+    """
+    try:
+        with open(f"/proc/{pid}/stat", "rt", encoding="ascii") as statfh:
+            # (the fields after the command name, which may contain spaces)
+            return int(statfh.read().rpartition(")")[2].split()[19])
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def current_owner() -> str:
+    """the owner string of this process: boot id, pid and process start"""
+    pid = os.getpid()
+    return f"{BOOT_ID}:{pid}:{process_start(pid)}"
+
+
+def owner_alive(owner: str) -> bool:
+    """whether the process with the given owner string is still running"""
+    boot, _, rest = owner.partition(":")
+    pid, _, start = rest.partition(":")
+    if boot != BOOT_ID or not pid.isdigit() or not pid_alive(int(pid)):
+        return False
+    return start in ("", "0") or str(process_start(int(pid))) == start
+
+
+def now() -> datetime.datetime:
+    """the current time, timezone-aware"""
+    return datetime.datetime.now(tz=datetime.timezone.utc)
+
+
+@cache
+def launch_executor(max_workers: int = 2) -> ThreadPoolExecutor:
+    """
+    the process-wide pool which launches admitted jobs, so that a slow launch
+    (e.g. one which pulls an image) never holds up a request
+    """
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job-launch")
+
+
+@cache
+def prepare_executor(max_workers: int = 2) -> ThreadPoolExecutor:
+    """
+    the process-wide pool which validates & normalizes submitted jobs; its
+    threads wait on the csv process pool, so they are kept apart from the
+    launches, which validated jobs would otherwise queue behind
+    """
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job-prepare")
+
+
+# the pools' threads don't exist in a forked child process
+os.register_at_fork(after_in_child=launch_executor.cache_clear)
+os.register_at_fork(after_in_child=prepare_executor.cache_clear)
+
+
+class JobQueue:  # pylint: disable=too-many-instance-attributes
+    """
+    a FIFO (within priority) queue of jobs waiting for an etl slot; the queue
+    itself is the set of jobs with the "queued" status, so it is persisted in
+    the job directory and survives restarts
+    """
+
+    base_path: Path
+
+    def __init__(
+        self,
+        base_path: Path,
+        max_running: int = 1,
+        native: bool = True,
+        executor: Optional[Executor] = None,
+        preflight: bool = False,
+        params_file: Optional[Path] = None,
+        normalize: bool = False,
+        columnar: bool = False,
+        dedup: bool = False,
+        result_cache: bool = False,
+        vocab_dir: Optional[Path] = None,
+        preparer: Optional[Executor] = None,
+    ) -> None:
+        self.base_path = base_path
+        self.max_running = max_running
+        self.native = native
+        self._executor = executor
+        self._preparer = preparer
+        # whether jobs' input files are validated before they are queued, and
+        # the param spec they are validated against
+        self.preflight = preflight
+        self.params_file = params_file
+        # whether jobs' input files are rewritten in the canonical csv form
+        # (and also as parquet) before they are queued
+        self.normalize = normalize
+        self.columnar = columnar
+        # whether normalized files are deduplicated in the blob store
+        self.dedup = dedup
+        # whether jobs identical to an earlier successful one are not rerun
+        self.result_cache = result_cache
+        # the vocabulary directory the etl's RELOAD_VOCAB is decided by
+        self.vocab_dir = vocab_dir
+
+    @property
+    def executor(self) -> Executor:
+        """the pool the launches are carried out on"""
+        return self._executor if self._executor is not None else launch_executor()
+
+    @property
+    def preparer(self) -> Executor:
+        """the pool the validations & normalizations are carried out on"""
+        return self._preparer if self._preparer is not None else prepare_executor()
+
+    def submit(self, job: Job, priority: int = 0, force: bool = False) -> JobStatus:
+        """
+        queue the given job and have whatever the limits allow launched in the
+        background; with preflight the job's input files are validated, and
+        with normalize they are normalized, (in the background) first. with
+        cache, a job identical to an earlier successful one isn't run (unless
+        forced) but refers to the earlier one's results. returns the job's
+        status once it is queued (or admitted, or being prepared, or cached)
+        """
+        cache_key = job_result_key(job.job_dir) if self.result_cache else ""
+        if not force and (earlier := cached_result(self.base_path, cache_key)):
+            logger.info("job %s has the results of job %s", job.job_id, earlier)
+            return job.job_dir.update_status(
+                partial(self.record_cached, cache_key=cache_key, earlier=earlier)
+            )
+
+        def enqueue(status: JobStatus) -> JobStatus:
+            status.status = self.first_status()
+            status.priority = priority
+            status.queued_dt = now()
+            status.cache_key = cache_key
+            status.owner = current_owner()
+            return status
+
+        job.job_dir.update_status(enqueue)
+        if self.preflight:
+            self.preparer.submit(self.validate, job.job_id)
+        elif self.normalize:
+            self.preparer.submit(self.normalize_job, job.job_id)
+        else:
+            logger.info("queued job %s with priority %s", job.job_id, priority)
+            self.dispatch()
+        return job.job_dir.get_status()
+
+    @staticmethod
+    def record_cached(status: JobStatus, cache_key: str, earlier: str) -> JobStatus:
+        """note in the given status that the job's results are an earlier job's"""
+        status.status = "cached"
+        status.cache_key = cache_key
+        status.cached_from = earlier
+        return status
+
+    def first_status(self) -> JobState:
+        """the status a submitted job starts out in"""
+        if self.preflight:
+            return "validating"
+        return "normalizing" if self.normalize else "queued"
+
+    def validate(self, job_id: str):
+        """
+        run the pre-flight checks on the job's input files, then normalize or
+        queue the job if they pass; the report is stored with the job either way
+        """
+        job_dir = JobDir.open(self.base_path, job_id)
+        next_status: JobState = "normalizing" if self.normalize else "queued"
+        try:
+            spec = get_param_spec(self.params_file)
+            # files are accepted with any delimiter when they are normalized
+            delimiter = "" if self.normalize else self.input_delimiter(job_dir)
+            report = validate_inputs(
+                job_dir.get_inputs(),
+                spec.csv_columns,
+                delimiter,
+                date_format=self.date_format(job_dir),
+            )
+        except Exception as err:  # pylint: disable=broad-exception-caught
+            # the checks themselves failing shouldn't hold the job up
+            logger.exception("unable to validate the inputs of job %s", job_id)
+            job_dir.update_status(
+                partial(self.record_validation, error=str(err), next_status=next_status)
+            )
+            self.proceed(job_id)
+            return
+        job_dir.set_preflight(report)
+        job_dir.update_status(
+            partial(self.record_validation, report=report, next_status=next_status)
+        )
+        if report.ok:
+            logger.info("job %s passed validation in %.1fs", job_id, report.elapsed)
+            self.proceed(job_id)
+        else:
+            logger.info("job %s failed validation", job_id)
+
+    def input_delimiter(self, job_dir: JobDir) -> str:
+        """the delimiter the job's input files are configured with"""
+        spec = get_param_spec(self.params_file)
+        default = getattr(spec.params.params.get("input_delimiter"), "default", "")
+        return str(job_dir.get_config().get("input_delimiter") or default or ";")
+
+    def date_format(self, job_dir: JobDir) -> str:
+        """the format of the dates in the job's input files, as the etl reads them"""
+        spec = get_param_spec(self.params_file)
+        default = getattr(spec.params.params.get("date_format"), "default", "")
+        return str(
+            job_dir.get_config().get("date_format") or default or DEFAULT_DATE_FORMAT
+        )
+
+    def proceed(self, job_id: str):
+        """carry on with a validated job: normalize it, or look for a slot"""
+        if self.normalize:
+            self.normalize_job(job_id)
+        else:
+            self.dispatch()
+
+    @staticmethod
+    def record_validation(
+        status: JobStatus,
+        report: Optional[PreflightReport] = None,
+        error: str = "",
+        next_status: JobState = "queued",
+    ) -> Optional[JobStatus]:
+        """move a validated job on, into the queue (or normalizing) or to invalid"""
+        if status.status != "validating":
+            return None
+        if report is not None and not report.ok:
+            failed = [f.param_name for f in report.files if not f.ok]
+            status.status = "invalid"
+            status.error = f"input file(s) failed validation: {', '.join(failed)}"
+        else:
+            status.status = next_status
+            status.error = f"validation skipped: {error}" if error else ""
+        return status
+
+    def normalize_job(self, job_id: str):
+        """
+        rewrite the job's input files in the canonical csv form and point the
+        etl's input_delimiter at it, then queue the job
+        """
+        job_dir = JobDir.open(self.base_path, job_id)
+        try:
+            spec = get_param_spec(self.params_file)
+            inputs = job_dir.get_inputs()
+            results = normalize_inputs(
+                inputs,
+                spec.csv_columns,
+                delimiter_hint=str(job_dir.get_config().get("input_delimiter") or ""),
+                columnar=self.columnar,
+            )
+        except Exception as err:  # pylint: disable=broad-exception-caught
+            logger.exception("unable to normalize the inputs of job %s", job_id)
+            results = [NormalizedFile(param_name="*", error=str(err))]
+
+        if failed := [r.param_name for r in results if r.error]:
+            error = f"input file(s) could not be normalized: {', '.join(failed)}"
+            job_dir.update_status(partial(self.record_normalized, error=error))
+            logger.info("job %s failed normalization", job_id)
+            return
+
+        by_param = {result.param_name: result for result in results}
+        if self.dedup:
+            store = BlobStore.for_job_dir(self.base_path)
+            for item in inputs:
+                if (result := by_param.get(item.param_name)) is not None:
+                    store.adopt(Path(item.path), result.sha256)
+        job_dir.set_inputs(
+            [
+                (
+                    item.model_copy(
+                        update={
+                            "delimiter": CANONICAL_DELIMITER,
+                            "size": by_param[item.param_name].size_out,
+                            "sha256": by_param[item.param_name].sha256,
+                        }
+                    )
+                    if item.param_name in by_param
+                    else item
+                )
+                for item in inputs
+            ]
+        )
+        job_dir.set_config(
+            {**job_dir.get_config(), "input_delimiter": CANONICAL_DELIMITER}
+        )
+        job_dir.update_status(self.record_normalized)
+        logger.info("queued job %s after normalizing its inputs", job_id)
+        self.dispatch()
+
+    @staticmethod
+    def record_normalized(status: JobStatus, error: str = "") -> Optional[JobStatus]:
+        """move a normalized job on, into the queue or to invalid"""
+        if status.status != "normalizing":
+            return None
+        status.status = "invalid" if error else "queued"
+        status.error = error
+        return status
+
+    def claim(self) -> List[str]:
+        """
+        admit queued jobs, highest priority and oldest first, until the running
+        limit is reached; returns the admitted job ids, which are then in the
+        "launching" state
+        """
+        catalog = get_catalog(self.base_path)
+        admitted = []
+        while job_id := catalog.claim_next(
+            "status",
+            waiting="queued",
+            claimed="launching",
+            active=RUNNING_STATUSES,
+            limit=self.max_running,
+            order_by="priority DESC, queued_at, job_id",
+            # (a container between its create & start events)
+            active_with_container=("created",),
+        ):
+
+            def admit(status: JobStatus) -> JobStatus:
+                status.status = "launching"
+                status.admitted_dt = now()
+                status.owner = current_owner()
+                return status
+
+            JobDir.open(self.base_path, job_id).update_status(admit)
+            admitted.append(job_id)
+        return admitted
+
+    def dispatch(self) -> List[str]:
+        """admit queued jobs and start their launch; returns the admitted job ids"""
+        admitted = self.claim()
+        for job_id in admitted:
+            self.executor.submit(self.launch, job_id)
+        return admitted
+
+    def launch(self, job_id: str):
+        """
+        start the etl of an admitted job; the steps of the launch and any
+        failure to launch are recorded in the job's status
+        """
+        job = Job.open(job_id, self.base_path)
+        forget_loaded_results(self.base_path)
+        try:
+            job.start(native=self.native, vocab_dir=self.vocab_dir)
+        except Exception as err:  # pylint: disable=broad-exception-caught
+            logger.exception("unable to launch job %s", job_id)
+            job.job_dir.update_status(partial(self.record_failure, err=err))
+            # the slot this job held is free again
+            self.dispatch()
+
+    @staticmethod
+    def record_failure(status: JobStatus, err: Exception) -> JobStatus:
+        """note a failed launch in the given status"""
+        status.status = "failed"
+        status.launch_step = ""
+        status.error = str(err)
+        if status.aresindexer is not None:
+            status.aresindexer.status = "skipped"
+        return status
+
+    def requeue_interrupted(self):
+        """
+        put jobs whose launch was interrupted (e.g. by a restart) back at the
+        head of the queue, and validate (or normalize) those whose validation
+        (or normalization) was; normalizing a file twice changes nothing. only
+        jobs whose owner process has gone are taken over, work still under way
+        elsewhere (or in this process) is left to its owner
+        """
+        catalog = get_catalog(self.base_path)
+        for row in catalog.jobs_with_status("validating"):
+            if self.take_over(row["job_id"], "validating"):
+                logger.warning("revalidating job %s", row["job_id"])
+                self.preparer.submit(self.validate, row["job_id"])
+        for row in catalog.jobs_with_status("normalizing"):
+            if self.take_over(row["job_id"], "normalizing"):
+                logger.warning("renormalizing job %s", row["job_id"])
+                self.preparer.submit(self.normalize_job, row["job_id"])
+        for row in catalog.jobs_with_status("launching"):
+            if not row["container_id"] and self.take_over(
+                row["job_id"], "launching", requeue=True
+            ):
+                logger.warning(
+                    "requeueing job %s after an interrupted launch", row["job_id"]
+                )
+
+    def take_over(self, job_id: str, state: JobState, requeue: bool = False) -> bool:
+        """
+        make this process the owner of a job in the given state, provided its
+        owner has gone (and, with requeue, put the job back in the queue);
+        returns whether the job was taken over
+        """
+        taken = False
+
+        def change(status: JobStatus) -> Optional[JobStatus]:
+            nonlocal taken
+            if (
+                status.status != state
+                or status.container_id
+                or owner_alive(status.owner)
+            ):
+                return None
+            taken = True
+            status.owner = current_owner()
+            if requeue:
+                status.status = "queued"
+                status.launch_step = ""
+            return status
+
+        JobDir.open(self.base_path, job_id).update_status(change)
+        return taken
@@ -0,0 +1,90 @@
+"""serving the api with a multi-worker wsgi server"""
+
+import logging
+from typing import Any, Dict
+
+from flask import Flask
+from gunicorn.app.base import BaseApplication  # type: ignore[import-untyped]
+from gunicorn.arbiter import Arbiter  # type: ignore[import-untyped]
+from gunicorn.workers.base import Worker  # type: ignore[import-untyped]
+
+from .config import Config
+from .metrics import METRICS_DIRNAME, MetricsSpool
+from .services import LEADER_LOCK_FILENAME, BackgroundServices, LeaderLock
+
+logger = logging.getLogger(__name__)
+
+# the port the api is published on inside the compose network
+API_PORT = 8000
+
+
+class SwitchboxServer(BaseApplication):
+    """
+    gunicorn serving a preloaded app with threaded workers; the workers elect
+    one of them (through a lock file in the job directory) to run the
+    background services
+    """
+
+    def __init__(self, app: Flask, config: Config) -> None:
+        self.application = app
+        self.config = config
+        self.leader: LeaderLock | None = None
+        self.services: BackgroundServices | None = None
+        self.spool: MetricsSpool | None = None
+        super().__init__()
+
+    def options(self) -> Dict[str, Any]:
+        """the gunicorn settings, derived from the switchbox config"""
+        return {
+            "bind": f"0.0.0.0:{API_PORT}",
+            "workers": self.config.workers,
+            "threads": self.config.threads,
+            "worker_class": "gthread",
+            "timeout": self.config.request_timeout,
+            "graceful_timeout": self.config.graceful_timeout,
+            "keepalive": 5,
+            # the app (and its imports) are loaded once in the master process
+            "preload_app": True,
+            # worker heartbeats on a tmpfs, so a slow disk can't time them out
+            "worker_tmp_dir": "/dev/shm",
+            "loglevel": self.config.log_level.lower(),
+            "post_worker_init": self.post_worker_init,
+            "worker_exit": self.worker_exit,
+        }
+
+    def init(self, parser, opts, args):
+        """unused; the settings come from the switchbox config, not gunicorn's cli"""
+
+    def load_config(self):
+        """hand the settings to gunicorn"""
+        for key, value in self.options().items():
+            self.cfg.set(key, value)
+
+    def load(self) -> Flask:
+        """the wsgi app (already loaded)"""
+        return self.application
+
+    def post_worker_init(self, worker: Worker):
+        """have each new worker stand for running the background services"""
+        self.services = BackgroundServices(self.config)
+        self.leader = LeaderLock(
+            self.config.job_dir / LEADER_LOCK_FILENAME, self.services.start
+        )
+        self.leader.start()
+        logger.debug("worker %s is waiting for the leader lock", worker.pid)
+        # the metrics endpoint reports those of every worker
+        self.spool = MetricsSpool(
+            self.config.job_dir / METRICS_DIRNAME,
+            interval=self.config.metrics_interval,
+        )
+        self.spool.start()
+
+    def worker_exit(self, _arbiter: Arbiter, _worker: Worker):
+        """stop the background services (if this worker ran them) on the way out"""
+        if self.spool is not None:
+            self.spool.stop()
+        if self.leader is None:
+            return
+        if self.leader.acquired.is_set() and self.services is not None:
+            self.services.stop()
+        self.leader.release()
@@ -0,0 +1,156 @@
+"""the background services behind the api, and the election of who runs them"""
+
+import fcntl
+import logging
+import threading
+from pathlib import Path
+from typing import IO, Callable, Optional
+
+from .config import Config
+from .images import ImageWarmer
+from .models.job import job_compose
+from .retention import Retention, RetentionPolicy
+from .scheduler import JobQueue, launch_executor, prepare_executor
+from .supervisor import JobSupervisor
+from .watcher import StatusWatcher
+
+logger = logging.getLogger(__name__)
+
+LEADER_LOCK_FILENAME = ".leader.lock"
+
+
+class BackgroundServices:
+    """
+    the status watcher, job supervisor, job queue and image warmer of an api
+    instance; these must run in exactly one process per job directory
+    """
+
+    config: Config
+
+    def __init__(self, config: Config) -> None:
+        self.config = config
+        self.watcher: Optional[StatusWatcher] = None
+        self.supervisor: Optional[JobSupervisor] = None
+        self.warmer: Optional[ImageWarmer] = None
+        self.retention: Optional[Retention] = None
+
+    def start(self):
+        """start watching and supervising the jobs"""
+        config = self.config
+        # keep job statuses current from the docker events stream so that the
+        # read endpoints don't need to ask docker about each job; the
+        # supervisor runs the post-etl stages as the watcher sees the etls
+        # finish, and admits queued jobs as etl slots free up
+        queue = JobQueue(
+            config.job_dir,
+            max_running=config.max_concurrent_etl,
+            native=config.native_launcher,
+            executor=launch_executor(config.launch_workers),
+            preflight=config.preflight,
+            params_file=Path(config.params_file) if config.params_file else None,
+            normalize=config.normalize_inputs,
+            columnar=config.columnar_inputs,
+            dedup=config.dedup_inputs,
+            result_cache=config.result_cache,
+            vocab_dir=Path(config.vocab_dir) if config.vocab_dir else None,
+            preparer=prepare_executor(config.prepare_workers),
+        )
+        self.supervisor = JobSupervisor(
+            config.job_dir,
+            native=config.native_launcher,
+            max_running=config.max_concurrent_aresindexer,
+            queue=queue,
+        )
+        self.watcher = StatusWatcher(config.job_dir)
+        self.watcher.add_listener(self.supervisor)
+        self.watcher.start()
+        # pull the job images ahead of the jobs which need them
+        self.warmer = ImageWarmer(
+            config.job_dir, job_compose(), interval=config.image_refresh_interval
+        )
+        self.warmer.start()
+        # compress and expire finished jobs
+        if config.retention_interval > 0:
+            policy = RetentionPolicy(
+                compress_after=config.retention_compress_after,
+                codec=config.retention_codec,
+                max_age=config.retention_max_age,
+                max_jobs=config.retention_max_jobs,
+                quota=config.retention_quota_gb * 1024**3,
+            )
+            self.retention = Retention(
+                config.job_dir, policy, interval=config.retention_interval
+            )
+            self.retention.start()
+        logger.info("background services started")
+
+    def stop(self):
+        """stop the services, letting in-progress launches finish"""
+        if self.warmer is not None:
+            self.warmer.stop()
+        if self.retention is not None:
+            self.retention.stop()
+        if self.watcher is not None:
+            self.watcher.stop()
+        if self.supervisor is not None:
+            self.supervisor.stop()
+        logger.info("background services stopped")
+
+
+class LeaderLock:
+    """
+    an exclusive lock on a file which at most one process holds at a time; a
+    background thread waits for the lock and calls on_acquire once it holds
+    it, so when the holder exits another process takes over
+    """
+
+    path: Path
+    poll_interval: float = 5.0
+
+    def __init__(self, path: Path, on_acquire: Callable[[], None]) -> None:
+        self.path = path
+        self.on_acquire = on_acquire
+        self.acquired = threading.Event()
+        self._stop = threading.Event()
+        self._lockfh: Optional[IO[bytes]] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """begin waiting for the lock in a background thread"""
+        self._thread = threading.Thread(
+            target=self.run, name="leader-lock", daemon=True
+        )
+        self._thread.start()
+
+    def try_acquire(self) -> bool:
+        """take the lock if it is free; returns whether it is held"""
+        if self._lockfh is not None:
+            return True
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # pylint: disable-next=consider-using-with
+        lockfh = open(self.path, "ab")
+        try:
+            fcntl.flock(lockfh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lockfh.close()
+            return False
+        self._lockfh = lockfh
+        return True
+
+    def run(self):
+        """wait for the lock, then hand over to on_acquire"""
+        while not self._stop.is_set():
+            if self.try_acquire():
+                logger.info("acquired %s; this process runs the services", self.path)
+                self.acquired.set()
+                self.on_acquire()
+                return
+            self._stop.wait(self.poll_interval)
+
+    def release(self):
+        """stop waiting for the lock, or give it up if it is held"""
+        self._stop.set()
+        if self._lockfh is not None:
+            self._lockfh.close()
+            self._lockfh = None
+            self.acquired.clear()
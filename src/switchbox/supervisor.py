@@ -0,0 +1,243 @@
+"""in-process supervision of jobs, running the post-etl stages as etls finish"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Optional, Set
+
+from docker.errors import DockerException, NotFound
+
+from .compose import Compose
+from .images import image_pins
+from .launcher import ServiceLauncher
+from .models.job import (
+    JOB_ID_LABEL,
+    JobDir,
+    JobStatus,
+    get_catalog,
+    job_compose,
+    same_container,
+)
+from .results import record_result
+from .scheduler import RUNNING_STATUSES, JobQueue
+from .vocab import loaded_vocab, set_loaded_vocab
+
+logger = logging.getLogger(__name__)
+
+
+class JobSupervisor:  # pylint: disable=too-many-instance-attributes
+    """
+    runs the aresindexer for each job whose etl exits successfully, at most
+    max_running at a time, and admits queued jobs as etl slots free up; it is
+    driven by the notifications of a StatusWatcher, so all job containers are
+    supervised through the watcher's single docker events subscription
+    """
+
+    base_path: Path
+    max_attempts: int = 3
+    retry_delay: float = 30.0
+
+    def __init__(
+        self,
+        base_path: Path,
+        max_workers: int = 2,
+        native: bool = True,
+        compose: Optional[Compose] = None,
+        max_running: int = 1,
+        queue: Optional[JobQueue] = None,
+    ) -> None:
+        self.base_path = base_path
+        self.native = native
+        self.max_running = max_running
+        self.queue = queue
+        self._compose = compose
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="job-supervisor"
+        )
+        self._inflight: Set[str] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    @property
+    def compose(self) -> Compose:
+        """the compose project the post-etl stages are run in"""
+        if self._compose is None:
+            self._compose = job_compose()
+        return self._compose
+
+    def stop(self):
+        """stop supervising; queued launches are attempted but not retried"""
+        self._stop.set()
+        self._executor.shutdown(wait=True)
+
+    def job_changed(self, job_id: str):
+        """act on a possible change in the status of the given job"""
+        status = JobDir.open(self.base_path, job_id).get_status()
+        if (stage := status.aresindexer) is None:
+            return
+        if stage.status == "waiting" and status.status in ("exited", "dead"):
+            self.etl_finished(job_id)
+        elif stage.status in ("exited", "dead") and stage.container_id:
+            record_result(self.base_path, job_id, status)
+            self._executor.submit(self.remove_container, str(stage.container_id))
+            self.dispatch()
+
+    def reconciled(self):
+        """
+        resume supervision after the job statuses were brought up to date, e.g.
+        after an api restart: pick up etls which exited unnoticed and launches
+        which were interrupted, then fill any free slots
+        """
+        catalog = get_catalog(self.base_path)
+        for row in catalog.jobs_with_status("waiting", column="aresindexer_status"):
+            self.job_changed(row["job_id"])
+        for row in catalog.jobs_with_status("launching", column="aresindexer_status"):
+            with self._lock:
+                if row["job_id"] in self._inflight:
+                    continue
+            JobDir.open(self.base_path, row["job_id"]).update_status(
+                partial(self.set_stage_status, stage_status="pending")
+            )
+        self.dispatch()
+        if self.queue is not None:
+            self.queue.requeue_interrupted()
+            self.queue.dispatch()
+
+    def etl_finished(self, job_id: str):
+        """decide on the aresindexer run of a job whose etl has exited"""
+
+        def decide(status: JobStatus) -> Optional[JobStatus]:
+            if status.aresindexer is None or status.aresindexer.status != "waiting":
+                return None
+            status.aresindexer.status = (
+                "pending" if status.exit_code == 0 else "skipped"
+            )
+            return status
+
+        status = JobDir.open(self.base_path, job_id).update_status(decide)
+        logger.info("etl of job %s exited with %s", job_id, status.exit_code)
+        self.track_vocab(status)
+        self.dispatch()
+        if self.queue is not None:
+            # an etl slot is free
+            self.queue.dispatch()
+
+    def track_vocab(self, status: JobStatus):
+        """
+        note the vocabulary an etl left in the cdmdb: the one it was launched
+        with if it succeeded, or an unknown one if it failed while reloading
+        """
+        catalog = get_catalog(self.base_path)
+        if status.exit_code == 0 and status.vocab_fingerprint:
+            if loaded_vocab(catalog) != status.vocab_fingerprint:
+                set_loaded_vocab(catalog, status.vocab_fingerprint)
+        elif status.exit_code != 0 and status.reload_vocab:
+            set_loaded_vocab(catalog, "")
+
+    @staticmethod
+    def set_stage_status(status: JobStatus, stage_status: str) -> Optional[JobStatus]:
+        """set the status of the aresindexer stage in the given job status"""
+        if status.aresindexer is None:
+            return None
+        status.aresindexer.status = stage_status  # type: ignore[assignment]
+        return status
+
+    def dispatch(self):
+        """admit pending aresindexer runs for as long as there are free slots"""
+        catalog = get_catalog(self.base_path)
+        while not self._stop.is_set() and (
+            job_id := catalog.claim_next(
+                "aresindexer_status",
+                waiting="pending",
+                claimed="launching",
+                # stage containers are only ever "created" just after launch
+                active=("created", *RUNNING_STATUSES),
+                limit=self.max_running,
+            )
+        ):
+            JobDir.open(self.base_path, job_id).update_status(
+                partial(self.set_stage_status, stage_status="launching")
+            )
+            self.submit(job_id)
+
+    def submit(self, job_id: str):
+        """queue the launch of the given job's aresindexer (at most once at a time)"""
+        with self._lock:
+            if job_id in self._inflight:
+                return
+            self._inflight.add(job_id)
+        self._executor.submit(self.launch, job_id)
+
+    def launch(self, job_id: str):
+        """launch the given job's aresindexer, retrying failed launches"""
+        job_dir = JobDir.open(self.base_path, job_id)
+        try:
+            while True:
+                try:
+                    launcher = ServiceLauncher(
+                        self.compose, images=image_pins(self.base_path)
+                    )
+                    container_id = launcher.run(
+                        "aresindexer",
+                        labels={JOB_ID_LABEL: job_id},
+                        native=self.native,
+                    )
+                except Exception as err:  # pylint: disable=broad-exception-caught
+                    logger.exception("launching aresindexer for job %s failed", job_id)
+                    status = job_dir.update_status(
+                        partial(self.record_failure, err=err)
+                    )
+                    if (
+                        status.aresindexer is None
+                        or status.aresindexer.status != "launching"
+                    ):
+                        # given up; the slot is free for another job
+                        self.dispatch()
+                        return
+                    if self._stop.wait(self.retry_delay * status.aresindexer.attempts):
+                        return
+                    continue
+
+                logger.info("aresindexer for job %s is %s", job_id, container_id)
+                job_dir.update_status(
+                    lambda status: self.record_launch(status, container_id)
+                )
+                return
+        finally:
+            with self._lock:
+                self._inflight.discard(job_id)
+
+    def record_failure(self, status: JobStatus, err: Exception) -> Optional[JobStatus]:
+        """note a failed launch attempt in the given status"""
+        if (stage := status.aresindexer) is None:
+            return None
+        stage.attempts += 1
+        stage.error = str(err)
+        if stage.attempts >= self.max_attempts:
+            stage.status = "failed"
+        return status
+
+    @staticmethod
+    def record_launch(status: JobStatus, container_id: str) -> Optional[JobStatus]:
+        """note a launched container in the given status"""
+        if (stage := status.aresindexer) is None or same_container(
+            stage.container_id, container_id
+        ):
+            # the watcher has already adopted it
+            return None
+        stage.attempts += 1
+        stage.container_id = container_id
+        stage.status = "created"
+        stage.error = ""
+        return status
+
+    def remove_container(self, container_id: str):
+        """remove a finished stage container (like 'docker compose run --rm')"""
+        try:
+            self.compose.docker.api.remove_container(container_id)
+        except NotFound:
+            pass
+        except DockerException:
+            logger.exception("unable to remove container %s", container_id)
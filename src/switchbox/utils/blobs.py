@@ -0,0 +1,192 @@
+"""content-addressed, deduplicated storage of the jobs' input files"""
+
+import errno
+import fcntl
+import logging
+import os
+import shutil
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, Iterator, Literal, Optional, Tuple
+
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+# where the blobs of a job directory are kept, beside the jobs
+BLOBS_DIRNAME = ".blobs"
+# the ioctl which clones a file's extents (a reflink) on btrfs, xfs, ...
+FICLONE = 0x40049409
+
+Materialized = Literal["stored", "deduplicated", "unshared"]
+
+
+class StoreUsage(BaseModel):
+    """the disk usage of a blob store"""
+
+    blobs: int = 0
+    # the bytes the blobs take up on disk
+    bytes: int = 0
+    # the number of job files which are links to a blob
+    references: int = 0
+    # the bytes the job files would take up without deduplication
+    referenced_bytes: int = 0
+
+    @property
+    def saved_bytes(self) -> int:
+        """the bytes saved by deduplication"""
+        return max(self.referenced_bytes - self.bytes, 0)
+
+
+class JobUsage(BaseModel):
+    """the disk usage of a job's directory"""
+
+    files: int = 0
+    # the apparent size of the job's files
+    bytes: int = 0
+    # the part of that which is stored once for several jobs
+    shared_bytes: int = 0
+    # the bytes freed by removing the job (and collecting its blobs)
+    exclusive_bytes: int = 0
+
+
+def clone_file(source: Path, target: Path):
+    """
+    make target a copy of source, sharing its data where possible: a hardlink,
+    else a reflink, else a plain copy
+    """
+    try:
+        os.link(source, target)
+        return
+    except OSError as err:
+        if err.errno not in (errno.EXDEV, errno.EMLINK, errno.EPERM):
+            raise
+    with open(source, "rb") as sourcefh, open(target, "wb") as targetfh:
+        try:
+            fcntl.ioctl(targetfh.fileno(), FICLONE, sourcefh.fileno())
+            return
+        except OSError:
+            pass
+        shutil.copyfileobj(sourcefh, targetfh)
+
+
+class BlobStore:
+    """
+    a directory of files named by their sha256, each hardlinked into the jobs
+    which use it; a blob's link count is its reference count, so a blob whose
+    jobs were removed has a single link left and is collected as garbage
+    """
+
+    root: Path
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+
+    @classmethod
+    def for_job_dir(cls, base_path: Path) -> "BlobStore":
+        """the blob store of the given job directory"""
+        return cls(base_path / BLOBS_DIRNAME)
+
+    def blob_path(self, sha256: str) -> Path:
+        """the path of the blob with the given hash"""
+        return self.root / sha256[:2] / sha256
+
+    @contextmanager
+    def locked(self, exclusive: bool = False) -> Iterator[None]:
+        """
+        hold the store's lock: shared while adding links, exclusive while
+        collecting, so that a blob never disappears as it is being linked
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.root / ".lock", "a+b") as lockfh:
+            fcntl.flock(lockfh, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lockfh, fcntl.LOCK_UN)
+
+    def adopt(self, path: Path, sha256: str) -> Materialized:
+        """
+        store the file at path, whose contents hash to sha256, in the blob
+        store; when the blob exists already, path is replaced by a link to it
+        """
+        if not sha256:
+            return "unshared"
+        blob = self.blob_path(sha256)
+        with self.locked():
+            if not blob.exists():
+                blob.parent.mkdir(exist_ok=True)
+                try:
+                    os.link(path, blob)
+                    # the blob is shared, it must not be changed in place
+                    os.chmod(blob, 0o444)
+                    return "stored"
+                except FileExistsError:
+                    # stored by a concurrent upload of the same file
+                    pass
+                except OSError as err:
+                    logger.warning("unable to store %s as a blob: %s", path, err)
+                    return "unshared"
+            temp_path = path.with_name(f".{path.name}.{os.getpid()}")
+            clone_file(blob, temp_path)
+            os.replace(temp_path, path)
+        return "deduplicated"
+
+    def blobs(self) -> Iterator[Tuple[Path, os.stat_result]]:
+        """every blob in the store, with its stat"""
+        if not self.root.is_dir():
+            return
+        for prefix in self.root.iterdir():
+            if prefix.is_dir():
+                for blob in prefix.iterdir():
+                    yield blob, blob.stat()
+
+    def collect(self, sha256s: Optional[Iterable[str]] = None) -> Tuple[int, int]:
+        """
+        remove the blobs (of those given, or all of them) which no job links to
+        any more; returns the number removed and the bytes freed
+        """
+        removed, freed = 0, 0
+        with self.locked(exclusive=True):
+            if sha256s is None:
+                candidates = self.blobs()
+            else:
+                candidates = (
+                    (blob, blob.stat())
+                    for blob in map(self.blob_path, set(sha256s) - {""})
+                    if blob.exists()
+                )
+            for blob, stat in candidates:
+                if stat.st_nlink <= 1:
+                    blob.unlink()
+                    removed += 1
+                    freed += stat.st_size
+        if removed:
+            logger.info("collected %s blob(s), %s bytes", removed, freed)
+        return removed, freed
+
+    def usage(self) -> StoreUsage:
+        """the disk usage of the store and the savings from deduplication"""
+        usage = StoreUsage()
+        for _, stat in self.blobs():
+            usage.blobs += 1
+            usage.bytes += stat.st_size
+            usage.references += stat.st_nlink - 1
+            usage.referenced_bytes += stat.st_size * (stat.st_nlink - 1)
+        return usage
+
+
+def job_usage(job_path: Path) -> JobUsage:
+    """the disk usage of a job's directory; links to blobs count as shared"""
+    usage = JobUsage()
+    for dirpath, _, filenames in os.walk(job_path):
+        for filename in filenames:
+            stat = os.stat(os.path.join(dirpath, filename))
+            usage.files += 1
+            usage.bytes += stat.st_size
+            # a blob linked only into this job goes when the job does
+            if stat.st_nlink > 2:
+                usage.shared_bytes += stat.st_size
+            else:
+                usage.exclusive_bytes += stat.st_size
+    return usage
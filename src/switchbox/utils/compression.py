@@ -0,0 +1,137 @@
+"""compressing the files of finished jobs, and reading them back transparently"""
+
+import gzip
+import io
+import json
+import logging
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+try:
+    import zstandard  # type: ignore[import-not-found]
+except ImportError:  # pragma: no cover - zstandard is optional
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# the suffix each codec adds to the files it compresses
+CODECS = {"gzip": ".gz", "zstd": ".zst"}
+# the uncompressed sizes of the compressed files of a directory, by name
+SIZES_FILENAME = ".compressed.json"
+CHUNK_SIZE = 1024 * 1024
+
+
+def available_codec(codec: str) -> str:
+    """the given codec if it can be used here, else gzip"""
+    if codec == "zstd" and zstandard is None:
+        logger.warning("zstd compression needs zstandard, using gzip instead")
+        return "gzip"
+    return codec
+
+
+def codec_of(path: Path) -> Optional[str]:
+    """the codec a file was compressed with, from its suffix"""
+    return next((c for c, suffix in CODECS.items() if path.name.endswith(suffix)), None)
+
+
+def original_name(path: Path) -> str:
+    """the name of a (possibly) compressed file before it was compressed"""
+    if (codec := codec_of(path)) is not None:
+        return path.name[: -len(CODECS[codec])]
+    return path.name
+
+
+def read_sizes(directory: Path) -> Dict[str, int]:
+    """the uncompressed sizes recorded for the directory's compressed files"""
+    try:
+        with open(directory / SIZES_FILENAME, "rt", encoding="utf-8") as sizesfh:
+            return json.load(sizesfh)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def write_sizes(directory: Path, sizes: Dict[str, int]):
+    """replace the recorded uncompressed sizes of the directory's files"""
+    path = directory / SIZES_FILENAME
+    temp_file = path.with_name(f"{path.name}.{os.getpid()}")
+    with open(temp_file, "wt", encoding="utf-8") as sizesfh:
+        json.dump(sizes, sizesfh)
+    os.replace(temp_file, path)
+
+
+def open_compressed(path: Path) -> io.BufferedIOBase:
+    """open a file for reading, decompressing it according to its suffix"""
+    codec = codec_of(path)
+    if codec == "gzip":
+        return gzip.open(path, "rb")
+    if codec == "zstd":
+        if zstandard is None:
+            raise OSError(f"{path} is zstd-compressed but zstandard isn't installed")
+        # pylint: disable-next=consider-using-with
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"))
+    # pylint: disable-next=consider-using-with
+    return open(path, "rb")
+
+
+def uncompressed_size(path: Path, sizes: Optional[Dict[str, int]] = None) -> int:
+    """the size of the file's contents, compressed or not"""
+    if codec_of(path) is None:
+        return path.stat().st_size
+    if sizes is None:
+        sizes = read_sizes(path.parent)
+    if (size := sizes.get(original_name(path))) is not None:
+        return size
+    # not recorded; count the bytes
+    with open_compressed(path) as datafh:
+        return sum(len(chunk) for chunk in iter(lambda: datafh.read(CHUNK_SIZE), b""))
+
+
+def compress_file(path: Path, codec: str = "gzip") -> Tuple[int, int]:
+    """
+    replace the file at path with a compressed copy, keeping its mtime;
+    returns the sizes of the file before and after
+    """
+    target = path.with_name(path.name + CODECS[codec])
+    temp_path = target.with_name(f".{target.name}.{os.getpid()}")
+    stat = path.stat()
+    with open(path, "rb") as sourcefh, open(temp_path, "wb") as rawfh:
+        if codec == "zstd":
+            assert zstandard is not None
+            with zstandard.ZstdCompressor(level=10).stream_writer(rawfh) as writer:
+                shutil.copyfileobj(sourcefh, writer, CHUNK_SIZE)
+        else:
+            with gzip.GzipFile(
+                filename=path.name, mode="wb", fileobj=rawfh, mtime=0
+            ) as writer:
+                shutil.copyfileobj(sourcefh, writer, CHUNK_SIZE)
+    os.utime(temp_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    sizes = read_sizes(path.parent)
+    sizes[path.name] = stat.st_size
+    write_sizes(path.parent, sizes)
+    os.replace(temp_path, target)
+    path.unlink()
+    return stat.st_size, target.stat().st_size
+
+
+def compress_dir(
+    directory: Path, codec: str = "gzip", linked: bool = True
+) -> Tuple[int, int]:
+    """
+    compress every (not yet compressed, not hidden) file in the directory,
+    except, without linked, those hardlinked elsewhere (a compressed copy would
+    only add to the space the other links keep in use); returns the total
+    sizes before and after
+    """
+    before, after = 0, 0
+    if not directory.is_dir():
+        return before, after
+    for path in sorted(directory.iterdir()):
+        if path.is_file() and not path.name.startswith(".") and not codec_of(path):
+            if not linked and path.stat().st_nlink > 1:
+                continue
+            original, compressed = compress_file(path, codec)
+            before += original
+            after += compressed
+    return before, after
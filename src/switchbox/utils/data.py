@@ -1,7 +1,14 @@
 """access to config resources embedded in the python source"""
 
+import hashlib
+import io
 import logging
+import threading
 from importlib import resources
+from pathlib import Path
+from typing import Dict, Mapping, Optional, Sequence, Tuple
+
+from pydantic import BaseModel, ConfigDict
 
 from ..models import ETLParams
 
@@ -10,8 +17,67 @@ logger = logging.getLogger(__name__)
 data_dir = resources.files("switchbox.data")
 
 
-def get_etl_input_params():
+class ParamSpec(BaseModel):
+    """
+    a loaded etl parameter spec, with everything the endpoints need from it
+    precomputed; instances are shared between requests, so they're immutable
+    """
+
+    model_config = ConfigDict(frozen=True)
+
+    params: ETLParams
+    # the json document served by the params endpoint
+    json_bytes: bytes
+    # content hash of json_bytes, used as its ETag
+    digest: str
+    # the expected columns of each csv param (None when unspecified)
+    csv_columns: Mapping[str, Optional[Sequence[str]]]
+
+    @classmethod
+    def from_yaml_bytes(cls, raw: bytes) -> "ParamSpec":
+        """parse, validate and precompile the given yaml document"""
+        params = ETLParams.from_yaml(io.StringIO(raw.decode("utf-8")))
+        # pydantic's own serializer keeps the key order of the spec
+        json_bytes = params.model_dump_json().encode("utf-8")
+        return cls(
+            params=params,
+            json_bytes=json_bytes,
+            digest=hashlib.sha256(json_bytes).hexdigest(),
+            csv_columns={
+                name: param.columns
+                for name, param in params.params.items()
+                if param.param_type == "csv"
+            },
+        )
+
+
+_specs: Dict[str, Tuple[Tuple[int, int], ParamSpec]] = {}
+_specs_lock = threading.Lock()
+
+
+def get_param_spec(params_file: Optional[Path] = None) -> ParamSpec:
+    """
+    return the ParamSpec of the given spec file, or of the etl_params.yml file
+    in the data_dir; it is only reloaded when the file has changed
+    """
+    source = params_file or data_dir / "etl_params.yml"
+    if isinstance(source, Path):
+        stat = source.stat()
+        signature = (stat.st_mtime_ns, stat.st_size)
+    else:
+        # packaged resources (e.g. in a zip) don't change under us
+        signature = (0, 0)
+    key = str(source)
+    with _specs_lock:
+        cached = _specs.get(key)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        logger.info("loading etl parameter spec from %s", source)
+        spec = ParamSpec.from_yaml_bytes(source.read_bytes())
+        _specs[key] = (signature, spec)
+        return spec
+
+
+def get_etl_input_params(params_file: Optional[Path] = None) -> ETLParams:
     """return the parsed values from the etl_params.yml file in the data_dir"""
-    params_yaml = data_dir / "etl_params.yml"
-    with params_yaml.open("rt", encoding="utf-8") as f:
-        return ETLParams.from_yaml(f)
+    return get_param_spec(params_file).params
@@ -0,0 +1,444 @@
+"""
+a sidecar index of the lines of a log directory, for searching large logs;
+the index is extended with the lines appended since it was last brought up to
+date, so the log is read in full only the first time
+"""
+
+import array
+import bisect
+import datetime
+import fcntl
+import logging
+import os
+import re
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Pattern, Self, Sequence, Tuple
+
+from pydantic import BaseModel
+
+from .compression import original_name
+from .logs import LogReader
+
+logger = logging.getLogger(__name__)
+
+# the index directory within the log directory (hidden, so it isn't read as log)
+INDEX_DIRNAME = ".index"
+# the level of each line, by code; lines without a level marker have code 0
+LEVELS = ("", "DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")
+LEVEL_ALIASES = {"WARN": "WARNING", "FATAL": "CRITICAL"}
+# how far into a line the timestamp & level are looked for
+HEAD_BYTES = 160
+# lines are scanned for matches in blocks of about this size
+BLOCK_SIZE = 1024 * 1024
+# lines are read one by one when fewer than one in this many has the levels
+# searched for, else all the lines are scanned
+SPARSE_LEVELS = 16
+
+TIMESTAMP = re.compile(
+    rb"\[?(\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2})(?:[.,](\d{1,6}))?"
+)
+LEVEL = re.compile(rb"\b(DEBUG|INFO|WARNING|WARN|ERROR|CRITICAL|FATAL)\b")
+
+
+def level_code(name: str) -> int:
+    """the code of a level name (any case); raises ValueError for unknown levels"""
+    name = name.upper()
+    return LEVELS.index(LEVEL_ALIASES.get(name, name))
+
+
+class LogMatch(BaseModel):
+    """a matching line of a log, with its surrounding lines"""
+
+    # zero-based line number, and byte offset of the start of the line
+    line: int
+    offset: int
+    level: Optional[str] = None
+    time: Optional[datetime.datetime] = None
+    text: str
+    before: List[str] = []
+    after: List[str] = []
+
+
+class LogSearchResult(BaseModel):
+    """a page of matches; the search continues from next_line, if not None"""
+
+    matches: List[LogMatch]
+    next_line: Optional[int] = None
+    lines: int
+    size: int
+
+
+class LineParser:
+    """
+    reads the timestamp & level of each line; lines without either (e.g. those
+    of a traceback) are taken to continue the line before, and have its
+    timestamp & level
+    """
+
+    def __init__(self, level: int = 0, timestamp: float = 0.0) -> None:
+        self.level = level
+        self.timestamp = timestamp
+        # (consecutive lines are often logged within the same second)
+        self._second: Tuple[bytes, float] = (b"", 0.0)
+
+    def parse(self, line: bytes) -> Tuple[int, float]:
+        """the level code & timestamp (seconds since the epoch, 0 if unknown)"""
+        head = line[:HEAD_BYTES]
+        stamp = TIMESTAMP.match(head)
+        marker = LEVEL.search(head, stamp.end() if stamp else 0)
+        if stamp:
+            second, fraction = stamp.groups()
+            if second != self._second[0]:
+                moment = datetime.datetime.fromisoformat(second.decode("ascii"))
+                self._second = (
+                    second,
+                    moment.replace(tzinfo=datetime.timezone.utc).timestamp(),
+                )
+            self.timestamp = self._second[1]
+            if fraction:
+                self.timestamp += int(fraction) / 10 ** len(fraction)
+            self.level = 0
+        if marker:
+            name = marker.group(1).decode("ascii")
+            self.level = LEVELS.index(LEVEL_ALIASES.get(name, name))
+        return self.level, self.timestamp
+
+
+class IndexState(BaseModel):
+    """how far the index has got, and what it needs to carry on"""
+
+    lines: int = 0
+    # the offset just past the last indexed (i.e. complete) line
+    size: int = 0
+    # the (original) names & sizes of the log files the index covers
+    files: List[Tuple[str, int]] = []
+    level: int = 0
+    timestamp: float = 0.0
+
+
+@contextmanager
+def locked_file(path: Path) -> Iterator[None]:
+    """
+    hold an exclusive lock on the given (lock) file, which serialises updates
+    between processes
+    """
+    with open(path, "ab") as lockfh:
+        fcntl.flock(lockfh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lockfh, fcntl.LOCK_UN)
+
+
+def covered_files(reader: LogReader, size: int) -> List[Tuple[str, int]]:
+    """the names & sizes of the reader's files, up to the given offset"""
+    covered = []
+    start = 0
+    for path, file_size in reader.files:
+        if start >= size:
+            break
+        covered.append((original_name(path), file_size))
+        start += file_size
+    return covered
+
+
+def still_covers(
+    reader: LogReader, size: int, files: Sequence[Tuple[str, int]]
+) -> bool:
+    """
+    whether the log still begins with the size bytes of the given files that
+    were read earlier: the same files, all but the last of them unchanged, and
+    the last one at least as long
+    """
+    current = covered_files(reader, size)
+    if len(current) != len(files):
+        return False
+    for index, ((name, file_size), (old_name, old_size)) in enumerate(
+        zip(current, files)
+    ):
+        last = index == len(current) - 1
+        if (
+            name != old_name
+            or file_size < old_size
+            or (file_size != old_size and not last)
+        ):
+            return False
+    return reader.size >= size
+
+
+def whole_lines(
+    reader: LogReader, offset: int, end: int, block_size: int = BLOCK_SIZE
+) -> Iterator[Tuple[int, bytes]]:
+    """
+    yield (offset, block) pairs for the stream from offset to end in blocks of
+    whole lines; only the last block may end without a newline
+    """
+    chunks: List[bytes] = []
+    pending = 0
+    for chunk in reader.read(offset, end - offset):
+        chunks.append(chunk)
+        pending += len(chunk)
+        if pending < block_size:
+            continue
+        block = b"".join(chunks)
+        if (cut := block.rfind(b"\n") + 1) > 0:
+            yield offset, block[:cut]
+            offset += cut
+            block = block[cut:]
+        chunks, pending = [block], len(block)
+    if pending:
+        yield offset, b"".join(chunks)
+
+
+class LogIndex:
+    """
+    the line offsets, levels & timestamps of a log directory, persisted in
+    INDEX_DIRNAME within it; a trailing unterminated line is included in
+    searches but only indexed once it is complete
+    """
+
+    def __init__(self, reader: LogReader) -> None:
+        self.reader = reader
+        self.index_dir = reader.log_dir / INDEX_DIRNAME
+        self.offsets = array.array("Q")
+        self.levels = bytearray()
+        self.timestamps = array.array("d")
+        self.state = IndexState()
+        # the end of the log when the index was last updated
+        self.end = 0
+
+    def _column_files(self) -> Tuple[Tuple[Path, array.array], ...]:
+        return (
+            (self.index_dir / "offsets", self.offsets),
+            (self.index_dir / "timestamps", self.timestamps),
+        )
+
+    def load(self):
+        """read the persisted index (ignoring anything past its saved state)"""
+        self.clear()
+        try:
+            with open(self.index_dir / "state.json", "rt", encoding="utf-8") as statefh:
+                self.state = IndexState.model_validate_json(statefh.read())
+        except (FileNotFoundError, ValueError):
+            self.state = IndexState()
+        lines = self.state.lines
+        try:
+            for path, column in self._column_files():
+                with open(path, "rb") as columnfh:
+                    column.fromfile(columnfh, lines)
+            with open(self.index_dir / "levels", "rb") as levelsfh:
+                self.levels = bytearray(levelsfh.read(lines))
+            if len(self.levels) != lines:
+                raise EOFError("the index is shorter than its state")
+        except (FileNotFoundError, EOFError):
+            self.clear()
+
+    def clear(self):
+        """forget everything indexed so far"""
+        self.state = IndexState()
+        del self.offsets[:]
+        del self.timestamps[:]
+        self.levels = bytearray()
+
+    def save(self, first_new: int):
+        """persist the index, writing the lines from first_new on"""
+        for path, column in self._column_files():
+            with open(path, "ab") as columnfh:
+                columnfh.truncate(first_new * column.itemsize)
+                column[first_new:].tofile(columnfh)
+        with open(self.index_dir / "levels", "ab") as levelsfh:
+            levelsfh.truncate(first_new)
+            levelsfh.write(self.levels[first_new:])
+        # the state is written last, so that it never claims unwritten lines
+        state_file = self.index_dir / "state.json"
+        temp_file = state_file.with_name(f"{state_file.name}.{os.getpid()}")
+        with open(temp_file, "wt", encoding="utf-8") as statefh:
+            statefh.write(self.state.model_dump_json())
+        os.replace(temp_file, state_file)
+
+    def _append(self, parser: LineParser, offset: int, line: bytes):
+        level, timestamp = parser.parse(line)
+        self.offsets.append(offset)
+        self.levels.append(level)
+        self.timestamps.append(timestamp)
+
+    def update(self) -> Self:
+        """bring the index up to date with the log, reading only what's new"""
+        self.reader.refresh()
+        self.index_dir.mkdir(exist_ok=True)
+        with locked_file(self.index_dir / "lock"):
+            self.load()
+            if rebuild := not still_covers(
+                self.reader, self.state.size, self.state.files
+            ):
+                logger.info("rebuilding the log index of %s", self.reader.log_dir)
+                self.clear()
+            first_new = self.state.lines
+            end = self.reader.size
+            parser = LineParser(self.state.level, self.state.timestamp)
+            indexed = self.state.size
+            for offset, block in whole_lines(self.reader, indexed, end):
+                start = 0
+                while (newline := block.find(b"\n", start)) >= 0:
+                    self._append(parser, offset + start, block[start : newline + 1])
+                    start = newline + 1
+                indexed = offset + start
+            if rebuild or indexed > self.state.size:
+                self.state = IndexState(
+                    lines=len(self.offsets),
+                    size=indexed,
+                    files=covered_files(self.reader, indexed),
+                    level=parser.level,
+                    timestamp=parser.timestamp,
+                )
+                self.save(first_new)
+        # an unterminated last line (e.g. still being written) is searchable too
+        self.end = end
+        if end > self.state.size:
+            tail = self.reader.read_bytes(self.state.size, HEAD_BYTES)
+            self._append(parser, self.state.size, tail)
+        return self
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def line_end(self, line: int) -> int:
+        """the offset just past the given line (including its newline)"""
+        return self.offsets[line + 1] if line + 1 < len(self) else self.end
+
+    def line_range(
+        self,
+        since: Optional[datetime.datetime] = None,
+        until: Optional[datetime.datetime] = None,
+    ) -> Tuple[int, int]:
+        """
+        the lines logged within the given times; log timestamps without a time
+        zone (as are those of the etl) are taken as UTC, as are since & until
+        without one. log lines are assumed to be in chronological order
+        """
+        first, last = 0, len(self)
+        if since is not None:
+            first = bisect.bisect_left(self.timestamps, epoch_seconds(since))
+        if until is not None:
+            last = bisect.bisect_right(self.timestamps, epoch_seconds(until))
+        return first, last
+
+    def level_mask(self, codes: Iterable[int], first: int, last: int) -> bytearray:
+        """for each line from first to last, 1 if it has one of the levels else 0"""
+        table = bytearray(256)
+        for code in codes:
+            table[code] = 1
+        return self.levels[first:last].translate(table)
+
+    @staticmethod
+    def lines_in_mask(mask: bytearray, first: int) -> Iterator[int]:
+        """the numbers of the lines marked in a level mask starting at first"""
+        position = 0
+        while (position := mask.find(1, position)) >= 0:
+            yield first + position
+            position += 1
+
+    def read_line(self, line: int) -> bytes:
+        """the bytes of the given line"""
+        start = self.offsets[line]
+        return self.reader.read_bytes(start, self.line_end(line) - start)
+
+    def read_lines(self, first: int, last: int) -> List[str]:
+        """the text of the lines from first up to (not including) last"""
+        if first >= last:
+            return []
+        start = self.offsets[first]
+        data = self.reader.read_bytes(start, self.line_end(last - 1) - start)
+        return data.decode("utf-8", "replace").removesuffix("\n").split("\n")
+
+    def matching_lines(
+        self, pattern: Pattern[bytes], first: int, last: int
+    ) -> Iterator[int]:
+        """the numbers of the lines from first to last the pattern matches in"""
+        if first >= last:
+            return
+        start, end = self.offsets[first], self.line_end(last - 1)
+        for block_start, block in whole_lines(self.reader, start, end):
+            position = 0
+            while (found := pattern.search(block, position)) is not None:
+                line = bisect.bisect_right(self.offsets, block_start + found.start())
+                yield line - 1
+                # (a line is reported once, however often it matches)
+                position = self.line_end(line - 1) - block_start
+
+    def search(  # pylint: disable=too-many-arguments
+        self,
+        pattern: Optional[Pattern[bytes]] = None,
+        levels: Sequence[int] = (),
+        since: Optional[datetime.datetime] = None,
+        until: Optional[datetime.datetime] = None,
+        context: int = 0,
+        start_line: int = 0,
+        limit: int = 100,
+    ) -> LogSearchResult:
+        """
+        the first limit lines from start_line on matching all of the given
+        pattern, levels and times, with context lines either side of each
+        """
+        first, last = self.line_range(since, until)
+        first = max(first, start_line)
+        lines: Iterable[int]
+        if levels:
+            mask = self.level_mask(levels, first, last)
+            if pattern is None:
+                lines = self.lines_in_mask(mask, first)
+            elif mask.count(1) * SPARSE_LEVELS < len(mask):
+                # few lines have the levels asked for, so only those are read
+                lines = (
+                    line
+                    for line in self.lines_in_mask(mask, first)
+                    if pattern.search(self.read_line(line))
+                )
+            else:
+                lines = (
+                    line
+                    for line in self.matching_lines(pattern, first, last)
+                    if mask[line - first]
+                )
+        elif pattern is not None:
+            lines = self.matching_lines(pattern, first, last)
+        else:
+            lines = range(first, last)
+
+        matches: List[LogMatch] = []
+        next_line = None
+        for line in lines:
+            if len(matches) == limit:
+                next_line = line
+                break
+            matches.append(self.match(line, context))
+        return LogSearchResult(
+            matches=matches, next_line=next_line, lines=len(self), size=self.end
+        )
+
+    def match(self, line: int, context: int = 0) -> LogMatch:
+        """the given line, with context lines either side"""
+        first = max(line - context, 0)
+        text = self.read_lines(first, min(line + context + 1, len(self)))
+        timestamp = self.timestamps[line]
+        return LogMatch(
+            line=line,
+            offset=self.offsets[line],
+            level=LEVELS[self.levels[line]] or None,
+            time=(
+                datetime.datetime.fromtimestamp(timestamp, tz=datetime.timezone.utc)
+                if timestamp
+                else None
+            ),
+            text=text[line - first],
+            before=text[: line - first],
+            after=text[line - first + 1 :],
+        )
+
+
+def epoch_seconds(moment: datetime.datetime) -> float:
+    """a time as seconds since the epoch, taking a naive time as UTC"""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=datetime.timezone.utc)
+    return moment.timestamp()
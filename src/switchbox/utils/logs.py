@@ -0,0 +1,191 @@
+"""ranged, tailing and following access to job log files"""
+
+import logging
+import os
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from .compression import open_compressed, original_name, read_sizes, uncompressed_size
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+# the bytes kept, decompressed, from the end of each compressed log file, so
+# that the tail of a finished job's log isn't decompressed on every request
+TAIL_CACHE_SIZE = 256 * 1024
+
+
+@lru_cache(maxsize=64)
+def compressed_tail(  # pylint: disable=unused-argument
+    path: Path, mtime_ns: int, size: int
+) -> bytes:
+    """
+    the last TAIL_CACHE_SIZE bytes of the compressed file with the given mtime
+    and uncompressed size (which key the cache), decompressed
+    """
+    start = max(size - TAIL_CACHE_SIZE, 0)
+    with open_compressed(path) as logfh:
+        logfh.seek(start)
+        return logfh.read(size - start)
+
+
+class LogReader:
+    """
+    a byte-addressable view over the files of a log directory, which are
+    treated as a single stream by concatenating them in name order; files
+    which were compressed (see utils.compression) are read decompressed
+    """
+
+    log_dir: Path
+
+    def __init__(self, log_dir: Path) -> None:
+        self.log_dir = log_dir
+        self.files: List[Tuple[Path, int]] = []
+        # the mtimes of the compressed files
+        self.mtimes: Dict[Path, int] = {}
+        self.refresh()
+
+    def refresh(self):
+        """pick up new log files and the current size of each file"""
+        files = []
+        mtimes = {}
+        if self.log_dir.is_dir():
+            sizes = None
+            for entry in sorted(
+                os.scandir(self.log_dir), key=lambda e: original_name(Path(e.name))
+            ):
+                if not entry.is_file() or entry.name.startswith("."):
+                    continue
+                path = Path(entry.path)
+                if original_name(path) == entry.name:
+                    files.append((path, entry.stat().st_size))
+                elif not (self.log_dir / original_name(path)).exists():
+                    # (while a file is being compressed, both versions exist)
+                    sizes = read_sizes(self.log_dir) if sizes is None else sizes
+                    files.append((path, uncompressed_size(path, sizes)))
+                    mtimes[path] = entry.stat().st_mtime_ns
+        self.files = files
+        self.mtimes = mtimes
+
+    @property
+    def size(self) -> int:
+        """total size of the log stream in bytes"""
+        return sum(size for _, size in self.files)
+
+    def read(
+        self,
+        offset: int = 0,
+        length: Optional[int] = None,
+        chunk_size: int = CHUNK_SIZE,
+    ) -> Iterator[bytes]:
+        """yield the bytes of the given range of the stream in chunks"""
+        remaining = self.size - offset if length is None else length
+        file_start = 0
+        for path, size in self.files:
+            if remaining <= 0:
+                break
+            if offset >= file_start + size:
+                file_start += size
+                continue
+            to_read = min(remaining, size - (offset - file_start))
+            for chunk in self.read_file(
+                path, size, offset - file_start, to_read, chunk_size
+            ):
+                remaining -= len(chunk)
+                offset += len(chunk)
+                yield chunk
+            file_start += size
+
+    def read_file(
+        self, path: Path, size: int, offset: int, length: int, chunk_size: int
+    ) -> Iterator[bytes]:
+        """
+        yield the given range of one of the files (of the given size) in
+        chunks; the end of a compressed file is served from the tail cache
+        """
+        if path in self.mtimes and offset >= size - TAIL_CACHE_SIZE:
+            tail = compressed_tail(path, self.mtimes[path], size)
+            start = offset - (size - len(tail))
+            for position in range(start, min(start + length, len(tail)), chunk_size):
+                yield tail[position : min(position + chunk_size, start + length)]
+            return
+        with open_compressed(path) as logfh:
+            logfh.seek(offset)
+            while length > 0:
+                chunk = logfh.read(min(chunk_size, length))
+                if not chunk:
+                    break
+                length -= len(chunk)
+                yield chunk
+
+    def read_bytes(self, offset: int = 0, length: Optional[int] = None) -> bytes:
+        """return the given range of the stream"""
+        return b"".join(self.read(offset, length))
+
+    def tail_offset(self, lines: int) -> int:
+        """the offset at which the last n lines of the stream begin"""
+        end = self.size
+        if lines <= 0 or end == 0:
+            return end
+        position = end
+        # a trailing newline terminates the last line rather than starting one
+        found = -1 if self.read_bytes(end - 1, 1) == b"\n" else 0
+        while position > 0:
+            start = max(position - CHUNK_SIZE, 0)
+            chunk = self.read_bytes(start, position - start)
+            index = len(chunk)
+            while (index := chunk.rfind(b"\n", 0, index)) >= 0:
+                found += 1
+                if found == lines:
+                    return start + index + 1
+            position = start
+        return 0
+
+    def line_offset(self, line: int) -> int:
+        """the offset at which the given (zero-based) line of the stream begins"""
+        if line <= 0:
+            return 0
+        seen = 0
+        offset = 0
+        for chunk in self.read(0):
+            count = chunk.count(b"\n")
+            if seen + count >= line:
+                index = -1
+                for _ in range(line - seen):
+                    index = chunk.index(b"\n", index + 1)
+                return offset + index + 1
+            seen += count
+            offset += len(chunk)
+        return offset
+
+    def follow(
+        self,
+        offset: int,
+        is_active: Callable[[], bool],
+        poll_interval: float = 1.0,
+        heartbeat: float = 15.0,
+    ) -> Iterator[Tuple[int, bytes]]:
+        """
+        yield (offset, data) pairs for bytes appended to the stream from the
+        given offset on, for as long as is_active() returns True; empty data is
+        yielded periodically as a heartbeat
+        """
+        last_sent = time.monotonic()
+        while True:
+            active = is_active()
+            self.refresh()
+            if self.size > offset:
+                for chunk in self.read(offset):
+                    yield offset, chunk
+                    offset += len(chunk)
+                last_sent = time.monotonic()
+            elif not active:
+                return
+            elif time.monotonic() - last_sent >= heartbeat:
+                yield offset, b""
+                last_sent = time.monotonic()
+            if not active:
+                return
+            time.sleep(poll_interval)
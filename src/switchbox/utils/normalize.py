@@ -0,0 +1,195 @@
+"""rewriting a job's input csv files into one canonical form for the etl"""
+
+import csv
+import hashlib
+import logging
+import os
+import time
+from concurrent.futures import Executor
+from pathlib import Path
+from typing import IO, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from pydantic import BaseModel
+
+from ..models.job import InputFile
+from .upload import CHUNK_SIZE, UploadError, check_header
+from .validate import csv_pool, detect_encoding
+
+try:
+    import pyarrow  # type: ignore[import-not-found]
+    from pyarrow import csv as arrow_csv
+    from pyarrow import parquet
+except ImportError:  # pragma: no cover - pyarrow is optional
+    pyarrow = None
+    arrow_csv = None
+    parquet = None
+
+logger = logging.getLogger(__name__)
+
+# the form every input file is rewritten to: utf-8 without a byte order mark,
+# comma-delimited, minimally quoted, with unix line endings
+CANONICAL_DELIMITER = ","
+CANONICAL_ENCODING = "utf-8"
+CANONICAL_LINE_END = "\n"
+
+
+class NormalizedFile(BaseModel):
+    """the result of normalizing one input file"""
+
+    param_name: str
+    encoding: str = ""
+    delimiter: str = ""
+    rows: int = 0
+    size_in: int = 0
+    size_out: int = 0
+    # the hash of the normalized file
+    sha256: str = ""
+    # the columnar copy of the file, if one was written
+    columnar_path: str = ""
+    error: str = ""
+
+
+def columnar_supported() -> bool:
+    """whether the optional columnar output is available (it needs pyarrow)"""
+    return parquet is not None
+
+
+def write_columnar(csv_path: Path, columns: Sequence[str]) -> Path:
+    """write a parquet copy of a canonical csv, one block at a time"""
+    assert pyarrow is not None and arrow_csv is not None and parquet is not None
+    parquet_path = csv_path.with_suffix(".parquet")
+    reader = arrow_csv.open_csv(
+        csv_path,
+        read_options=arrow_csv.ReadOptions(block_size=CHUNK_SIZE),
+        # every column is kept as text, as the etl reads it
+        convert_options=arrow_csv.ConvertOptions(
+            column_types={column: pyarrow.string() for column in columns}
+        ),
+    )
+    with parquet.ParquetWriter(parquet_path, reader.schema) as writer:
+        for batch in reader:
+            writer.write_batch(batch)
+    return parquet_path
+
+
+def normalize_file(
+    param_name: str,
+    path: str,
+    expected: Optional[Sequence[str]],
+    delimiter_hint: str = "",
+    columnar: bool = False,
+) -> NormalizedFile:
+    """
+    rewrite one csv in the canonical form, streaming it row by row; the
+    delimiter is whichever gives the expected header, so running this on a
+    file which was already normalized leaves it as it is. this runs in a
+    worker process
+    """
+    csv_path = Path(path)
+    temp_path = csv_path.with_name(f".{csv_path.name}.normalizing")
+    result = NormalizedFile(param_name=param_name, size_in=csv_path.stat().st_size)
+    columns: List[str] = []
+    try:
+        result.encoding, _ = detect_encoding(csv_path)
+        with open(csv_path, "rt", encoding=result.encoding, newline="") as source:
+            header = source.readline()
+            if expected:
+                result.delimiter, _ = check_header(
+                    param_name,
+                    header.encode(CANONICAL_ENCODING),
+                    expected,
+                    delimiter_hint or None,
+                )
+            else:
+                result.delimiter = delimiter_hint or CANONICAL_DELIMITER
+            source.seek(0)
+            columns, result.rows = rewrite_csv(source, temp_path, result.delimiter)
+    except (OSError, UnicodeDecodeError, UploadError, ValueError, csv.Error) as err:
+        temp_path.unlink(missing_ok=True)
+        result.error = str(err)
+        return result
+
+    os.replace(temp_path, csv_path)
+    result.size_out, result.sha256 = file_digest(csv_path)
+    if columnar and columnar_supported():
+        result.columnar_path = str(write_columnar(csv_path, columns))
+    return result
+
+
+def rewrite_csv(
+    source: IO[str], target_path: Path, delimiter: str
+) -> Tuple[List[str], int]:
+    """
+    copy the rows of an open csv to a new file in the canonical form; returns
+    the header and the number of (non-blank) rows after it
+    """
+    rows = 0
+    with open(
+        target_path,
+        "wt",
+        encoding=CANONICAL_ENCODING,
+        newline="",
+        buffering=CHUNK_SIZE,
+    ) as target:
+        writer = csv.writer(
+            target,
+            delimiter=CANONICAL_DELIMITER,
+            lineterminator=CANONICAL_LINE_END,
+            quoting=csv.QUOTE_MINIMAL,
+        )
+        reader = csv.reader(source, delimiter=delimiter)
+        columns = next(reader, [])
+        writer.writerow(columns)
+        for row in reader:
+            if row:
+                writer.writerow(row)
+                rows += 1
+    return columns, rows
+
+
+def file_digest(path: Path) -> Tuple[int, str]:
+    """the size and sha256 of the given file"""
+    sha = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as datafh:
+        while chunk := datafh.read(CHUNK_SIZE):
+            sha.update(chunk)
+            size += len(chunk)
+    return size, sha.hexdigest()
+
+
+def normalize_inputs(
+    inputs: Sequence[InputFile],
+    csv_columns: Mapping[str, Optional[Sequence[str]]],
+    delimiter_hint: str = "",
+    columnar: bool = False,
+    executor: Optional[Executor] = None,
+) -> List[NormalizedFile]:
+    """normalize the given input files concurrently"""
+    began = time.monotonic()
+    if columnar and not columnar_supported():
+        logger.warning("columnar inputs need pyarrow, which isn't installed")
+    pool = executor if executor is not None else csv_pool()
+    futures = {
+        item.param_name: pool.submit(
+            normalize_file,
+            item.param_name,
+            item.path,
+            csv_columns.get(item.param_name),
+            delimiter_hint or item.delimiter,
+            columnar,
+        )
+        for item in inputs
+        if item.param_name in csv_columns
+    }
+    results: Dict[str, NormalizedFile] = {}
+    for param_name, future in futures.items():
+        try:
+            results[param_name] = future.result()
+        except Exception as err:  # pylint: disable=broad-exception-caught
+            logger.exception("normalizing %s failed", param_name)
+            results[param_name] = NormalizedFile(param_name=param_name, error=str(err))
+    logger.info(
+        "normalized %s file(s) in %.1fs", len(results), time.monotonic() - began
+    )
+    return list(results.values())
@@ -0,0 +1,242 @@
+"""
+the progress of an etl, parsed from the markers in its log; the parse resumes
+where the previous one stopped, so each update reads only the bytes the etl
+logged in between
+"""
+
+import datetime
+import logging
+import os
+import re
+import statistics
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from pydantic import BaseModel
+
+from .logindex import (
+    TIMESTAMP,
+    covered_files,
+    epoch_seconds,
+    locked_file,
+    still_covers,
+    whole_lines,
+)
+from .logs import LogReader
+
+logger = logging.getLogger(__name__)
+
+# the progress file & its lock in each job directory
+PROGRESS_FILENAME = "progress.json"
+PROGRESS_LOCK_FILENAME = ".progress.lock"
+
+# the progress markers of the etl's log; these are assumed formats, not ones
+# the etl is known to log (nothing here was derived from captured etl output),
+# so a log without them shows no progress rather than a wrong one:
+#   "stage <name>" starts a stage of the etl
+#   "loading|processing|transforming [table|file] <name>" starts on a table
+#   "loaded|processed|transformed|inserted|wrote <n> rows [into <name>]"
+#     counts the rows of a table (the current one, if unnamed) and marks it done
+MARKER = re.compile(
+    rb"\bstage\b[:=]?\s+[\"']?(?P<stage>[\w.-]+)"
+    rb"|\b(?:loading|processing|transforming)\s+(?:table\s+|file\s+)?"
+    rb"[\"']?(?P<table>[A-Za-z_]\w*)"
+    rb"|\b(?:loaded|processed|transformed|inserted|wrote)\s+(?P<rows>\d[\d,]*)"
+    rb"\s+rows?\b(?:\s+(?:into|from|for|to|of)\s+(?:table\s+|file\s+)?"
+    rb"[\"']?(?P<done>[A-Za-z_]\w*))?",
+    re.IGNORECASE,
+)
+
+
+class ProgressState(BaseModel):
+    """what has been parsed from an etl log so far, and how far the parse got"""
+
+    # the offset just past the last parsed (i.e. complete) line, and the
+    # (original) names & sizes of the log files up to it
+    size: int = 0
+    files: List[Tuple[str, int]] = []
+    # the log time of the latest marker (seconds since the epoch, 0 if unknown)
+    timestamp: float = 0.0
+    stage: Optional[str] = None
+    table: Optional[str] = None
+    table_started: float = 0.0
+    tables_done: List[str] = []
+    table_rows: Dict[str, int] = {}
+    # how long each table took, for the estimates of later runs
+    table_seconds: Dict[str, float] = {}
+
+
+class ETLProgress(BaseModel):
+    """the progress of a job's etl, for the job detail"""
+
+    stage: Optional[str] = None
+    table: Optional[str] = None
+    tables_done: List[str] = []
+    tables_remaining: List[str] = []
+    rows: int = 0
+    # the rows of the job's input files, if they were counted at upload
+    rows_total: Optional[int] = None
+    table_rows: Dict[str, int] = {}
+    # estimated from the table durations of earlier runs, if there were any
+    eta_seconds: Optional[float] = None
+
+
+def finish_table(state: ProgressState, name: str, timestamp: float):
+    """mark a table done, timing it if it is the one in progress"""
+    if name not in state.tables_done:
+        state.tables_done.append(name)
+    if name == state.table:
+        if state.table_started and timestamp >= state.table_started:
+            state.table_seconds[name] = timestamp - state.table_started
+        state.table = None
+
+
+def apply_marker(state: ProgressState, marker: re.Match, timestamp: float):
+    """update the state with a marker found in the log"""
+    if timestamp:
+        state.timestamp = timestamp
+    if stage := marker["stage"]:
+        if state.table is not None:
+            finish_table(state, state.table, state.timestamp)
+        state.stage = stage.decode("utf-8")
+    elif table := marker["table"]:
+        name = table.decode("utf-8")
+        if state.table is not None and state.table != name:
+            finish_table(state, state.table, state.timestamp)
+        if state.table != name:
+            state.table = name
+            state.table_started = state.timestamp
+    else:
+        name = marker["done"].decode("utf-8") if marker["done"] else state.table
+        if name is None:
+            return
+        rows = int(marker["rows"].replace(b",", b""))
+        state.table_rows[name] = state.table_rows.get(name, 0) + rows
+        finish_table(state, name, state.timestamp)
+
+
+def marker_time(block: bytes, position: int) -> float:
+    """the timestamp of the line of the block the position is in, 0 if none"""
+    stamp = TIMESTAMP.match(block, block.rfind(b"\n", 0, position) + 1)
+    if stamp is None:
+        return 0.0
+    second, fraction = stamp.groups()
+    moment = datetime.datetime.fromisoformat(second.decode("ascii"))
+    return epoch_seconds(moment) + (
+        int(fraction) / 10 ** len(fraction) if fraction else 0.0
+    )
+
+
+class ProgressTracker:
+    """parses an etl log incrementally, persisting the state between parses"""
+
+    def __init__(self, reader: LogReader, job_path: Path) -> None:
+        self.reader = reader
+        self.progress_file = job_path / PROGRESS_FILENAME
+        self.lock_file = job_path / PROGRESS_LOCK_FILENAME
+
+    def load(self) -> ProgressState:
+        """the persisted state (an initial one if there is none)"""
+        return load_progress(self.progress_file)
+
+    def save(self, state: ProgressState):
+        """persist the state"""
+        temp_file = self.progress_file.with_name(
+            f".{self.progress_file.name}.{os.getpid()}"
+        )
+        with open(temp_file, "wt", encoding="utf-8") as progressfh:
+            progressfh.write(state.model_dump_json())
+        os.replace(temp_file, self.progress_file)
+
+    def update(self) -> ProgressState:
+        """parse what was logged since the previous update"""
+        self.reader.refresh()
+        with locked_file(self.lock_file):
+            state = self.load()
+            if reparse := not still_covers(self.reader, state.size, state.files):
+                logger.info("reparsing the etl log of %s", self.reader.log_dir)
+                state = ProgressState()
+            parsed = state.size
+            for offset, block in whole_lines(self.reader, parsed, self.reader.size):
+                # (an unterminated last line is parsed once it is complete)
+                if (end := block.rfind(b"\n") + 1) == 0:
+                    break
+                for marker in MARKER.finditer(block, 0, end):
+                    apply_marker(state, marker, marker_time(block, marker.start()))
+                parsed = offset + end
+            if reparse or parsed != state.size:
+                state.size = parsed
+                state.files = covered_files(self.reader, parsed)
+                self.save(state)
+        return state
+
+
+def load_progress(path: Path) -> ProgressState:
+    """the progress state persisted in the given file (an initial one if none)"""
+    try:
+        with open(path, "rt", encoding="utf-8") as progressfh:
+            return ProgressState.model_validate_json(progressfh.read())
+    except (FileNotFoundError, ValueError):
+        return ProgressState()
+
+
+def table_history(states: Iterable[ProgressState]) -> Dict[str, float]:
+    """the median time each table took, across the given (earlier) runs"""
+    durations: Dict[str, List[float]] = {}
+    for state in states:
+        for name, seconds in state.table_seconds.items():
+            durations.setdefault(name, []).append(seconds)
+    return {name: statistics.median(values) for name, values in durations.items()}
+
+
+def estimate_remaining(
+    state: ProgressState,
+    remaining: Sequence[str],
+    history: Mapping[str, float],
+    now: Optional[float] = None,
+) -> Optional[float]:
+    """
+    the seconds the remaining tables should take, going by their durations in
+    earlier runs (tables without any taking the median of those with one),
+    less the time the current table has been running until now (seconds since
+    the epoch, the current time by default)
+    """
+    if not remaining:
+        return 0.0
+    if not history:
+        return None
+    typical = statistics.median(history.values())
+    seconds = sum(history.get(name, typical) for name in remaining)
+    if (current := state.table) is not None and current in remaining:
+        if state.table_started:
+            running = (time.time() if now is None else now) - state.table_started
+            seconds -= min(max(running, 0.0), history.get(current, typical))
+    return max(seconds, 0.0)
+
+
+def etl_progress(
+    state: ProgressState,
+    csv_params: Sequence[str],
+    uploads: Mapping[str, int],
+    history: Mapping[str, float],
+    now: Optional[float] = None,
+) -> ETLProgress:
+    """
+    the progress of an etl given the names of its csv params, the rows of the
+    job's uploads by param name, and the table durations of earlier runs; the
+    tables to process are those uploaded (all the csv params if the uploads
+    weren't recorded)
+    """
+    tables = [name for name in csv_params if not uploads or name in uploads]
+    remaining = [name for name in tables if name not in state.tables_done]
+    return ETLProgress(
+        stage=state.stage,
+        table=state.table,
+        tables_done=[name for name in tables if name in state.tables_done],
+        tables_remaining=remaining,
+        rows=sum(state.table_rows.values()),
+        rows_total=sum(uploads.values()) if uploads else None,
+        table_rows=state.table_rows,
+        eta_seconds=estimate_remaining(state, remaining, history, now),
+    )
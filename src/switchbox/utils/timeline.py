@@ -0,0 +1,170 @@
+"""append-only timelines of the phases a job goes through"""
+
+import datetime
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+# the timeline file in each job directory
+TIMELINE_FILENAME = "timeline.jsonl"
+# the phase a job ends in, whatever its outcome
+FINISHED_PHASE = "finished"
+
+
+def read_boot_id() -> str:
+    """
+    the id of the current boot; monotonic clock readings are only comparable
+    within one boot
+    """
+    try:
+        with open("/proc/sys/kernel/random/boot_id", "rt", encoding="ascii") as bootfh:
+            return bootfh.read().strip()
+    except OSError:
+        return ""
+
+
+BOOT_ID = read_boot_id()
+
+
+class PhaseEvent(BaseModel):
+    """the start of a phase, as recorded in a timeline file"""
+
+    phase: str
+    # wall clock time
+    at: datetime.datetime
+    # monotonic clock time (CLOCK_MONOTONIC is shared by all processes)
+    mono: float
+    boot: str = ""
+
+
+class PhaseSpan(BaseModel):
+    """a phase of a job and how long it took (None for the current phase)"""
+
+    phase: str
+    start: datetime.datetime
+    seconds: Optional[float] = None
+
+
+class PhaseStats(BaseModel):
+    """percentiles of the durations of a phase across jobs"""
+
+    phase: str
+    count: int
+    p50: float
+    p90: float
+    p99: float
+    max: float
+
+
+def make_event(phase: str, at: Optional[datetime.datetime] = None) -> PhaseEvent:
+    """
+    an event for a phase starting now or, for a phase which started earlier
+    (e.g. a container start reported by docker), at the given time
+    """
+    mono, wall = time.monotonic(), time.time()
+    if at is None or at.tzinfo is None or at.year <= 1:
+        return PhaseEvent(
+            phase=phase,
+            at=datetime.datetime.fromtimestamp(wall, tz=datetime.timezone.utc),
+            mono=mono,
+            boot=BOOT_ID,
+        )
+    return PhaseEvent(
+        phase=phase, at=at, mono=mono - max(wall - at.timestamp(), 0), boot=BOOT_ID
+    )
+
+
+def elapsed(start: PhaseEvent, end: PhaseEvent) -> float:
+    """seconds between two events, by the monotonic clock if they share a boot"""
+    if start.boot and start.boot == end.boot:
+        return max(end.mono - start.mono, 0)
+    return max((end.at - start.at).total_seconds(), 0)
+
+
+def phase_spans(events: Sequence[PhaseEvent]) -> List[PhaseSpan]:
+    """the phases of a timeline, each lasting until the next one started"""
+    spans = []
+    for index, event in enumerate(events):
+        seconds = None
+        if index + 1 < len(events):
+            seconds = elapsed(event, events[index + 1])
+        spans.append(PhaseSpan(phase=event.phase, start=event.at, seconds=seconds))
+    return spans
+
+
+def percentile(values: Sequence[float], fraction: float) -> float:
+    """the given percentile (0..1) of sorted values, interpolating linearly"""
+    position = (len(values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def phase_stats(timelines: Iterable[Sequence[PhaseEvent]]) -> List[PhaseStats]:
+    """percentile durations of each (completed) phase across the timelines"""
+    durations: Dict[str, List[float]] = {}
+    for events in timelines:
+        for span in phase_spans(events):
+            if span.seconds is not None:
+                durations.setdefault(span.phase, []).append(span.seconds)
+    stats = []
+    for phase, values in durations.items():
+        values.sort()
+        stats.append(
+            PhaseStats(
+                phase=phase,
+                count=len(values),
+                p50=percentile(values, 0.5),
+                p90=percentile(values, 0.9),
+                p99=percentile(values, 0.99),
+                max=values[-1],
+            )
+        )
+    return stats
+
+
+class Timeline:
+    """
+    the phase events of a job, one json object per line; lines are only ever
+    appended, in single writes, so no lock is needed to record an event
+    """
+
+    path: Path
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+
+    def record(self, phase: str, at: Optional[datetime.datetime] = None):
+        """append the start of a phase"""
+        line = make_event(phase, at).model_dump_json() + "\n"
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line.encode("utf-8"))
+        finally:
+            os.close(fd)
+
+    def events(self) -> List[PhaseEvent]:
+        """the recorded events, oldest first"""
+        events = []
+        try:
+            with open(self.path, "rt", encoding="utf-8") as timelinefh:
+                for line in timelinefh:
+                    try:
+                        events.append(PhaseEvent.model_validate(json.loads(line)))
+                    except ValueError:
+                        # a line cut short by a crash
+                        logger.debug("skipping bad line in %s", self.path)
+        except FileNotFoundError:
+            pass
+        return events
+
+    def spans(self) -> List[PhaseSpan]:
+        """the recorded phases and their durations"""
+        return phase_spans(self.events())
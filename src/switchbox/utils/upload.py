@@ -0,0 +1,267 @@
+"""streaming ingestion of multipart/form-data job submissions"""
+
+import csv
+import hashlib
+import logging
+from pathlib import Path
+from typing import IO, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from werkzeug.sansio.multipart import (
+    Data,
+    Epilogue,
+    Event,
+    Field,
+    File,
+    MultipartDecoder,
+    NeedData,
+)
+
+from ..models.job import InputFile
+
+logger = logging.getLogger(__name__)
+
+# size of the reads from the request body and of the writes to disk
+CHUNK_SIZE = 1024 * 1024
+# the header row of each csv must be complete within this many bytes
+HEADER_LIMIT = 64 * 1024
+# limit on the size of the non-file form fields
+FIELD_LIMIT = 512 * 1024
+
+CANDIDATE_DELIMITERS = (";", ",", "\t", "|")
+
+
+class UploadError(ValueError):
+    """raised when an uploaded file is rejected"""
+
+    def __init__(self, param_name: str, message: str) -> None:
+        super().__init__(f"{param_name}: {message}")
+        self.param_name = param_name
+
+
+def parse_header(line: bytes, delimiter: str) -> List[str]:
+    """split a csv header line into normalized column names"""
+    try:
+        text = line.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        text = line.decode("latin-1")
+    row = next(csv.reader([text.rstrip("\r\n")], delimiter=delimiter), [])
+    return [col.strip().lower() for col in row]
+
+
+def check_header(
+    param_name: str,
+    line: bytes,
+    expected: Sequence[str],
+    delimiter_hint: Optional[str] = None,
+) -> Tuple[str, List[str]]:
+    """
+    validate a csv header line against the expected column names; returns the
+    delimiter which produced a matching header and the parsed column names;
+    raises UploadError when no delimiter produces a header with every column
+    """
+    wanted = [col.lower() for col in expected]
+    delimiters = [delimiter_hint] if delimiter_hint else []
+    delimiters += [d for d in CANDIDATE_DELIMITERS if d != delimiter_hint]
+    best: Tuple[str, List[str], List[str]] = ("", [], wanted)
+    for delimiter in delimiters:
+        columns = parse_header(line, delimiter)
+        missing = [col for col in wanted if col not in columns]
+        if not missing:
+            return delimiter, columns
+        if len(missing) < len(best[2]):
+            best = (delimiter, columns, missing)
+    raise UploadError(
+        param_name, f"header is missing the column(s): {', '.join(best[2])}"
+    )
+
+
+class CSVIngest:  # pylint: disable=too-many-instance-attributes
+    """
+    incremental writer for a single uploaded csv; hashes and counts the data as
+    it is written and validates the header row as soon as it has arrived
+    """
+
+    def __init__(
+        self,
+        param_name: str,
+        filename: str,
+        path: Path,
+        expected_columns: Optional[Sequence[str]] = None,
+        delimiter_hint: Optional[str] = None,
+    ) -> None:
+        self.param_name = param_name
+        self.filename = filename
+        self.path = path
+        self.expected_columns = expected_columns
+        self.delimiter_hint = delimiter_hint
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.newlines = 0
+        self.last_byte = b""
+        self.header: Optional[bytes] = None
+        self.delimiter = ""
+        self.columns: List[str] = []
+        self._head = bytearray()
+        # pylint: disable-next=consider-using-with
+        self._fh: IO[bytes] = open(path, "wb", buffering=CHUNK_SIZE)
+
+    def write(self, data: bytes):
+        """append a piece of the file"""
+        if not data:
+            return
+        if self.header is None:
+            self._head += data
+            newline = self._head.find(b"\n")
+            if newline >= 0:
+                self._set_header(bytes(self._head[: newline + 1]))
+            elif len(self._head) > HEADER_LIMIT:
+                self.abort()
+                raise UploadError(
+                    self.param_name, f"no header row within {HEADER_LIMIT} bytes"
+                )
+        self._fh.write(data)
+        self.digest.update(data)
+        self.size += len(data)
+        self.newlines += data.count(b"\n")
+        self.last_byte = data[-1:]
+
+    def _set_header(self, line: bytes):
+        """validate and record the header row"""
+        self.header = line
+        self._head = bytearray()
+        if self.expected_columns:
+            try:
+                self.delimiter, self.columns = check_header(
+                    self.param_name, line, self.expected_columns, self.delimiter_hint
+                )
+            except UploadError:
+                self.abort()
+                raise
+        else:
+            self.delimiter = self.delimiter_hint or ""
+            self.columns = parse_header(line, self.delimiter or ",")
+
+    def close(self) -> InputFile:
+        """finish writing the file and return its description"""
+        if self.header is None and self.size:
+            # a header without a trailing newline (and no data rows)
+            self._set_header(bytes(self._head))
+        self._fh.close()
+        lines = self.newlines + (1 if self.size and self.last_byte != b"\n" else 0)
+        return InputFile(
+            param_name=self.param_name,
+            filename=self.filename,
+            path=str(self.path),
+            sha256=self.digest.hexdigest(),
+            size=self.size,
+            rows=max(lines - 1, 0),
+            delimiter=self.delimiter,
+            columns=self.columns,
+        )
+
+    def abort(self):
+        """stop writing and remove the partial file"""
+        self._fh.close()
+        self.path.unlink(missing_ok=True)
+
+
+class MultipartIngest:
+    """
+    consumer of multipart decoder events; csv parts named in csv_columns are
+    written straight to data_dir as they arrive, other file parts are discarded
+    """
+
+    def __init__(
+        self, data_dir: Path, csv_columns: Mapping[str, Optional[Sequence[str]]]
+    ) -> None:
+        self.data_dir = data_dir
+        self.csv_columns = csv_columns
+        self.fields: Dict[str, str] = {}
+        self.files: List[InputFile] = []
+        self._part: Optional[Field | File] = None
+        self._field_data: List[bytes] = []
+        self._ingest: Optional[CSVIngest] = None
+
+    def feed(self, event: Event):
+        """handle a single decoder event"""
+        if isinstance(event, File):
+            self._part = event
+            if event.name in self.csv_columns:
+                output_path = self.data_dir / f"{event.name}.csv"
+                logger.debug("incoming file %s; writing to %s", event.name, output_path)
+                self._ingest = CSVIngest(
+                    event.name,
+                    event.filename,
+                    output_path,
+                    expected_columns=self.csv_columns[event.name],
+                    delimiter_hint=self.fields.get("input_delimiter"),
+                )
+        elif isinstance(event, Field):
+            self._part = event
+            self._field_data = []
+        elif not isinstance(event, Data):
+            logger.debug("ignoring multipart event %s", event)
+        elif isinstance(self._part, Field):
+            self._field_data.append(event.data)
+            if not event.more_data:
+                self.fields[self._part.name] = b"".join(self._field_data).decode(
+                    "utf-8", "replace"
+                )
+        elif self._ingest is not None:
+            self._ingest.write(event.data)
+            if not event.more_data:
+                self.files.append(self._ingest.close())
+                self._ingest = None
+
+    @property
+    def part_name(self) -> str:
+        """the name of the part being received (or of the last one received)"""
+        return self._part.name if self._part is not None else ""
+
+    def abort(self):
+        """discard the file part currently being written, if any"""
+        if self._ingest is not None:
+            self._ingest.abort()
+            self._ingest = None
+
+
+def ingest_multipart(
+    stream: IO[bytes],
+    boundary: bytes,
+    data_dir: Path,
+    csv_columns: Mapping[str, Optional[Sequence[str]]],
+) -> Tuple[Dict[str, str], List[InputFile]]:
+    """
+    parse a multipart/form-data request body from the given stream, writing
+    the csv parts named in csv_columns to data_dir as they are received;
+    returns the form fields and the descriptions of the ingested files; raises
+    UploadError for a rejected file, and for a body which is malformed or ends
+    early
+    """
+    decoder = MultipartDecoder(boundary, max_form_memory_size=FIELD_LIMIT)
+    ingest = MultipartIngest(data_dir, csv_columns)
+    try:
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            decoder.receive_data(chunk or None)
+            event = decoder.next_event()
+            while not isinstance(event, (Epilogue, NeedData)):
+                ingest.feed(event)
+                event = decoder.next_event()
+            if isinstance(event, Epilogue):
+                break
+            if not chunk:
+                raise UploadError(ingest.part_name, "the request body ended early")
+    except UploadError:
+        ingest.abort()
+        raise
+    except ValueError as err:
+        # (the decoder's complaints about the body itself)
+        ingest.abort()
+        raise UploadError(
+            ingest.part_name, f"malformed multipart request body: {err}"
+        ) from err
+    except Exception:
+        ingest.abort()
+        raise
+    return ingest.fields, ingest.files
@@ -0,0 +1,312 @@
+"""pre-flight validation of a job's input csv files, ahead of the etl"""
+
+import csv
+import logging
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import cache
+from pathlib import Path
+from typing import IO, Dict, List, Mapping, Optional, Pattern, Sequence, Tuple
+
+from charset_normalizer import from_bytes
+
+from ..models.job import FileReport, InputFile, PreflightReport
+from .upload import CANDIDATE_DELIMITERS, parse_header
+
+logger = logging.getLogger(__name__)
+
+# bytes of each file used to detect its encoding
+SNIFF_SIZE = 1024 * 1024
+# rows listed per kind of problem in a report
+MAX_EXAMPLES = 5
+# encodings the etl reads without surprises
+EXPECTED_ENCODINGS = ("utf_8", "ascii")
+
+# columns which hold dates: date_visit, mri_date, dmt_start, np_treat_stop, ...
+DATE_COLUMN = re.compile(r"(^|_)date(_|$)|_(start|stop)$")
+# the etl's date format (its DATE_FORMAT) unless a job's config sets another
+DEFAULT_DATE_FORMAT = "DDMONYYYY"
+# the parts of a date format, and what they match; anything else is literal
+DATE_TOKENS = {
+    "YYYY": r"(?P<y>\d{4})",
+    "MON": r"(?P<mon>[A-Za-z]{3})",
+    "MM": r"(?P<m>\d{%s})",
+    "DD": r"(?P<d>\d{%s})",
+}
+# a day or month token next to one of these has no separator to end it
+NUMERIC = (["YYYY"], ["MM"], ["DD"])
+# the month names of MON (in english, as the etl expects them)
+MONTHS = "JAN FEB MAR APR MAY JUN JUL AUG SEP OCT NOV DEC".split()
+
+
+@cache
+def date_pattern(layout: str) -> Pattern[str]:
+    """
+    the pattern of the dates of the given format (e.g. DDMONYYYY, YYYY-MM-DD),
+    capturing year, month & day; a day or month next to another number has two
+    digits, otherwise one will do
+    """
+    parts = re.split(f"({'|'.join(DATE_TOKENS)})", layout.upper())
+    pattern = ""
+    for i, part in enumerate(parts):
+        if part not in DATE_TOKENS:
+            pattern += re.escape(part)
+            continue
+        # (split, the tokens are at the odd indices, between literals)
+        crowded = (not parts[i - 1] and parts[i - 2 : i - 1] in NUMERIC) or (
+            not parts[i + 1] and parts[i + 2 : i + 3] in NUMERIC
+        )
+        pattern += DATE_TOKENS[part].replace("%s", "2" if crowded else "1,2")
+    try:
+        compiled = re.compile(pattern, re.IGNORECASE)
+    except re.error as err:
+        raise ValueError(f"unsupported date format {layout!r}") from err
+    groups = set(compiled.groupindex)
+    if not ({"y", "d"} <= groups and {"m", "mon"} & groups):
+        raise ValueError(f"unsupported date format {layout!r}")
+    return compiled
+
+
+def valid_date(match: re.Match) -> bool:
+    """whether a date pattern match is a plausible calendar date"""
+    if (name := match.groupdict().get("mon")) is not None:
+        if name.upper() not in MONTHS:
+            return False
+        month = MONTHS.index(name.upper()) + 1
+    else:
+        month = int(match["m"])
+    day = int(match["d"])
+    return 1 <= month <= 12 and 1 <= day <= 31 and 1800 <= int(match["y"]) <= 2200
+
+
+class ColumnCheck:
+    """the checks on the values of one column: a date column's must be dates"""
+
+    def __init__(self, name: str, date_format: str = DEFAULT_DATE_FORMAT) -> None:
+        self.name = name
+        self.is_date = bool(DATE_COLUMN.search(name))
+        self.date_format = date_format
+        self.pattern = date_pattern(date_format) if self.is_date else None
+        self.bad = 0
+        self.examples: List[str] = []
+
+    def check(self, value: str, line: int):
+        """check the value on the given line"""
+        if self.pattern is None or not (value := value.strip()):
+            return
+        if not ((match := self.pattern.fullmatch(value)) and valid_date(match)):
+            self.fail(value, line)
+
+    def fail(self, value: str, line: int):
+        """note a bad value"""
+        self.bad += 1
+        if len(self.examples) < MAX_EXAMPLES:
+            self.examples.append(f"line {line}: {value!r}")
+
+    def problem(self) -> Optional[str]:
+        """a description of the column's bad values, if there were any"""
+        if not self.bad:
+            return None
+        return (
+            f"column {self.name}: {self.bad} value(s) are not dates in the "
+            f"configured format ({self.date_format}): " + ", ".join(self.examples)
+        )
+
+
+def detect_encoding(path: Path) -> Tuple[str, List[str]]:
+    """the encoding of the file, and any warning about it"""
+    with open(path, "rb") as csvfh:
+        head = csvfh.read(SNIFF_SIZE)
+    if head.startswith(b"\xef\xbb\xbf"):
+        return "utf_8_sig", []
+    if not head:
+        return "utf_8", []
+    try:
+        head.decode("utf-8")
+        return "utf_8", []
+    except UnicodeDecodeError as err:
+        # a multi-byte character cut off at the end of the sniffed bytes
+        if err.start >= len(head) - 3 and len(head) == SNIFF_SIZE:
+            return "utf_8", []
+    best = from_bytes(head).best()
+    if best is None:
+        raise ValueError("unable to detect the text encoding")
+    encoding = best.encoding
+    warnings = []
+    if encoding not in EXPECTED_ENCODINGS:
+        warnings.append(f"file is encoded as {encoding}, not utf-8")
+    return encoding, warnings
+
+
+def check_delimiter(
+    header: bytes, expected: Sequence[str], delimiter: str
+) -> Optional[str]:
+    """
+    when the header only has the expected columns with a delimiter other than
+    the configured one, that delimiter
+    """
+    wanted = {column.lower() for column in expected}
+    if wanted <= set(parse_header(header, delimiter)):
+        return None
+    for candidate in CANDIDATE_DELIMITERS:
+        if candidate != delimiter and wanted <= set(parse_header(header, candidate)):
+            return candidate
+    return None
+
+
+def validate_file(
+    param_name: str,
+    path: str,
+    expected: Optional[Sequence[str]],
+    delimiter: str,
+    filename: str = "",
+    date_format: str = DEFAULT_DATE_FORMAT,
+) -> FileReport:
+    """
+    check one input file; without a delimiter, whichever delimiter gives the
+    expected header is accepted. this runs in a worker process
+    """
+    report = FileReport(
+        param_name=param_name, filename=filename, delimiter=delimiter or ","
+    )
+    csv_path = Path(path)
+    try:
+        report.encoding, report.warnings = detect_encoding(csv_path)
+    except (OSError, ValueError) as err:
+        report.errors.append(str(err))
+        return report
+
+    with open(
+        csv_path, "rt", encoding=report.encoding, errors="replace", newline=""
+    ) as csvfh:
+        header_line = csvfh.readline()
+        header = header_line.encode("utf-8")
+        if expected and (other := check_delimiter(header, expected, report.delimiter)):
+            if delimiter:
+                report.errors.append(
+                    f"file is delimited by {other!r}, not the configured {delimiter!r}"
+                )
+            report.delimiter = other
+        report.columns = parse_header(header, report.delimiter)
+        if expected and (
+            missing := [c for c in expected if c.lower() not in report.columns]
+        ):
+            report.errors.append(f"missing column(s): {', '.join(missing)}")
+
+        report.rows, problems = scan_rows(
+            csvfh, report.delimiter, report.columns, date_format
+        )
+    report.errors += problems
+    return report
+
+
+def scan_rows(
+    csvfh: IO[str],
+    delimiter: str,
+    columns: Sequence[str],
+    date_format: str = DEFAULT_DATE_FORMAT,
+) -> Tuple[int, List[str]]:
+    """check the rows of an open csv; returns the row count and the problems"""
+    # only the columns which have checks are visited in each row
+    checked = [
+        (i, check)
+        for i, column in enumerate(columns)
+        if (check := ColumnCheck(column, date_format)).is_date
+    ]
+    width = len(columns)
+    rows = 0
+    bad_width = 0
+    bad_width_lines: List[str] = []
+    reader = csv.reader(csvfh, delimiter=delimiter)
+    for row in reader:
+        if not row:
+            continue
+        rows += 1
+        if len(row) != width:
+            bad_width += 1
+            if len(bad_width_lines) < MAX_EXAMPLES:
+                # the header line was read before the reader started
+                bad_width_lines.append(str(reader.line_num + 1))
+            continue
+        for i, check in checked:
+            check.check(row[i], reader.line_num + 1)
+
+    problems = []
+    if bad_width:
+        problems.append(
+            f"{bad_width} row(s) don't have {width} fields (lines "
+            + ", ".join(bad_width_lines)
+            + ")"
+        )
+    problems += [p for _, check in checked if (p := check.problem())]
+    return rows, problems
+
+
+@cache
+def csv_pool() -> ProcessPoolExecutor:
+    """
+    the process-wide pool csv files are processed in; its processes are forked
+    from a fork server, so they never inherit the api's threads
+    """
+    return ProcessPoolExecutor(
+        max_workers=min(os.cpu_count() or 1, 8),
+        mp_context=multiprocessing.get_context("forkserver"),
+    )
+
+
+# the pool's processes belong to the parent
+os.register_at_fork(after_in_child=csv_pool.cache_clear)
+
+
+def validate_inputs(
+    inputs: Sequence[InputFile],
+    csv_columns: Mapping[str, Optional[Sequence[str]]],
+    delimiter: str,
+    executor: Optional[Executor] = None,
+    date_format: str = DEFAULT_DATE_FORMAT,
+) -> PreflightReport:
+    """
+    check the given input files concurrently: their encoding, delimiter,
+    header, row widths and dates (in the given format); csv params without a
+    file get a warning
+    """
+    # (an unsupported date format fails here, rather than in every file's check)
+    date_pattern(date_format)
+    began = time.monotonic()
+    pool = executor if executor is not None else csv_pool()
+    futures = {
+        item.param_name: pool.submit(
+            validate_file,
+            item.param_name,
+            item.path,
+            csv_columns.get(item.param_name),
+            delimiter,
+            item.filename,
+            date_format,
+        )
+        for item in inputs
+        if item.param_name in csv_columns
+    }
+    reports: Dict[str, FileReport] = {}
+    for param_name, future in futures.items():
+        try:
+            reports[param_name] = future.result()
+        except Exception as err:  # pylint: disable=broad-exception-caught
+            logger.exception("validating %s failed", param_name)
+            reports[param_name] = FileReport(
+                param_name=param_name, errors=[f"validation failed: {err}"]
+            )
+    for param_name in csv_columns:
+        if param_name not in reports:
+            reports[param_name] = FileReport(
+                param_name=param_name, warnings=["no file was uploaded"]
+            )
+    files = [reports[name] for name in csv_columns]
+    return PreflightReport(
+        ok=all(report.ok for report in files),
+        files=files,
+        elapsed=time.monotonic() - began,
+    )
@@ -0,0 +1,105 @@
+"""tracking the vocabulary in the cdmdb, so that the etl only reloads it if changed"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .images import image_pins
+from .models.catalog import JobCatalog
+
+logger = logging.getLogger(__name__)
+
+# where the hashes of the vocabulary files are cached, in the job directory
+VOCAB_HASHES_FILENAME = ".vocab-hashes.json"
+# the catalog meta key of the fingerprint of the vocabulary in the cdmdb
+LOADED_VOCAB_KEY = "loaded_vocab"
+HASH_CHUNK_SIZE = 4 * 1024 * 1024
+
+_hashes_lock = threading.Lock()
+
+
+def file_sha256(path: Path) -> str:
+    """the sha256 of a file's contents"""
+    sha = hashlib.sha256()
+    with open(path, "rb") as vocabfh:
+        while chunk := vocabfh.read(HASH_CHUNK_SIZE):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def fingerprint_dir(vocab_dir: Path, hashes_file: Path) -> str:
+    """
+    a fingerprint of the contents of every file under vocab_dir; the hash of
+    each file is cached by its size and mtime, so only new or changed files
+    are read
+    """
+    with _hashes_lock:
+        try:
+            with open(hashes_file, "rt", encoding="utf-8") as hashesfh:
+                cached: Dict[str, List] = json.load(hashesfh)
+        except (FileNotFoundError, json.JSONDecodeError):
+            cached = {}
+        hashes: Dict[str, List] = {}
+        for dirpath, dirnames, filenames in os.walk(vocab_dir):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                path = Path(dirpath) / filename
+                stat = path.stat()
+                key = str(path.relative_to(vocab_dir))
+                entry = cached.get(key)
+                if entry is None or entry[:2] != [stat.st_size, stat.st_mtime_ns]:
+                    logger.info("hashing vocabulary file %s", key)
+                    entry = [stat.st_size, stat.st_mtime_ns, file_sha256(path)]
+                hashes[key] = entry
+        if hashes != cached:
+            temp_file = hashes_file.with_name(f"{hashes_file.name}.{os.getpid()}")
+            with open(temp_file, "wt", encoding="utf-8") as hashesfh:
+                json.dump(hashes, hashesfh)
+            os.replace(temp_file, hashes_file)
+    listing = "\n".join(f"{key}\t{entry[2]}" for key, entry in sorted(hashes.items()))
+    return hashlib.sha256(listing.encode("utf-8")).hexdigest()
+
+
+def vocab_fingerprint(base_path: Path, vocab_dir: Optional[Path] = None) -> str:
+    """
+    the fingerprint of the vocabulary the etl would load: that of the given
+    directory or, without one, the digest of the etl image it is part of;
+    empty when neither is known
+    """
+    if vocab_dir is not None and vocab_dir.is_dir():
+        return "dir:" + fingerprint_dir(vocab_dir, base_path / VOCAB_HASHES_FILENAME)
+    if digest := image_pins(base_path).get("etl"):
+        return "image:" + digest
+    return ""
+
+
+def loaded_vocab(catalog: JobCatalog) -> str:
+    """the fingerprint of the vocabulary which is loaded in the cdmdb"""
+    return catalog.get_meta(LOADED_VOCAB_KEY) or ""
+
+
+def set_loaded_vocab(catalog: JobCatalog, fingerprint: str):
+    """record the vocabulary loaded in the cdmdb (empty when unknown)"""
+    catalog.set_meta(LOADED_VOCAB_KEY, fingerprint)
+
+
+def decide_reload(
+    catalog: JobCatalog, fingerprint: str, forced: Optional[str] = None
+) -> Tuple[str, Optional[bool]]:
+    """
+    whether an etl launched with the vocabulary of the given fingerprint is to
+    reload it, and the fingerprint to record for the run (that of the
+    vocabulary in the cdmdb once it succeeds, empty if it leaves that be);
+    forced is the RELOAD_VOCAB of the job's config, if it sets one. without
+    either, the decision is left to the etl (None)
+    """
+    if forced is not None:
+        reload_vocab = forced.strip().lower() in ("1", "true", "yes", "on")
+        return (fingerprint if reload_vocab else ""), reload_vocab
+    if not fingerprint:
+        return "", None
+    return fingerprint, fingerprint != loaded_vocab(catalog)
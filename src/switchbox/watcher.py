@@ -0,0 +1,236 @@
+"""event-driven tracking of job container state using the docker events stream"""
+
+import datetime
+import logging
+import threading
+from pathlib import Path
+from typing import Any, List, Mapping, Optional, Protocol, Sequence
+
+from docker.errors import NotFound
+
+from .compose import PROJECT_LABEL, SERVICE_LABEL, DockerClient, shared_docker_client
+from .metrics import STAGE_DURATION
+from .models.job import (
+    ACTIVE_STATUSES,
+    JOB_ID_LABEL,
+    ContainerState,
+    JobDir,
+    JobStatus,
+    get_catalog,
+    refresh_job_statuses,
+    same_container,
+    set_tracking,
+)
+
+logger = logging.getLogger(__name__)
+
+# container events which may change the State section of an inspection
+TRACKED_ACTIONS = ("create", "start", "die", "pause", "unpause", "restart", "oom")
+# the states of containers which have finished
+FINISHED_STATES = ("exited", "dead")
+
+
+def observe_run(service: str, before: ContainerState, after: ContainerState):
+    """record the run time of a job container which has just finished"""
+    if before.status in FINISHED_STATES or after.status not in FINISHED_STATES:
+        return
+    if after.start_dt.year <= 1 or after.exit_dt.year <= 1:
+        # never started
+        return
+    try:
+        seconds = (after.exit_dt - after.start_dt).total_seconds()
+    except TypeError:
+        # a naive datetime; not from docker
+        return
+    outcome = "success" if after.exit_code == 0 else "failure"
+    STAGE_DURATION.observe(max(seconds, 0), service, outcome)
+
+
+class StatusWatcher:  # pylint: disable=too-many-instance-attributes
+    """
+    keeps the saved JobStatus of every job current by following the docker
+    events stream for the job containers of the switchbox compose project
+    """
+
+    base_path: Path
+    project_name: str
+    services: Sequence[str]
+    retry_delay: float = 5.0
+
+    def __init__(
+        self,
+        base_path: Path,
+        project_name: str = "switchbox",
+        services: Sequence[str] = ("etl", "aresindexer"),
+        docker_client: Optional[DockerClient] = None,
+    ) -> None:
+        self.base_path = base_path
+        self.project_name = project_name
+        self.services = services
+        self._docker = docker_client
+        self.listeners: List[JobListener] = []
+        self._stop = threading.Event()
+        self._stream: Any = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def docker(self) -> DockerClient:
+        """the docker client used for the events stream and inspections"""
+        return self._docker if self._docker is not None else shared_docker_client()
+
+    def start(self):
+        """begin watching in a background thread"""
+        self._thread = threading.Thread(
+            target=self.run, name="status-watcher", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """stop watching and wait for the background thread to exit"""
+        self._stop.set()
+        set_tracking(self.base_path, False)
+        if self._stream is not None:
+            self._stream.close()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+
+    def run(self):
+        """
+        the watch loop: reconcile, then follow the events stream; whenever the
+        stream fails we back off, reconcile again and resubscribe
+        """
+        while not self._stop.is_set():
+            try:
+                # subscribe before reconciling so nothing falls in between
+                self._stream = self.docker.api.events(
+                    decode=True,
+                    filters={
+                        "type": "container",
+                        "label": [f"{PROJECT_LABEL}={self.project_name}"],
+                        "event": list(TRACKED_ACTIONS),
+                    },
+                )
+                self.reconcile()
+                set_tracking(self.base_path, True)
+                for event in self._stream:
+                    self.handle_event(event)
+            except Exception:  # pylint: disable=broad-exception-caught
+                if self._stop.is_set():
+                    break
+                logger.exception("docker events stream failed; reconnecting")
+            finally:
+                set_tracking(self.base_path, False)
+            self._stop.wait(self.retry_delay)
+
+    def add_listener(self, listener: "JobListener"):
+        """have the given listener notified of job changes and reconciliations"""
+        self.listeners.append(listener)
+
+    def reconcile(self):
+        """refresh the status of every job which has not yet been seen to exit"""
+        changed = refresh_job_statuses(
+            self.base_path, self.project_name, docker_client=self.docker
+        )
+        catalog = get_catalog(self.base_path)
+        for row in catalog.jobs_with_status(
+            *ACTIVE_STATUSES, column="aresindexer_status"
+        ):
+            stage = JobDir.open(self.base_path, row["job_id"]).get_status().aresindexer
+            if stage is not None and stage.container_id:
+                self.refresh(
+                    row["job_id"], str(stage.container_id), service="aresindexer"
+                )
+        logger.info("reconciled job statuses; %s changed", changed)
+        for listener in self.listeners:
+            listener.reconciled()
+
+    def handle_event(self, event: Mapping[str, Any]):
+        """apply a single docker container event to the matching job"""
+        actor = event.get("Actor", {})
+        attributes = actor.get("Attributes", {})
+        if (service := attributes.get(SERVICE_LABEL)) not in self.services:
+            return
+        container_id = actor.get("ID", "")
+        job_id = attributes.get(JOB_ID_LABEL) or get_catalog(
+            self.base_path
+        ).job_for_container(container_id)
+        if not job_id:
+            logger.debug("ignoring event for unknown container %s", container_id)
+            return
+        logger.debug("event %s for %s of job %s", event.get("Action"), service, job_id)
+        self.refresh(job_id, container_id, event, service=service)
+
+    def container_state(
+        self, container_id: str, event: Optional[Mapping[str, Any]] = None
+    ) -> Optional[Mapping[str, Any]]:
+        """
+        the "State" section of an inspection of the given container; for a
+        container which has already been removed the state is taken from the
+        die event if there is one, otherwise None is returned
+        """
+        try:
+            return self.docker.api.inspect_container(container_id)["State"]
+        except NotFound:
+            if event is None or event.get("Action") != "die":
+                logger.warning("container %s is gone", container_id)
+                return None
+        finished = datetime.datetime.fromtimestamp(
+            int(event.get("timeNano", 0)) / 1e9, tz=datetime.timezone.utc
+        )
+        return {
+            "Status": "exited",
+            "ExitCode": int(event["Actor"]["Attributes"].get("exitCode", -255)),
+            "FinishedAt": finished,
+        }
+
+    def refresh(
+        self,
+        job_id: str,
+        container_id: str,
+        event: Optional[Mapping[str, Any]] = None,
+        service: str = "etl",
+    ):
+        """inspect the given container and save its state to the job's status"""
+        if not (self.base_path / job_id).is_dir():
+            logger.debug("job %s has been removed", job_id)
+            return
+        if (state := self.container_state(container_id, event)) is None:
+            return
+
+        def apply(status: JobStatus) -> Optional[JobStatus]:
+            if service == "aresindexer":
+                stage = status.aresindexer
+                if stage is None:
+                    return None
+                # a container launched by the supervisor may report in before
+                # the supervisor has recorded its id
+                adopt = stage.status == "launching" and not stage.container_id
+                if not adopt and not same_container(stage.container_id, container_id):
+                    return None
+                status.aresindexer = stage.with_container_state(state)
+                status.aresindexer.container_id = container_id
+                observe_run(service, stage, status.aresindexer)
+                return status
+            if status.container_id and not same_container(
+                status.container_id, container_id
+            ):
+                # not the job's etl container
+                return None
+            updated = status.with_container_state(state)
+            updated.container_id = container_id
+            observe_run(service, status, updated)
+            return updated
+
+        JobDir.open(self.base_path, job_id).update_status(apply)
+        for listener in self.listeners:
+            listener.job_changed(job_id)
+
+
+class JobListener(Protocol):
+    """receiver of notifications from a StatusWatcher"""
+
+    def job_changed(self, job_id: str):
+        """the saved status of the given job may have changed"""
+
+    def reconciled(self):
+        """all job statuses were just brought up to date"""
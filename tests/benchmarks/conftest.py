@@ -0,0 +1,129 @@
+"""
+fixtures of the benchmark suite, which runs against a simulated docker; the
+suite is skipped unless SWITCHBOX_BENCH is set, and is sized and tuned with:
+  SWITCHBOX_BENCH_JOBS: comma-separated job tree sizes (default 10,1000;
+    up to 50000)
+  SWITCHBOX_BENCH_LOG_KB: the log size of each job (default 256)
+  SWITCHBOX_BENCH_UPLOAD_MB: the size of the uploaded csv (default 16; the
+    upload is generated as it is sent, so multi-gigabyte sizes are fine)
+  SWITCHBOX_BENCH_DOCKER_MS: the latency of each docker api call (default 1)
+  SWITCHBOX_BENCH_COMPOSE_MS: the latency of each compose subcommand
+    (default 50)
+  SWITCHBOX_BENCH_TOLERANCE: how much worse than the baseline a benchmark
+    may be before it fails, e.g. 0.5 for 50% (default 1.0)
+  SWITCHBOX_BENCH_UPDATE: when set, the measurements replace the baseline
+    instead of being checked against it
+"""
+
+import os
+from pathlib import Path
+from typing import Dict, List
+
+import pytest
+
+from switchbox.config import Config
+from switchbox.flaskapp import create_app
+
+from .fakes import FakeCompose, FakeDockerAPI, FakeDockerClient
+from .harness import Measurement, load_baseline, regressions, report, save_baseline
+from .synthetic import make_job_tree
+
+BENCH_DIR = Path(__file__).parent
+BASELINE_FILE = BENCH_DIR / "baseline.json"
+
+ENABLED = bool(os.environ.get("SWITCHBOX_BENCH"))
+JOB_COUNTS = [
+    int(count) for count in os.environ.get("SWITCHBOX_BENCH_JOBS", "10,1000").split(",")
+]
+LOG_BYTES = int(os.environ.get("SWITCHBOX_BENCH_LOG_KB", "256")) * 1024
+UPLOAD_BYTES = int(os.environ.get("SWITCHBOX_BENCH_UPLOAD_MB", "16")) * 1024 * 1024
+DOCKER_LATENCY = float(os.environ.get("SWITCHBOX_BENCH_DOCKER_MS", "1")) / 1000
+COMPOSE_LATENCY = float(os.environ.get("SWITCHBOX_BENCH_COMPOSE_MS", "50")) / 1000
+TOLERANCE = float(os.environ.get("SWITCHBOX_BENCH_TOLERANCE", "1.0"))
+UPDATE = bool(os.environ.get("SWITCHBOX_BENCH_UPDATE"))
+
+_measurements: List[Measurement] = []
+
+
+def pytest_collection_modifyitems(items):
+    """skip the benchmarks unless they were asked for"""
+    if ENABLED:
+        return
+    skip = pytest.mark.skip(reason="benchmarks run with SWITCHBOX_BENCH=1")
+    for item in items:
+        if BENCH_DIR in item.path.parents:
+            item.add_marker(skip)
+
+
+def pytest_terminal_summary(terminalreporter):
+    """print the measurements, and store them if the baseline is being updated"""
+    if not _measurements:
+        return
+    terminalreporter.section("benchmarks")
+    for line in report(_measurements):
+        terminalreporter.write_line(line)
+    if UPDATE:
+        save_baseline(BASELINE_FILE, _measurements)
+        terminalreporter.write_line(f"baseline updated: {BASELINE_FILE}")
+
+
+class Recorder:
+    """collects measurements and fails those which regressed"""
+
+    def __init__(self, baseline: Dict[str, Dict]) -> None:
+        self.baseline = baseline
+
+    def check(self, measurement: Measurement):
+        """record a measurement, failing if it is worse than its baseline"""
+        _measurements.append(measurement)
+        if UPDATE or (baseline := self.baseline.get(measurement.name)) is None:
+            return
+        if problems := regressions(measurement, baseline, TOLERANCE):
+            pytest.fail(f"{measurement.name} regressed: {'; '.join(problems)}")
+
+
+@pytest.fixture(name="bench", scope="session")
+def fixture_bench() -> Recorder:
+    """the recorder of the session's measurements"""
+    return Recorder(load_baseline(BASELINE_FILE))
+
+
+@pytest.fixture(name="fake_api", scope="session")
+def fixture_fake_api() -> FakeDockerAPI:
+    """the simulated docker daemon"""
+    return FakeDockerAPI(latency=DOCKER_LATENCY)
+
+
+@pytest.fixture(name="fake_docker", scope="session", autouse=True)
+def fixture_fake_docker(fake_api, tmp_path_factory):
+    """route the jobs' docker & compose interactions to the simulation"""
+    project_dir = tmp_path_factory.mktemp("subdeployment")
+    compose = FakeCompose(project_dir, fake_api, latency=COMPOSE_LATENCY)
+    client = FakeDockerClient(fake_api)
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr("switchbox.models.job.job_compose", lambda: compose)
+        patch.setattr("switchbox.models.job.shared_docker_client", lambda: client)
+        yield compose
+
+
+@pytest.fixture(name="job_tree", scope="session")
+def fixture_job_tree(fake_api, tmp_path_factory):
+    """a factory of (cached) job trees by size: (base path, job ids)"""
+    trees = {}
+
+    def tree(count: int):
+        if count not in trees:
+            base = tmp_path_factory.mktemp(f"jobs{count}")
+            trees[count] = (base, make_job_tree(base, count, LOG_BYTES, fake_api))
+        return trees[count]
+
+    return tree
+
+
+def make_client(base: Path):
+    """a test client for an api serving the given job directory"""
+    config = Config(cli_args=[])
+    config.job_dir = base
+    app = create_app(config)
+    app.config["TESTING"] = True
+    return app.test_client()
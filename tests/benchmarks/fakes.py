@@ -0,0 +1,278 @@
+"""a simulated docker daemon and 'docker compose', with configurable latencies"""
+
+import datetime
+import json
+import secrets
+import subprocess  # nosec B404
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional
+
+from docker.errors import NotFound
+
+from switchbox.compose import PROJECT_LABEL, SERVICE_LABEL, Compose
+
+# the services of the job subdeployment, as 'docker compose config' has them
+PROJECT_CONFIG = {
+    "name": "switchbox",
+    "services": {
+        "etl": {"image": "ghcr.io/msda-switchbox/msda_etl:latest"},
+        "aresindexer": {"image": "ghcr.io/msda-switchbox/aresindexer:latest"},
+    },
+}
+
+
+def iso(moment: float) -> str:
+    """a wall clock time the way docker reports it"""
+    return (
+        datetime.datetime.fromtimestamp(moment, tz=datetime.timezone.utc)
+        .isoformat()
+        .replace("+00:00", "Z")
+    )
+
+
+class FakeContainer:
+    """a container which, once started, runs for run_seconds then exits"""
+
+    def __init__(
+        self, image: str, labels: Mapping[str, str], run_seconds: float, exit_code: int
+    ) -> None:
+        self.id = secrets.token_hex(32)
+        self.image = image
+        self.labels = dict(labels)
+        self.run_seconds = run_seconds
+        self.exit_code = exit_code
+        self.started_at: Optional[float] = None
+        self.stopped_at: Optional[float] = None
+
+    def state(self) -> Dict[str, Any]:
+        """the "State" section of an inspection of the container"""
+        if self.started_at is None:
+            return {
+                "Status": "created",
+                "Running": False,
+                "ExitCode": 0,
+                "StartedAt": "0001-01-01T00:00:00Z",
+                "FinishedAt": "0001-01-01T00:00:00Z",
+            }
+        finished = self.stopped_at or self.started_at + self.run_seconds
+        if time.time() < finished:
+            return {
+                "Status": "running",
+                "Running": True,
+                "ExitCode": 0,
+                "StartedAt": iso(self.started_at),
+                "FinishedAt": "0001-01-01T00:00:00Z",
+            }
+        return {
+            "Status": "exited",
+            "Running": False,
+            "ExitCode": 137 if self.stopped_at else self.exit_code,
+            "StartedAt": iso(self.started_at),
+            "FinishedAt": iso(finished),
+        }
+
+
+def all_labelled(container: FakeContainer, labels: List[str]) -> bool:
+    """whether the container has all the given key=value labels"""
+    return all(
+        container.labels.get(key) == value
+        for key, _, value in (label.partition("=") for label in labels)
+    )
+
+
+class FakeDockerAPI:
+    """
+    stand-in for docker.APIClient keeping containers in memory; every call
+    takes latency seconds, and containers run for run_seconds once started
+    """
+
+    def __init__(
+        self, latency: float = 0.0, run_seconds: float = 3600.0, exit_code: int = 0
+    ) -> None:
+        self.latency = latency
+        self.run_seconds = run_seconds
+        self.exit_code = exit_code
+        self.calls = 0
+        self.containers_by_id: Dict[str, FakeContainer] = {}
+        self._lock = threading.Lock()
+
+    def call(self):
+        """account for (and take the time of) one api call"""
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def get(self, container_id: str) -> FakeContainer:
+        """the container with the given (full or short) id"""
+        with self._lock:
+            if (container := self.containers_by_id.get(container_id)) is not None:
+                return container
+            for full_id, container in self.containers_by_id.items():
+                if full_id.startswith(container_id):
+                    return container
+        raise NotFound(f"no such container: {container_id}")
+
+    def add(
+        self,
+        image: str,
+        labels: Mapping[str, str],
+        started: bool = False,
+        run_seconds: Optional[float] = None,
+    ) -> FakeContainer:
+        """put a container in place without the latency of an api call"""
+        container = FakeContainer(
+            image,
+            labels,
+            self.run_seconds if run_seconds is None else run_seconds,
+            self.exit_code,
+        )
+        if started:
+            container.started_at = time.time()
+        with self._lock:
+            self.containers_by_id[container.id] = container
+        return container
+
+    def containers(  # pylint: disable=redefined-builtin
+        self, all: bool = False, filters: Optional[Mapping[str, Any]] = None, **_kwargs
+    ) -> List[Dict[str, Any]]:
+        """the summaries of the containers matching the filters"""
+        self.call()
+        filters = filters or {}
+        labels = filters.get("label", [])
+        labels = [labels] if isinstance(labels, str) else labels
+        with self._lock:
+            candidates = list(self.containers_by_id.values())
+        summaries = []
+        for container in candidates:
+            state = container.state()
+            if not all and not state["Running"]:
+                continue
+            if "status" in filters and state["Status"] != filters["status"]:
+                continue
+            if not all_labelled(container, labels):
+                continue
+            summaries.append(
+                {
+                    "Id": container.id,
+                    "State": state["Status"],
+                    "Status": "Up (healthy)" if state["Running"] else "Exited",
+                    "Labels": container.labels,
+                }
+            )
+        return summaries
+
+    def inspect_container(self, container_id: str) -> Dict[str, Any]:
+        """the inspection of a container"""
+        self.call()
+        container = self.get(container_id)
+        return {"Id": container.id, "State": container.state()}
+
+    def inspect_image(self, image: str) -> Dict[str, Any]:
+        """every image is present"""
+        self.call()
+        return {"Id": f"sha256:{secrets.token_hex(32)}", "RepoTags": [image]}
+
+    @staticmethod
+    def create_host_config(**kwargs) -> Dict[str, Any]:
+        """the host config, as given"""
+        return kwargs
+
+    @staticmethod
+    def create_networking_config(endpoints: Mapping[str, Any]) -> Dict[str, Any]:
+        """the networking config, as given"""
+        return {"EndpointsConfig": endpoints}
+
+    @staticmethod
+    def create_endpoint_config(**kwargs) -> Dict[str, Any]:
+        """the endpoint config, as given"""
+        return kwargs
+
+    def create_container(
+        self, image: str, labels: Optional[Mapping[str, str]] = None, **_kwargs
+    ) -> Dict[str, Any]:
+        """create a container"""
+        self.call()
+        return {"Id": self.add(image, labels or {}).id, "Warnings": []}
+
+    def connect_container_to_network(self, *_args, **_kwargs):
+        """networks are not simulated"""
+        self.call()
+
+    def start(self, container_id: str):
+        """start a container"""
+        self.call()
+        self.get(container_id).started_at = time.time()
+
+    def stop(self, container_id: str, timeout: int = 10):  # pylint: disable=W0613
+        """stop a container"""
+        self.call()
+        self.get(container_id).stopped_at = time.time()
+
+    def remove_container(self, container_id: str, force: bool = False):
+        """remove a container"""
+        self.call()
+        container = self.get(container_id)
+        if container.state()["Running"] and not force:
+            raise RuntimeError(f"container {container_id} is running")
+        with self._lock:
+            del self.containers_by_id[container.id]
+
+
+class FakeDockerClient:
+    """stand-in for docker.DockerClient"""
+
+    def __init__(self, api: FakeDockerAPI) -> None:
+        self.api = api
+
+
+class FakeCompose(Compose):
+    """
+    a Compose whose subcommands are simulated against a FakeDockerAPI rather
+    than run; each subcommand takes latency seconds
+    """
+
+    def __init__(
+        self,
+        project_dir: Path,
+        api: FakeDockerAPI,
+        latency: float = 0.0,
+        project_name: str = "switchbox",
+    ) -> None:
+        super().__init__(
+            project_dir,
+            project_name=project_name,
+            docker_client=FakeDockerClient(api),  # type: ignore[arg-type]
+        )
+        self.api = api
+        self.latency = latency
+
+    def compose(
+        self, *subcmd: str, env=None, cwd=None
+    ) -> subprocess.CompletedProcess[str]:
+        if self.latency:
+            time.sleep(self.latency)
+        stdout = ""
+        if subcmd and subcmd[0] == "config":
+            stdout = json.dumps(PROJECT_CONFIG)
+        elif subcmd and subcmd[0] == "run":
+            args = [arg for arg in subcmd[1:] if not arg.startswith("-")]
+            labels = dict(
+                arg.removeprefix("--label=").split("=", 1)
+                for arg in subcmd
+                if arg.startswith("--label=")
+            )
+            service = args[0]
+            container = self.api.add(
+                PROJECT_CONFIG["services"][service]["image"],
+                {
+                    **labels,
+                    PROJECT_LABEL: self.project_name,
+                    SERVICE_LABEL: service,
+                },
+                started=True,
+            )
+            stdout = container.id + "\n"
+        return subprocess.CompletedProcess(["docker", "compose", *subcmd], 0, stdout)
@@ -0,0 +1,139 @@
+"""measuring latency, throughput & peak memory, and comparing with a baseline"""
+
+import json
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from pydantic import BaseModel
+
+# differences smaller than these are noise, whatever the tolerance
+LATENCY_SLACK_MS = 2.0
+MEMORY_SLACK_KIB = 256.0
+
+
+class Measurement(BaseModel):
+    """the numbers of one benchmark"""
+
+    name: str
+    iterations: int
+    p50_ms: float
+    p95_ms: float
+    ops_per_s: float
+    peak_kib: float
+    # for benchmarks which move data, e.g. uploads & log reads
+    mb_per_s: Optional[float] = None
+
+
+def measure(
+    name: str,
+    operation: Callable[[], Any],
+    iterations: int = 20,
+    warmup: int = 2,
+    bytes_per_op: int = 0,
+) -> Measurement:
+    """
+    time iterations calls of operation (after warmup calls), then make one
+    more call with allocations traced for the peak memory it takes
+    """
+    for _ in range(warmup):
+        operation()
+    latencies: List[float] = []
+    began = time.perf_counter()
+    for _ in range(iterations):
+        start = time.perf_counter()
+        operation()
+        latencies.append(time.perf_counter() - start)
+    total = time.perf_counter() - began
+
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        operation()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    latencies.sort()
+    return Measurement(
+        name=name,
+        iterations=iterations,
+        p50_ms=statistics.median(latencies) * 1000,
+        p95_ms=latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)] * 1000,
+        ops_per_s=iterations / total if total else 0,
+        peak_kib=peak / 1024,
+        mb_per_s=(bytes_per_op * iterations / total / 1e6) if bytes_per_op else None,
+    )
+
+
+def regressions(
+    measurement: Measurement, baseline: Dict[str, Any], tolerance: float
+) -> List[str]:
+    """how the measurement is worse than its baseline by more than tolerance"""
+    problems = []
+    limit = 1 + tolerance
+    if (
+        measurement.p50_ms > baseline["p50_ms"] * limit
+        and measurement.p50_ms - baseline["p50_ms"] > LATENCY_SLACK_MS
+    ):
+        problems.append(
+            f"median latency {measurement.p50_ms:.2f}ms "
+            f"(baseline {baseline['p50_ms']:.2f}ms)"
+        )
+    if (
+        measurement.peak_kib > baseline["peak_kib"] * limit
+        and measurement.peak_kib - baseline["peak_kib"] > MEMORY_SLACK_KIB
+    ):
+        problems.append(
+            f"peak memory {measurement.peak_kib:.0f}KiB "
+            f"(baseline {baseline['peak_kib']:.0f}KiB)"
+        )
+    if (
+        measurement.mb_per_s is not None
+        and baseline.get("mb_per_s")
+        and measurement.mb_per_s * limit < baseline["mb_per_s"]
+    ):
+        problems.append(
+            f"throughput {measurement.mb_per_s:.1f}MB/s "
+            f"(baseline {baseline['mb_per_s']:.1f}MB/s)"
+        )
+    return problems
+
+
+def load_baseline(path: Path) -> Dict[str, Dict[str, Any]]:
+    """the stored baseline measurements, by name"""
+    try:
+        with open(path, "rt", encoding="utf-8") as baselinefh:
+            return json.load(baselinefh)
+    except FileNotFoundError:
+        return {}
+
+
+def save_baseline(path: Path, measurements: List[Measurement]):
+    """store the given measurements in the baseline, replacing earlier ones"""
+    baseline = load_baseline(path)
+    for measurement in measurements:
+        values = measurement.model_dump(
+            exclude={"name", "iterations"}, exclude_none=True
+        )
+        baseline[measurement.name] = {key: round(v, 3) for key, v in values.items()}
+    with open(path, "wt", encoding="utf-8") as baselinefh:
+        json.dump(dict(sorted(baseline.items())), baselinefh, indent=2)
+        baselinefh.write("\n")
+
+
+def report(measurements: List[Measurement]) -> List[str]:
+    """the measurements as the lines of a table"""
+    lines = [
+        f"{'benchmark':<40} {'p50 ms':>9} {'p95 ms':>9} {'ops/s':>9} "
+        f"{'MB/s':>8} {'peak KiB':>10}"
+    ]
+    for item in measurements:
+        mb_per_s = f"{item.mb_per_s:8.1f}" if item.mb_per_s is not None else " " * 8
+        lines.append(
+            f"{item.name:<40} {item.p50_ms:9.2f} {item.p95_ms:9.2f} "
+            f"{item.ops_per_s:9.1f} {mb_per_s} {item.peak_kib:10.0f}"
+        )
+    return lines
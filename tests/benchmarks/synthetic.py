@@ -0,0 +1,158 @@
+"""synthetic job trees and uploads for the benchmarks"""
+
+import datetime
+import io
+import json
+from pathlib import Path
+from typing import List, Optional
+
+from switchbox.compose import PROJECT_LABEL, SERVICE_LABEL
+from switchbox.models.job import JOB_ID_LABEL, JobStatus, StageStatus
+
+from .fakes import PROJECT_CONFIG, FakeDockerAPI
+
+LOG_LINE = "2024-06-01 12:00:00,000 INFO etl.transform: loaded {} rows into {}\n"
+# one in this many jobs of a tree is still running
+RUNNING_EVERY = 100
+
+
+def log_block(size: int = 64 * 1024) -> bytes:
+    """about size bytes of whole etl log lines"""
+    lines = []
+    total = 0
+    while total < size:
+        line = LOG_LINE.format(total, "observation").encode("utf-8")
+        lines.append(line)
+        total += len(line)
+    return b"".join(lines)
+
+
+def make_job_tree(
+    base: Path, count: int, log_bytes: int, api: Optional[FakeDockerAPI] = None
+) -> List[str]:
+    """
+    write count job directories straight to disk (the catalog is built from
+    them when the api first needs it); every job has a log of log_bytes, and
+    one in RUNNING_EVERY has an etl container running in the fake docker
+    """
+    block = log_block(min(log_bytes, 1024 * 1024) or 1)
+    started = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+    job_ids = []
+    for index in range(count):
+        job_id = str(1_700_000_000 + index)
+        host_path = base / job_id
+        (host_path / "data").mkdir(parents=True)
+        (host_path / "log").mkdir()
+        with open(host_path / "log" / "etl.log", "wb") as logfh:
+            for _ in range(log_bytes // len(block)):
+                logfh.write(block)
+            logfh.write(block[: log_bytes % len(block)])
+        (host_path / "config.json").write_text(
+            json.dumps(
+                {"cdm_source_name": f"source {index % 7}", "input_delimiter": ","}
+            ),
+            encoding="utf-8",
+        )
+        status = JobStatus(
+            status="exited",
+            container_id=f"{index:012x}",
+            exit_code=0,
+            start_dt=started + datetime.timedelta(minutes=index),
+            exit_dt=started + datetime.timedelta(minutes=index + 30),
+            aresindexer=StageStatus(status="exited", exit_code=0),
+        )
+        if api is not None and index % RUNNING_EVERY == 0:
+            container = api.add(
+                PROJECT_CONFIG["services"]["etl"]["image"],
+                {
+                    PROJECT_LABEL: "switchbox",
+                    SERVICE_LABEL: "etl",
+                    JOB_ID_LABEL: job_id,
+                },
+                started=True,
+            )
+            status.status = "running"
+            status.container_id = container.id
+            status.aresindexer = StageStatus()
+        (host_path / "status.json").write_text(
+            status.model_dump_json(), encoding="utf-8"
+        )
+        job_ids.append(job_id)
+    return job_ids
+
+
+def csv_rows(columns: List[str], size: int = 64 * 1024) -> bytes:
+    """about size bytes of whole csv rows with the given columns"""
+    rows = []
+    total = 0
+    while total < size:
+        row = ",".join(
+            str(len(rows)) if i == 0 else f"value{len(rows) % 97}"
+            for i in range(len(columns))
+        )
+        rows.append(row.encode("utf-8") + b"\n")
+        total += len(rows[-1])
+    return b"".join(rows)
+
+
+class MultipartUpload(io.RawIOBase):
+    """
+    a multipart/form-data request body with one csv file of (at least) size
+    bytes, generated as it is read so that multi-gigabyte uploads don't need
+    the memory or disk
+    """
+
+    boundary = "benchmarkboundary"
+
+    def __init__(self, param_name: str, columns: List[str], size: int) -> None:
+        super().__init__()
+        block = csv_rows(columns)
+        self.blocks = max(size // len(block), 1)
+        self.head = (
+            f"--{self.boundary}\r\n"
+            'Content-Disposition: form-data; name="cdm_source_name"\r\n\r\n'
+            "benchmark\r\n"
+            f"--{self.boundary}\r\n"
+            f'Content-Disposition: form-data; name="{param_name}"; '
+            f'filename="{param_name}.csv"\r\n'
+            "Content-Type: text/csv\r\n\r\n" + ",".join(columns) + "\n"
+        ).encode("utf-8")
+        self.block = block
+        self.tail = f"\r\n--{self.boundary}--\r\n".encode("utf-8")
+        self.length = len(self.head) + self.blocks * len(block) + len(self.tail)
+        self.position = 0
+
+    @property
+    def content_type(self) -> str:
+        """the content type of the request"""
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def remainder(self) -> memoryview:
+        """the rest of the part of the body the position is in"""
+        position = self.position
+        if position < len(self.head):
+            return memoryview(self.head)[position:]
+        position -= len(self.head)
+        if position < self.blocks * len(self.block):
+            return memoryview(self.block)[position % len(self.block) :]
+        return memoryview(self.tail)[position - self.blocks * len(self.block) :]
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        origin = {io.SEEK_SET: 0, io.SEEK_CUR: self.position, io.SEEK_END: self.length}
+        self.position = min(max(origin[whence] + offset, 0), self.length)
+        return self.position
+
+    def readinto(self, buffer) -> int:
+        chunk = self.remainder()[: len(buffer)]
+        buffer[: len(chunk)] = chunk
+        self.position += len(chunk)
+        return len(chunk)
@@ -0,0 +1,111 @@
+"""latency, throughput & peak memory of the api endpoints"""
+
+import pytest
+
+from switchbox.utils.data import get_param_spec
+
+from .conftest import JOB_COUNTS, LOG_BYTES, UPLOAD_BYTES, make_client
+from .harness import measure
+from .synthetic import RUNNING_EVERY, MultipartUpload
+
+
+def iterations(count: int) -> int:
+    """fewer iterations for the larger trees"""
+    return 20 if count <= 1000 else 5
+
+
+@pytest.mark.parametrize("count", JOB_COUNTS)
+def test_list_jobs(bench, job_tree, count):
+    """the first page of the job list, newest first"""
+    base, _ = job_tree(count)
+    client = make_client(base)
+
+    def operation():
+        response = client.get("/api/job/?limit=100&order=desc")
+        assert response.status_code == 200
+
+    bench.check(measure(f"list_jobs[{count}]", operation, iterations(count)))
+
+
+@pytest.mark.parametrize("count", JOB_COUNTS)
+def test_get_job(bench, job_tree, count):
+    """the detail of a finished job, and of a running one (asking docker)"""
+    base, job_ids = job_tree(count)
+    client = make_client(base)
+    finished, running = job_ids[-1], job_ids[0]
+    assert int(running) % RUNNING_EVERY == 0
+
+    def operation():
+        for job_id in (finished, running):
+            response = client.get(f"/api/job/{job_id}")
+            assert response.status_code == 200
+
+    bench.check(measure(f"get_job[{count}]", operation, iterations(count)))
+
+
+@pytest.mark.parametrize("count", JOB_COUNTS)
+def test_get_log(bench, job_tree, count):
+    """the tail of a job's log, and the whole of it"""
+    base, job_ids = job_tree(count)
+    client = make_client(base)
+
+    def tail():
+        response = client.get(f"/api/job/{job_ids[-1]}/log?tail=1000")
+        assert response.status_code == 200
+
+    def whole():
+        response = client.get(f"/api/job/{job_ids[-1]}/log")
+        assert len(response.get_data()) == LOG_BYTES
+
+    bench.check(measure(f"get_log_tail[{count}]", tail, iterations(count)))
+    bench.check(
+        measure(f"get_log[{count}]", whole, iterations(count), bytes_per_op=LOG_BYTES)
+    )
+
+
+def test_create_job_upload(bench, tmp_path):
+    """a job created with one large csv upload"""
+    columns = get_param_spec().csv_columns["patient"]
+    client = make_client(tmp_path)
+    client.application.config["PREFLIGHT"] = False
+
+    def operation():
+        upload = MultipartUpload("patient", columns, UPLOAD_BYTES)
+        response = client.post(
+            "/api/job/",
+            input_stream=upload,
+            content_type=upload.content_type,
+            content_length=upload.length,
+        )
+        assert response.status_code == 202, response.get_json()
+
+    bench.check(
+        measure(
+            "create_job_upload",
+            operation,
+            iterations=3,
+            warmup=1,
+            bytes_per_op=UPLOAD_BYTES,
+        )
+    )
+
+
+@pytest.mark.parametrize("count", JOB_COUNTS)
+def test_search_log(bench, job_tree, count):
+    """searches of a job's log, once its index is up to date"""
+    base, job_ids = job_tree(count)
+    client = make_client(base)
+    url = f"/api/job/{job_ids[-1]}/log/search"
+    # the first search builds the index
+    assert client.get(url).status_code == 200
+
+    def text():
+        response = client.get(f"{url}?q=observation&limit=100")
+        assert len(response.get_json()["matches"]) == 100
+
+    def rare():
+        response = client.get(f"{url}?q=loaded%20[0-9]*7%20rows&regex=1&level=error")
+        assert response.get_json()["matches"] == []
+
+    bench.check(measure(f"search_log[{count}]", text, iterations(count)))
+    bench.check(measure(f"search_log_level[{count}]", rare, iterations(count)))
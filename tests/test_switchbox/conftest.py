@@ -0,0 +1,22 @@
+"""shared fixtures"""
+
+import pytest
+
+from switchbox.config import Config
+from switchbox.flaskapp import create_app
+
+
+@pytest.fixture(name="app")
+def fixture_app(tmp_path):
+    """a flask app whose job directory is a temporary directory"""
+    config = Config(cli_args=[])
+    config.job_dir = tmp_path
+    app = create_app(config)
+    app.config["TESTING"] = True
+    return app
+
+
+@pytest.fixture(name="client")
+def fixture_client(app):
+    """a test client for the app"""
+    return app.test_client()
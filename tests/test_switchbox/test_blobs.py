@@ -0,0 +1,62 @@
+"""tests for the deduplicated storage of input files"""
+
+import hashlib
+
+from switchbox.models.job import InputFile, JobDir
+from switchbox.utils.blobs import BlobStore, job_usage
+
+CONTENT = b"patient_id;date_visit\n1;01-01-2020\n"
+SHA256 = hashlib.sha256(CONTENT).hexdigest()
+
+
+def job_with_input(base, job_id):
+    """a job with one uploaded (and stored) input file"""
+    job_dir = JobDir.open(base, job_id)
+    path = job_dir.data_subdir / "patient.csv"
+    path.write_bytes(CONTENT)
+    job_dir.set_inputs(
+        [
+            InputFile(
+                param_name="patient",
+                path=str(path),
+                filename="patient.csv",
+                sha256=SHA256,
+                size=len(CONTENT),
+                rows=1,
+            )
+        ]
+    )
+    return job_dir, BlobStore.for_job_dir(base).adopt(path, SHA256)
+
+
+def test_identical_uploads_are_stored_once(tmp_path):
+    """the second upload becomes a link to the first one's blob"""
+    first, stored = job_with_input(tmp_path, "1")
+    second, deduplicated = job_with_input(tmp_path, "2")
+
+    assert (stored, deduplicated) == ("stored", "deduplicated")
+    store = BlobStore.for_job_dir(tmp_path)
+    inodes = {
+        (first.data_subdir / "patient.csv").stat().st_ino,
+        (second.data_subdir / "patient.csv").stat().st_ino,
+        store.blob_path(SHA256).stat().st_ino,
+    }
+    assert len(inodes) == 1
+    usage = store.usage()
+    assert (usage.blobs, usage.references) == (1, 2)
+    assert usage.saved_bytes == len(CONTENT)
+    assert job_usage(first.host_path).shared_bytes == len(CONTENT)
+
+
+def test_blobs_are_collected_with_their_last_job(tmp_path):
+    """a blob outlives the removal of all but the last job which uses it"""
+    first, _ = job_with_input(tmp_path, "1")
+    second, _ = job_with_input(tmp_path, "2")
+    blob = BlobStore.for_job_dir(tmp_path).blob_path(SHA256)
+
+    first.remove()
+    assert blob.exists()
+    assert job_usage(second.host_path).exclusive_bytes >= len(CONTENT)
+
+    second.remove()
+    assert not blob.exists()
@@ -0,0 +1,119 @@
+"""tests for the concurrent, dependency-ordered bootstrap"""
+
+import threading
+
+from docker.errors import ImageNotFound
+
+from switchbox.bootstrap import Bootstrap, dependency_graph, format_report
+
+CONFIG = {
+    "services": {
+        "api": {
+            "image": "api:latest",
+            "depends_on": {"traefik": {"condition": "service_healthy"}},
+        },
+        "traefik": {"image": "traefik:v2.11", "healthcheck": {"test": ["CMD"]}},
+        "cdmdb": {"image": "db:latest"},
+        "etl": {"image": "etl:latest"},
+    }
+}
+
+
+class FakeAPI:
+    """a docker api whose containers start on demand; traefik takes a while"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.events = []
+        self.polls = {"traefik": 0}
+
+    def inspect_image(self, image):
+        """raises for images which aren't present"""
+        if image == "db:latest":
+            raise ImageNotFound(image)
+
+    def containers(self, filters, **_kwargs):
+        """every service has a container, plus one orphan"""
+        labels = dict(label.split("=", 1) for label in filters["label"])
+        service = labels.get("com.docker.compose.service")
+        if service is None:
+            return [
+                {"Id": "old", "Labels": {"com.docker.compose.service": "gone"}},
+            ]
+        return [{"Id": service}]
+
+    def inspect_container(self, container_id):
+        """the state of a container"""
+        with self.lock:
+            started = ("start", container_id) in self.events
+            state = {"Status": "running" if started else "created"}
+            if container_id == "traefik" and started:
+                self.polls["traefik"] += 1
+                healthy = self.polls["traefik"] > 2
+                state["Health"] = {"Status": "healthy" if healthy else "starting"}
+                if healthy and ("healthy", "traefik") not in self.events:
+                    self.events.append(("healthy", "traefik"))
+            return {"State": state}
+
+    def start(self, container_id):
+        """record a start"""
+        with self.lock:
+            self.events.append(("start", container_id))
+
+    def remove_container(self, container_id, force=False):
+        """record a removal"""
+        with self.lock:
+            self.events.append(("remove", container_id, force))
+
+
+class FakeCompose:
+    """records pulls and creations"""
+
+    project_name = "switchbox"
+
+    def __init__(self):
+        self.docker = type("Client", (), {"api": FakeAPI()})()
+        self.pulled = []
+        self.created = []
+
+    def config(self, resolve_image_digests=True):
+        """the compose config"""
+        assert not resolve_image_digests
+        return type("Config", (), {"model_dump": lambda self: CONFIG})()
+
+    def pull(self, service):
+        """record a pull"""
+        self.pulled.append(service)
+
+    def create(self, service):
+        """record a creation"""
+        self.created.append(service)
+
+
+def test_dependency_graph_includes_dependencies():
+    """dependencies are brought up with the requested services"""
+    graph = dependency_graph(CONFIG, ["api", "cdmdb"])
+
+    assert graph == {
+        "cdmdb": {},
+        "api": {"traefik": "service_healthy"},
+        "traefik": {},
+    }
+
+
+def test_bootstrap_waits_for_health_before_dependents():
+    """a dependent is only started once its dependency is healthy"""
+    compose = FakeCompose()
+    bootstrap = Bootstrap(compose, ["api", "cdmdb"], timeout=5)
+    bootstrap.poll_interval = 0.01
+
+    timings = {t.service: t for t in bootstrap.run()}
+
+    events = compose.docker.api.events
+    assert events.index(("healthy", "traefik")) < events.index(("start", "api"))
+    assert ("remove", "old", True) in events
+    assert compose.pulled == ["cdmdb"]
+    assert sorted(compose.created) == ["api", "cdmdb", "traefik"]
+    assert not any(t.error for t in timings.values())
+    assert timings["api"].ready_at >= timings["traefik"].ready_at
+    assert format_report(list(timings.values()))[0].split()[0] == "service"
@@ -0,0 +1,53 @@
+"""tests for the sqlite job catalog"""
+
+import json
+
+from switchbox.models import job as job_model
+from switchbox.models.job import JobDir, JobStatus, get_catalog, list_jobs
+
+
+def test_catalog_rebuilt_from_existing_dirs(tmp_path):
+    """job directories created before the catalog existed are picked up"""
+    for job_id, name in (("100", "alpha"), ("200", "beta")):
+        (tmp_path / job_id).mkdir()
+        (tmp_path / job_id / "config.json").write_text(
+            json.dumps({"cdm_source_name": name}), encoding="utf-8"
+        )
+        (tmp_path / job_id / "status.json").write_text(
+            JobStatus(status="exited", exit_code=0).model_dump_json(),
+            encoding="utf-8",
+        )
+
+    jobs = list_jobs(tmp_path)
+
+    assert [j.job_id for j in jobs] == ["100", "200"]
+    assert [j.source_name for j in jobs] == ["alpha", "beta"]
+    assert all(j.status == "exited" for j in jobs)
+
+
+def test_catalog_follows_job_dir_writes(tmp_path):
+    """set_config and set_status keep the catalog current"""
+    job_dir = JobDir.open(tmp_path, "300")
+    job_dir.set_config({"cdm_source_name": "gamma", "source_release_date": "2024"})
+    job_dir.set_status(JobStatus(status="exited", exit_code=1))
+
+    # a fresh catalog object reads the same database the writes went to
+    job_model._catalogs.clear()  # pylint: disable=protected-access
+    rows = get_catalog(tmp_path).list_jobs()
+
+    assert len(rows) == 1
+    assert rows[0]["source_name"] == "gamma"
+    assert rows[0]["source_date"] == "2024"
+    assert rows[0]["status"] == "exited"
+
+
+def test_new_jobs_get_distinct_ids(tmp_path):
+    """jobs created within the same second don't share a directory"""
+    first = job_model.Job.open(base_path=tmp_path)
+    second = job_model.Job.open(base_path=tmp_path)
+
+    assert first.job_id != second.job_id
+    assert {row["job_id"] for row in get_catalog(tmp_path).list_jobs()} == {
+        first.job_id,
+        second.job_id,
+    }
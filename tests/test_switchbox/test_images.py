@@ -0,0 +1,80 @@
+"""tests for image pre-pulling and digest pinning"""
+
+from docker.errors import APIError
+
+from switchbox.images import ImageWarmer, image_pins
+from switchbox.launcher import ServiceLauncher
+
+CONFIG = {
+    "services": {
+        "etl": {"image": "ghcr.io/msda-switchbox/msda_etl:latest"},
+        "aresindexer": {"image": "edence/ohdsi-aresindexer:12-Nov-2024"},
+    }
+}
+
+
+class FakeAPI:
+    """pulls succeed except for the aresindexer's"""
+
+    def __init__(self):
+        self.pulls = []
+
+    def pull(self, repository, tag):
+        """record a pull"""
+        if "aresindexer" in repository:
+            raise APIError("registry unavailable")
+        self.pulls.append((repository, tag))
+
+    def inspect_image(self, image):
+        """the inspection of the pulled etl image"""
+        repository = image.rsplit(":", 1)[0]
+        return {
+            "Id": "sha256:etl",
+            "Created": "2024-11-12T10:00:00.123456789Z",
+            "RepoDigests": ["other@sha256:00", f"{repository}@sha256:abc"],
+        }
+
+
+class FakeCompose:
+    """a compose project with the given config"""
+
+    project_name = "switchbox"
+    default_env = {}
+
+    def __init__(self, project_dir):
+        self.project_dir = project_dir
+        self.docker = type("Client", (), {"api": FakeAPI()})()
+
+    def config(self, resolve_image_digests=True):
+        """the compose config"""
+        assert not resolve_image_digests
+        return type("Config", (), {"model_dump": lambda self: CONFIG})()
+
+
+def test_warm_pulls_and_pins(tmp_path):
+    """pulled images are pinned by digest, failed pulls are reported"""
+    compose = FakeCompose(tmp_path / "project")
+    states = ImageWarmer(tmp_path, compose).warm()
+
+    assert compose.docker.api.pulls == [("ghcr.io/msda-switchbox/msda_etl", "latest")]
+    assert states[0].status == "present"
+    assert states[1].status == "failed"
+    assert "registry unavailable" in states[1].error
+
+    pins = image_pins(tmp_path)
+    assert pins == {"etl": "ghcr.io/msda-switchbox/msda_etl@sha256:abc"}
+    spec = ServiceLauncher(compose, images=pins).service_spec("etl")
+    assert spec.image == "ghcr.io/msda-switchbox/msda_etl@sha256:abc"
+
+
+def test_images_endpoint_reports_state(tmp_path, client):
+    """the endpoint lists every warmed service, known or not"""
+    ImageWarmer(tmp_path, FakeCompose(tmp_path / "project"), services=("etl",)).warm()
+
+    images = client.get("/api/images/").json["images"]
+
+    assert [i["service"] for i in images] == ["etl", "aresindexer"]
+    assert images[0]["status"] == "present"
+    assert images[0]["age"] > 0
+    assert images[1]["status"] == "unknown"
+    assert images[1]["since_pull"] is None
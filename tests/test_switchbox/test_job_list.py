@@ -0,0 +1,72 @@
+"""tests for the job list endpoint"""
+
+import datetime
+from pathlib import Path
+
+from switchbox.models.job import JobDir, JobStatus
+
+
+def make_jobs(base, count):
+    """create jobs which started on consecutive days"""
+    for i in range(count):
+        job_dir = JobDir.open(base, str(1000 + i))
+        job_dir.set_config({"cdm_source_name": "even" if i % 2 == 0 else "odd"})
+        job_dir.set_status(
+            JobStatus(
+                status="exited",
+                start_dt=datetime.datetime(2024, 1, 1 + i, tzinfo=datetime.UTC),
+            )
+        )
+
+
+def test_pagination_walks_all_jobs(app, client):
+    """following next_cursor visits every job once, in start order"""
+    make_jobs(app.config["JOB_DIR"], 5)
+
+    seen = []
+    url = "/api/job/?limit=2&fields=job_id"
+    while url:
+        body = client.get(url).get_json()
+        seen.extend(item["job_id"] for item in body["jobs"])
+        assert all(set(item) == {"job_id"} for item in body["jobs"])
+        url = (
+            f"/api/job/?limit=2&fields=job_id&cursor={body['next_cursor']}"
+            if body["next_cursor"]
+            else None
+        )
+
+    assert seen == ["1000", "1001", "1002", "1003", "1004"]
+
+
+def test_filters(app, client):
+    """source name and start time filters narrow the list"""
+    make_jobs(app.config["JOB_DIR"], 5)
+
+    body = client.get(
+        "/api/job/?source_name=even&since=2024-01-02T00:00:00%2B00:00&order=desc"
+    ).get_json()
+
+    assert [item["job_id"] for item in body["jobs"]] == ["1004", "1002"]
+
+
+def test_conditional_get(app, client):
+    """an unchanged job list is answered with a 304"""
+    make_jobs(app.config["JOB_DIR"], 1)
+    etag = client.get("/api/job/").headers["ETag"]
+
+    assert client.get("/api/job/", headers={"If-None-Match": etag}).status_code == 304
+
+    JobDir.open(app.config["JOB_DIR"], "1000").set_status(JobStatus(status="dead"))
+    assert client.get("/api/job/", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_unknown_field(client):
+    """projection onto an unknown field is a client error"""
+    assert client.get("/api/job/?fields=nope").status_code == 400
+
+
+def test_unknown_job_is_not_created(app, client):
+    """reading an unknown job is a 404, and doesn't add it to the job list"""
+    assert client.get("/api/job/404").status_code == 404
+    assert not (Path(app.config["JOB_DIR"]) / "404").exists()
+    assert client.get("/api/job/").get_json()["jobs"] == []
@@ -0,0 +1,35 @@
+"""tests for the native service launcher"""
+
+from switchbox.launcher import build_spec
+
+CONFIG = {
+    "name": "switchbox",
+    "services": {
+        "etl": {
+            "image": "ghcr.io/msda-switchbox/msda_etl:latest",
+            "depends_on": {"cdmdb": {"condition": "service_healthy"}},
+            "environment": {"LOG_DIR": "/output/etl_logs", "EMPTY": None},
+            "networks": {"internal": None},
+            "volumes": [
+                {"type": "volume", "source": "data", "target": "/data"},
+                {"type": "bind", "source": "/vocab", "target": "/vocab"},
+            ],
+            "deploy": {"resources": {"limits": {"cpus": 3, "memory": "4294967296"}}},
+        }
+    },
+    "networks": {"internal": {"name": "switchbox_internal", "internal": True}},
+    "volumes": {"data": {"name": "switchbox_data"}},
+}
+
+
+def test_build_spec_resolves_project_resources():
+    """volumes, networks and limits are translated to docker api terms"""
+    spec = build_spec(CONFIG, "switchbox", "etl")
+
+    assert spec.networks == ["switchbox_internal"]
+    assert spec.mounts[0]["source"] == "switchbox_data"
+    assert spec.mounts[1]["type"] == "bind"
+    assert spec.environment == {"LOG_DIR": "/output/etl_logs"}
+    assert spec.nano_cpus == 3_000_000_000
+    assert spec.mem_limit == 4294967296
+    assert spec.depends_on == {"cdmdb": "service_healthy"}
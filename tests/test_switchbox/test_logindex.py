@@ -0,0 +1,113 @@
+"""tests for the log search index"""
+
+import re
+
+from switchbox.models.job import JobDir
+from switchbox.utils.compression import compress_dir
+from switchbox.utils.logindex import LogIndex, level_code
+from switchbox.utils.logs import LogReader
+
+ETL_LOG = (
+    "2024-06-01 12:00:00,000 INFO etl: loading person\n"
+    "2024-06-01 12:00:01,500 WARNING etl: 3 rows without a birth date\n"
+    "2024-06-01 12:00:02,000 ERROR etl: loading visit failed\n"
+    "Traceback (most recent call last):\n"
+    '  File "etl.py", line 1, in <module>\n'
+    "KeyError: 'visit_id'\n"
+    "2024-06-01 12:05:00,000 INFO etl: loading observation\n"
+)
+
+
+def test_index_levels_and_times(tmp_path):
+    """lines continuing a logged line (e.g. a traceback) inherit its level"""
+    (tmp_path / "etl.log").write_text(ETL_LOG)
+    index = LogIndex(LogReader(tmp_path)).update()
+
+    assert len(index) == 7
+    assert [index.levels[line] for line in range(7)] == [
+        level_code(name) for name in ("info", "warning") + ("error",) * 4 + ("info",)
+    ]
+    match = index.match(1)
+    assert match.level == "WARNING"
+    assert match.time.isoformat() == "2024-06-01T12:00:01.500000+00:00"
+
+
+def test_index_is_extended_incrementally(tmp_path):
+    """appended lines are indexed without reindexing the earlier ones"""
+    log_file = tmp_path / "etl.log"
+    log_file.write_text(ETL_LOG[:100])
+    index = LogIndex(LogReader(tmp_path)).update()
+    # the unterminated last line is searchable, though not yet indexed
+    assert len(index) == 2 and index.state.lines == 1
+
+    with open(log_file, "at", encoding="utf-8") as logfh:
+        logfh.write(ETL_LOG[100:])
+    reads = []
+    read = index.reader.read
+    index.reader.read = lambda offset, *args: reads.append(offset) or read(
+        offset, *args
+    )
+    index.update()
+    # reading resumed at the line which was unterminated
+    assert reads == [49]
+    assert index.state.lines == 7
+    assert [index.offsets[line] for line in range(3)] == [0, 49, 114]
+    assert index.search(re.compile(b"visit")).matches[0].line == 2
+
+
+def test_index_rebuilt_when_log_replaced(tmp_path):
+    """a log which no longer begins as indexed is indexed afresh"""
+    log_file = tmp_path / "etl.log"
+    log_file.write_text(ETL_LOG)
+    LogIndex(LogReader(tmp_path)).update()
+    log_file.write_text("2024-06-02 08:00:00,000 ERROR etl: no input\n")
+
+    index = LogIndex(LogReader(tmp_path)).update()
+    assert len(index) == 1
+    assert (
+        index.search(levels=[level_code("error")]).matches[0].text.endswith("no input")
+    )
+
+
+def test_index_survives_compression(tmp_path):
+    """compressing a log file doesn't change the stream the index covers"""
+    (tmp_path / "etl.log").write_text(ETL_LOG)
+    LogIndex(LogReader(tmp_path)).update()
+    compress_dir(tmp_path, "gzip")
+
+    index = LogIndex(LogReader(tmp_path)).update()
+    assert index.state.lines == 7
+    assert index.search(re.compile(b"observation")).matches[0].line == 6
+
+
+def test_search_endpoint(app, client):
+    """searches filter by text, level & time, with context and paging"""
+    job_dir = JobDir.open(app.config["JOB_DIR"], "1")
+    (job_dir.log_subdir / "etl.log").write_text(ETL_LOG)
+
+    result = client.get("/api/job/1/log/search?q=LOADING&ignore_case=1").get_json()
+    assert [match["line"] for match in result["matches"]] == [0, 2, 6]
+    assert result["lines"] == 7 and result["next_line"] is None
+
+    result = client.get(
+        "/api/job/1/log/search?q=visit&level=error&context=1&limit=1"
+    ).get_json()
+    (match,) = result["matches"]
+    assert match["line"] == 2 and match["level"] == "ERROR"
+    assert match["before"] == [ETL_LOG.split("\n")[1]]
+    assert match["after"] == ["Traceback (most recent call last):"]
+    assert result["next_line"] == 5
+
+    result = client.get(
+        "/api/job/1/log/search?q=loading%20(person|observation)&regex=1"
+        "&since=2024-06-01T12:01:00"
+    ).get_json()
+    assert [match["line"] for match in result["matches"]] == [6]
+
+
+def test_search_endpoint_errors(client):
+    """malformed searches are a 400, unknown jobs a 404"""
+    assert client.get("/api/job/404/log/search").status_code == 404
+    JobDir.open(client.application.config["JOB_DIR"], "1")
+    assert client.get("/api/job/1/log/search?q=(&regex=1").status_code == 400
+    assert client.get("/api/job/1/log/search?level=loud").status_code == 400
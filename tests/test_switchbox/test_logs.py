@@ -0,0 +1,51 @@
+"""tests for log access"""
+
+from switchbox.models.job import JobDir, JobStatus
+from switchbox.utils.logs import LogReader
+
+
+def write_logs(log_dir):
+    """two log files which together hold lines 0-9"""
+    (log_dir / "a.log").write_text("".join(f"line {i}\n" for i in range(5)))
+    (log_dir / "b.log").write_text("".join(f"line {i}\n" for i in range(5, 10)))
+
+
+def test_reader_spans_files(tmp_path):
+    """offsets, tails and line numbers address the concatenated files"""
+    write_logs(tmp_path)
+    reader = LogReader(tmp_path)
+
+    assert reader.read_bytes(reader.tail_offset(3)) == b"line 7\nline 8\nline 9\n"
+    assert reader.read_bytes(reader.line_offset(4), 14) == b"line 4\nline 5\n"
+    assert reader.read_bytes(0, 7) == b"line 0\n"
+
+
+def test_log_endpoint_ranges(app, client):
+    """the log endpoint serves tails and byte ranges"""
+    job_dir = JobDir.open(app.config["JOB_DIR"], "1")
+    write_logs(job_dir.log_subdir)
+
+    response = client.get("/api/job/1/log?tail=2")
+    assert response.data == b"line 8\nline 9\n"
+
+    response = client.get("/api/job/1/log?offset=7&length=7")
+    assert response.data == b"line 1\n"
+    assert response.headers["X-Log-Size"] == "70"
+
+
+def test_log_endpoint_follow_finishes_with_job(app, client):
+    """following the log of a finished job sends the rest and ends"""
+    job_dir = JobDir.open(app.config["JOB_DIR"], "2")
+    job_dir.set_status(JobStatus(status="exited"))
+    write_logs(job_dir.log_subdir)
+
+    response = client.get("/api/job/2/log?follow=1&tail=1")
+
+    assert response.mimetype == "text/event-stream"
+    assert b"data: line 9\n" in response.data
+    assert response.data.endswith(b"event: end\ndata:\n\n")
+
+
+def test_log_endpoint_unknown_job(client):
+    """unknown jobs are a 404 rather than a new empty job"""
+    assert client.get("/api/job/404/log").status_code == 404
@@ -0,0 +1,68 @@
+"""tests for the metrics endpoint and the metrics it serves"""
+
+import json
+import os
+
+from switchbox.metrics import (
+    METRICS_DIRNAME,
+    MetricsRegistry,
+    docker_endpoint,
+    merge,
+    render,
+)
+from switchbox.models.job import JobDir, JobStatus
+
+
+def test_histograms_render_cumulative_buckets():
+    """buckets are cumulative and include +Inf; snapshots of processes add up"""
+    registry = MetricsRegistry()
+    histogram = registry.histogram("test_seconds", "a test", ("kind",), (1, 10))
+    for value in (0.5, 1, 5, 50):
+        histogram.observe(value, "a")
+
+    text = render(merge(registry.snapshot(), registry.snapshot()))
+
+    assert "# TYPE test_seconds histogram" in text
+    assert 'test_seconds_bucket{kind="a",le="1"} 4' in text
+    assert 'test_seconds_bucket{kind="a",le="10"} 6' in text
+    assert 'test_seconds_bucket{kind="a",le="+Inf"} 8' in text
+    assert 'test_seconds_sum{kind="a"} 113' in text
+    assert 'test_seconds_count{kind="a"} 8' in text
+
+
+def test_docker_endpoints_have_no_ids():
+    """object ids and names are replaced so the endpoints can be labels"""
+    assert docker_endpoint("/v1.45/containers/0123abcd/json") == "containers/{id}/json"
+    assert docker_endpoint("/v1.45/containers/json?all=1") == "containers/json"
+    assert docker_endpoint("/v1.45/images/ghcr.io/a/etl:1/json") == "images/{id}/json"
+    assert docker_endpoint("/v1.45/containers/0123abcd") == "containers/{id}"
+    assert docker_endpoint("/v1.45/events") == "events"
+
+
+def test_metrics_endpoint(client, tmp_path):
+    """requests, job counts and the spooled metrics of other workers are served"""
+    JobDir.open(tmp_path, "1").set_status(JobStatus(status="queued"))
+    JobDir.open(tmp_path, "2").set_status(JobStatus(status="running"))
+    other = MetricsRegistry()
+    other.counter("switchbox_compose_failures_total", "", ("subcommand",)).inc("up")
+    (tmp_path / METRICS_DIRNAME).mkdir()
+    # the parent process stands in for another worker
+    with open(
+        tmp_path / METRICS_DIRNAME / f"{os.getppid()}.json", "wt", encoding="utf-8"
+    ) as spoolfh:
+        json.dump(other.snapshot(), spoolfh)
+    client.get("/api/healthz/")
+
+    response = client.get("/api/metrics/")
+
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain")
+    text = response.get_data(as_text=True)
+    assert (
+        'switchbox_http_request_duration_seconds_count{method="GET",'
+        'route="/api/healthz/",status="200"}'
+    ) in text
+    assert 'switchbox_compose_failures_total{subcommand="up"} 1' in text
+    assert 'switchbox_jobs{status="queued"} 1' in text
+    assert "switchbox_queue_depth 1" in text
+    assert 'switchbox_running_jobs{stage="etl"} 1' in text
@@ -0,0 +1,72 @@
+"""tests for the normalization of input files"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from switchbox.models.job import InputFile, JobDir
+from switchbox.scheduler import JobQueue
+from switchbox.utils.data import get_param_spec
+from switchbox.utils.normalize import normalize_file
+
+COLUMNS = ["patient_id", "date_visit", "sex"]
+
+
+def test_file_is_rewritten_canonically(tmp_path):
+    """a semicolon-delimited file with a bom becomes plain utf-8 csv, idempotently"""
+    path = tmp_path / "patient.csv"
+    path.write_bytes(
+        'patient_id;date_visit;sex\r\n1;2020-01-31;F\r\n2;;"M;é"\r\n'.encode(
+            "utf-8-sig"
+        )
+    )
+
+    result = normalize_file("patient", str(path), COLUMNS)
+
+    assert not result.error
+    assert result.delimiter == ";"
+    assert result.rows == 2
+    expected = "patient_id,date_visit,sex\n1,2020-01-31,F\n2,,M;é\n"
+    assert path.read_text(encoding="utf-8") == expected
+
+    again = normalize_file("patient", str(path), COLUMNS)
+    assert again.delimiter == ","
+    assert again.sha256 == result.sha256
+    assert path.read_text(encoding="utf-8") == expected
+
+
+def test_job_is_normalized_before_it_is_queued(tmp_path):
+    """the inputs and the job's input_delimiter are updated, then it is queued"""
+    job_dir = JobDir.open(tmp_path, "1")
+    path = job_dir.host_path / "patient.csv"
+    columns = get_param_spec().csv_columns["patient"]
+    path.write_text(
+        "|".join(columns) + "\n" + "|".join("1" for _ in columns) + "\n",
+        encoding="utf-8",
+    )
+    job_dir.set_config({"input_delimiter": "|"})
+    job_dir.set_inputs(
+        [
+            InputFile(
+                param_name="patient",
+                filename="p.csv",
+                path=str(path),
+                sha256="",
+                size=0,
+                rows=1,
+                delimiter="|",
+            )
+        ]
+    )
+    job_dir.set_status(
+        job_dir.get_status().model_copy(update={"status": "normalizing"})
+    )
+    queue = JobQueue(
+        tmp_path, max_running=0, executor=ThreadPoolExecutor(), normalize=True
+    )
+
+    queue.normalize_job("1")
+
+    assert job_dir.get_status().status == "queued"
+    assert job_dir.get_config()["input_delimiter"] == ","
+    (normalized,) = job_dir.get_inputs()
+    assert normalized.delimiter == ","
+    assert normalized.size == path.stat().st_size
@@ -0,0 +1,46 @@
+"""tests for the cached etl parameter spec"""
+
+import os
+
+from switchbox.utils.data import get_param_spec
+
+SPEC = """params:
+  cdm_source_name:
+    question: What is your data's source name?
+    param_type: str
+  patients:
+    question: patients source file
+    param_type: csv
+    columns: [patient_id, sex]
+"""
+
+
+def test_params_served_with_etag(client):
+    """the spec is served as json with an ETag, and 304 when it's unchanged"""
+    response = client.get("/api/params/")
+    assert response.status_code == 200
+    assert "cdm_source_name" in response.json["params"]
+    etag = response.headers["ETag"]
+
+    response = client.get("/api/params/", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+
+def test_override_spec_reloaded_on_change(app, client, tmp_path):
+    """an override spec file is used, and reloaded only once it changes"""
+    spec_file = tmp_path / "params.yml"
+    spec_file.write_text(SPEC, encoding="utf-8")
+    app.config["PARAMS_FILE"] = str(spec_file)
+
+    first = client.get("/api/params/")
+    assert list(first.json["params"]) == ["cdm_source_name", "patients"]
+    assert get_param_spec(spec_file) is get_param_spec(spec_file)
+    assert get_param_spec(spec_file).csv_columns == {"patients": ["patient_id", "sex"]}
+
+    spec_file.write_text(SPEC.replace("sex", "gender"), encoding="utf-8")
+    stat = spec_file.stat()
+    os.utime(spec_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+    second = client.get("/api/params/")
+    assert second.headers["ETag"] != first.headers["ETag"]
+    assert second.json["params"]["patients"]["columns"] == ["patient_id", "gender"]
@@ -0,0 +1,99 @@
+"""tests for the etl progress parsed from job logs"""
+
+from switchbox.models.job import InputFile, JobDir, JobStatus
+from switchbox.utils.logs import LogReader
+from switchbox.utils.progress import (
+    ProgressTracker,
+    estimate_remaining,
+    etl_progress,
+    table_history,
+)
+
+ETL_LOG = (
+    "2024-06-01 12:00:00,000 INFO etl: stage: transform\n"
+    "2024-06-01 12:00:00,000 INFO etl: loading table mri\n"
+    "2024-06-01 12:01:00,000 INFO etl: loaded 1,000 rows into mri\n"
+    "2024-06-01 12:01:00,000 INFO etl: loading table dmt\n"
+    "2024-06-01 12:01:30,000 INFO etl: processed 250 rows\n"
+)
+
+
+def test_progress_parsed_incrementally(tmp_path):
+    """each update parses only what was logged since the one before"""
+    log_dir = tmp_path / "log"
+    log_dir.mkdir()
+    log_file = log_dir / "etl.log"
+    log_file.write_text(ETL_LOG[:150])
+    tracker = ProgressTracker(LogReader(log_dir), tmp_path)
+
+    state = tracker.update()
+    assert (state.stage, state.table, state.tables_done) == ("transform", "mri", [])
+    # the unterminated line is left for the next update
+    assert state.size == ETL_LOG.index("2024", 101)
+
+    with open(log_file, "at", encoding="utf-8") as logfh:
+        logfh.write(ETL_LOG[150:])
+    reads = []
+    read = tracker.reader.read
+    tracker.reader.read = lambda offset, length: reads.append((offset, length)) or read(
+        offset, length
+    )
+    state = tracker.update()
+    resumed = ETL_LOG.index("2024", 101)
+    assert reads == [(resumed, len(ETL_LOG) - resumed)]
+    assert state.tables_done == ["mri", "dmt"]
+    assert state.table_rows == {"mri": 1000, "dmt": 250}
+    assert state.table_seconds == {"mri": 60.0, "dmt": 30.0}
+    # a further update with nothing new logged reads nothing
+    assert tracker.update() == state
+    assert reads[1:] == [(len(ETL_LOG), 0)]
+
+
+def test_progress_estimate(tmp_path):
+    """the remaining time is estimated from the table durations of earlier runs"""
+    log_dir = tmp_path / "log"
+    log_dir.mkdir()
+    (log_dir / "etl.log").write_text(ETL_LOG[:150])
+    state = ProgressTracker(LogReader(log_dir), tmp_path).update()
+    history = table_history(
+        [state.model_copy(update={"table_seconds": {"mri": 100.0, "dmt": 40.0}})]
+    )
+
+    started = state.table_started
+    progress = etl_progress(state, ["dmt", "mri", "visit"], {}, history, started)
+    assert progress.tables_remaining == ["dmt", "mri", "visit"]
+    # dmt & mri as before, visit the median of those
+    assert progress.eta_seconds == 40 + 100 + 70
+    # the estimate counts down while mri loads, even with nothing logged
+    later = etl_progress(state, ["dmt", "mri", "visit"], {}, history, started + 30)
+    assert later.eta_seconds == 40 + 70 + 70
+    # (but never past what mri took before)
+    assert estimate_remaining(state, ["mri"], history, started + 500) == 0
+    assert etl_progress(state, ["mri"], {}, {}).eta_seconds is None
+
+
+def test_job_detail_progress(app, client):
+    """the job detail has the progress over the tables the job uploaded"""
+    job_dir = JobDir.open(app.config["JOB_DIR"], "1")
+    job_dir.set_status(JobStatus(status="exited", exit_code=1))
+    job_dir.set_inputs(
+        [
+            InputFile(
+                param_name=name,
+                filename=f"{name}.csv",
+                path=str(job_dir.data_subdir / f"{name}.csv"),
+                sha256="",
+                size=1,
+                rows=2000,
+            )
+            for name in ("mri", "dmt", "patient")
+        ]
+    )
+    (job_dir.log_subdir / "etl.log").write_text(ETL_LOG)
+
+    progress = client.get("/api/job/1").get_json()["progress"]
+    assert progress["tables_done"] == ["dmt", "mri"]
+    assert progress["tables_remaining"] == ["patient"]
+    assert (progress["rows"], progress["rows_total"]) == (1250, 6000)
+    # (the job is over, so nothing remains to be estimated)
+    assert progress["eta_seconds"] is None
@@ -0,0 +1,74 @@
+"""tests for the etl result cache"""
+
+from switchbox.images import ImageState, save_image_states
+from switchbox.models.job import Job, StageStatus
+from switchbox.results import record_result
+from switchbox.scheduler import JobQueue
+
+DIGEST = "etl@sha256:" + "0" * 64
+
+
+def submitted_job(base, queue, force=False):
+    """submit a job with a fixed config"""
+    job = Job.open(base_path=base)
+    job.job_dir.set_config({"cdm_source_name": "site", "input_delimiter": ";"})
+    job.job_dir.set_inputs([])
+    return job, queue.submit(job, force=force)
+
+
+def test_identical_job_is_cached(tmp_path):
+    """a rerun of a successful job refers to it, unless it is forced"""
+    save_image_states(tmp_path, {"etl": ImageState(service="etl", digest=DIGEST)})
+    queue = JobQueue(tmp_path, max_running=0, result_cache=True)
+    first, status = submitted_job(tmp_path, queue)
+    assert status.status == "queued" and status.cache_key
+
+    # only runs whose etl and aresindexer both succeeded are recorded
+    finished = status.model_copy(
+        update={
+            "status": "exited",
+            "exit_code": 0,
+            "aresindexer": StageStatus(status="exited", exit_code=1),
+        }
+    )
+    record_result(tmp_path, first.job_id, finished)
+    assert submitted_job(tmp_path, queue)[1].status == "queued"
+    finished.aresindexer = StageStatus(status="exited", exit_code=0)
+    record_result(tmp_path, first.job_id, finished)
+
+    _, cached = submitted_job(tmp_path, queue)
+    assert cached.status == "cached"
+    assert cached.cached_from == first.job_id
+    assert submitted_job(tmp_path, queue, force=True)[1].status == "queued"
+
+    first.job_dir.remove()
+    assert submitted_job(tmp_path, queue)[1].status == "queued"
+
+
+def test_unpinned_image_is_not_cached(tmp_path):
+    """without the etl image's digest, results can't be matched"""
+    queue = JobQueue(tmp_path, max_running=0, result_cache=True)
+    _, status = submitted_job(tmp_path, queue)
+
+    assert status.status == "queued"
+    assert status.cache_key == ""
+
+
+def test_overwritten_results_are_not_cached(tmp_path, monkeypatch):
+    """once another etl is launched, the earlier results aren't reused"""
+    save_image_states(tmp_path, {"etl": ImageState(service="etl", digest=DIGEST)})
+    queue = JobQueue(tmp_path, max_running=0, result_cache=True)
+    first, status = submitted_job(tmp_path, queue)
+    stage = StageStatus(status="exited", exit_code=0)
+    record_result(
+        tmp_path,
+        first.job_id,
+        status.model_copy(update={"exit_code": 0, "aresindexer": stage}),
+    )
+    assert submitted_job(tmp_path, queue)[1].status == "cached"
+
+    monkeypatch.setattr(Job, "start", lambda job, **kwargs: None)
+    other = Job.open(base_path=tmp_path)
+    queue.launch(other.job_id)
+
+    assert submitted_job(tmp_path, queue)[1].status == "queued"
@@ -0,0 +1,161 @@
+"""tests for the retention of finished jobs"""
+
+import datetime
+from types import SimpleNamespace
+
+from switchbox.models.job import JobDir, JobStatus, StageStatus, get_catalog
+from switchbox.retention import COMPRESSED_MARKER, Retention, RetentionPolicy
+from switchbox.utils import logs
+from switchbox.utils.blobs import BlobStore
+from switchbox.utils.compression import open_compressed
+
+LOG = b"".join(b"line %d of the etl log\n" % i for i in range(1000))
+
+
+def finished_job(base, job_id, finished_at, status=None):
+    """a job whose etl exited (by default, failing so its aresindexer skipped)"""
+    job_dir = JobDir.open(base, job_id)
+    (job_dir.log_subdir / "etl.log").write_bytes(LOG)
+    (job_dir.data_subdir / "patient.csv").write_bytes(b"patient_id\n1\n")
+    job_dir.set_status(status or JobStatus(status="exited", exit_code=1))
+    get_catalog(base).connect().execute(
+        "UPDATE jobs SET finished_at = ? WHERE job_id = ?", (finished_at, job_id)
+    )
+    return job_dir
+
+
+def test_finished_jobs_are_compressed_and_still_readable(tmp_path):
+    """compressed logs read back the same, in full and in part"""
+    job_dir = finished_job(tmp_path, "1", finished_at=1)
+    retention = Retention(tmp_path, RetentionPolicy(compress_after=60))
+
+    report = retention.sweep()
+
+    assert report.compressed == ["1"]
+    assert report.freed_bytes > 0
+    assert (job_dir.host_path / COMPRESSED_MARKER).exists()
+    assert [p.name for p in job_dir.log_subdir.iterdir() if p.name[0] != "."] == [
+        "etl.log.gz"
+    ]
+    reader = job_dir.log_reader()
+    assert reader.size == len(LOG)
+    assert reader.read_bytes() == LOG
+    assert reader.read_bytes(reader.tail_offset(1)) == b"line 999 of the etl log\n"
+    assert not retention.sweep().compressed
+
+
+def test_compressed_log_tail_is_decompressed_once(tmp_path, monkeypatch):
+    """repeated reads of a compressed log's tail don't decompress it again"""
+    job_dir = finished_job(tmp_path, "1", finished_at=1)
+    Retention(tmp_path, RetentionPolicy(compress_after=60)).sweep()
+    opened = []
+    monkeypatch.setattr(
+        logs,
+        "open_compressed",
+        lambda path: opened.append(path) or open_compressed(path),
+    )
+
+    for _ in range(3):
+        reader = job_dir.log_reader()
+        offset = reader.tail_offset(2)
+        assert reader.read_bytes(offset) == LOG[LOG.rindex(b"line 998") :]
+    assert len(opened) == 1
+    # what lies before the cached tail is read from the file itself
+    monkeypatch.setattr(logs, "TAIL_CACHE_SIZE", 4096)
+    assert reader.read_bytes(0, 10) == LOG[:10]
+    assert len(opened) == 2
+
+
+def test_inputs_linked_to_blobs_stay_shared(tmp_path):
+    """input files in the blob store aren't given private compressed copies"""
+    job_dir = finished_job(tmp_path, "1", finished_at=1)
+    path = job_dir.data_subdir / "patient.csv"
+    store = BlobStore.for_job_dir(tmp_path)
+    assert store.adopt(path, "0" * 64) == "stored"
+
+    Retention(tmp_path, RetentionPolicy(compress_after=60)).sweep()
+
+    assert path.stat().st_nlink == 2
+    assert store.blob_path("0" * 64).exists()
+    assert (job_dir.log_subdir / "etl.log.gz").exists()
+
+
+def test_oldest_jobs_go_beyond_the_job_limit(tmp_path):
+    """only the newest max_jobs finished jobs are kept; running jobs are kept"""
+    for job_id, finished_at in (("a", 3), ("b", 1), ("c", 2)):
+        finished_job(tmp_path, job_id, finished_at)
+    JobDir.open(tmp_path, "d").set_status(JobStatus(status="running"))
+    policy = RetentionPolicy(compress_after=0, max_jobs=1)
+
+    report = Retention(tmp_path, policy).sweep()
+
+    assert report.removed == ["b", "c"]
+    assert sorted(p.name for p in tmp_path.iterdir() if p.name[0] != ".") == [
+        "a",
+        "d",
+    ]
+
+
+def test_removed_jobs_lose_their_containers(tmp_path, monkeypatch):
+    """the containers of a job removed by the policy are removed with it"""
+    job_dir = finished_job(
+        tmp_path,
+        "1",
+        finished_at=1,
+        status=JobStatus(
+            status="exited",
+            exit_code=0,
+            container_id="etl1",
+            aresindexer=StageStatus(status="exited", exit_code=0, container_id="ai1"),
+        ),
+    )
+    removed = []
+    api = SimpleNamespace(
+        inspect_container=lambda container_id: {"State": {"Running": False}},
+        remove_container=lambda container_id, force: removed.append(container_id),
+    )
+    monkeypatch.setattr(
+        "switchbox.models.job.shared_docker_client",
+        lambda: SimpleNamespace(api=api),
+    )
+
+    report = Retention(tmp_path, RetentionPolicy(compress_after=0, max_age=60)).sweep()
+    assert report.removed == ["1"]
+    assert removed == ["etl1", "ai1"]
+    assert not job_dir.host_path.exists()
+
+
+def test_age_counts_from_the_finish(tmp_path):
+    """later updates to a finished job don't restart its retention clock"""
+    job_dir = JobDir.open(tmp_path, "1")
+    job_dir.set_status(JobStatus(status="queued"))
+    assert job_dir.get_status().finished_dt is None
+    job_dir.set_status(JobStatus(status="cancelled"))
+    finished = job_dir.get_status().finished_dt
+    assert finished is not None
+    # (as though it finished two minutes ago)
+    finished -= datetime.timedelta(minutes=2)
+    job_dir.update_status(
+        lambda status: status.model_copy(update={"finished_dt": finished})
+    )
+
+    job_dir.update_status(lambda status: status.model_copy(update={"error": "x"}))
+    job_dir.set_config({"cdm_source_name": "site"})
+
+    assert job_dir.get_status().finished_dt == finished
+    report = Retention(tmp_path, RetentionPolicy(compress_after=0, max_age=60)).sweep()
+    assert report.removed == ["1"]
+
+
+def test_delete_removes_the_job(client, tmp_path):
+    """a queued job is deleted outright, with no containers to stop"""
+    job_dir = JobDir.open(tmp_path, "1")
+    job_dir.set_status(JobStatus(status="queued"))
+
+    response = client.post("/api/job/1/stop")
+    assert response.status_code == 200
+    assert response.json["status"]["status"] == "cancelled"
+
+    assert client.delete("/api/job/1").status_code == 204
+    assert not job_dir.host_path.exists()
+    assert client.delete("/api/job/1").status_code == 404
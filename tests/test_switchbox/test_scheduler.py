@@ -0,0 +1,176 @@
+"""tests for the admission-controlled job queue"""
+
+import subprocess  # nosec B404
+from concurrent.futures import ThreadPoolExecutor
+
+from switchbox.models.job import Job, JobDir, JobStatus
+from switchbox.scheduler import JobQueue
+from switchbox.utils.timeline import BOOT_ID
+
+
+class RecordingExecutor:
+    """an executor which records what is submitted to it, without running it"""
+
+    def __init__(self) -> None:
+        self.calls: list = []
+
+    def submit(self, function, *args):
+        """record a call"""
+        self.calls.append((function.__name__, *args))
+
+
+def queued_job(base, job_id, priority=0):
+    """a job in the queue"""
+    job_dir = JobDir.open(base, job_id)
+    queue = JobQueue(base, max_running=0)
+    queue.submit(type("FakeJob", (), {"job_id": job_id, "job_dir": job_dir})())
+    job_dir.update_status(
+        lambda status: status.model_copy(update={"priority": priority})
+    )
+    return job_dir
+
+
+def test_claim_respects_priority_and_order(tmp_path):
+    """higher priorities go first, then the oldest submissions"""
+    for job_id, priority in (("1", 0), ("2", 5), ("3", 0), ("4", 5)):
+        queued_job(tmp_path, job_id, priority)
+
+    assert JobQueue(tmp_path, max_running=3).claim() == ["2", "4", "1"]
+    assert JobDir.open(tmp_path, "2").get_status().status == "launching"
+    assert JobDir.open(tmp_path, "3").get_status().status == "queued"
+
+
+def test_claim_counts_running_jobs(tmp_path):
+    """running and launching jobs hold slots until they finish"""
+    JobDir.open(tmp_path, "1").set_status(
+        JobStatus(container_id="etl1", status="running")
+    )
+    queued_job(tmp_path, "2")
+    queued_job(tmp_path, "3")
+    queue = JobQueue(tmp_path, max_running=2)
+
+    assert queue.claim() == ["2"]
+    assert not queue.claim()
+
+    JobDir.open(tmp_path, "1").set_status(
+        JobStatus(container_id="etl1", status="exited", exit_code=0)
+    )
+    assert queue.claim() == ["3"]
+
+
+def test_claim_counts_created_containers(tmp_path):
+    """a container created but not yet started holds a slot, a new job doesn't"""
+    JobDir.open(tmp_path, "1").set_status(JobStatus(status="created"))
+    queued_job(tmp_path, "2")
+    queued_job(tmp_path, "3")
+    queue = JobQueue(tmp_path, max_running=2)
+    JobDir.open(tmp_path, "4").set_status(
+        JobStatus(container_id="etl4", status="created")
+    )
+
+    assert queue.claim() == ["2"]
+    assert not queue.claim()
+
+
+def dead_owner() -> str:
+    """the owner string of a process which has exited"""
+    with subprocess.Popen(["true"]) as process:
+        process.wait()
+    return f"{BOOT_ID}:{process.pid}:1"
+
+
+def test_interrupted_launch_is_requeued(tmp_path):
+    """a job left launching without a container goes back into the queue"""
+    queued_job(tmp_path, "1")
+    queue = JobQueue(tmp_path, max_running=1)
+    assert queue.claim() == ["1"]
+    # the process which was launching it has gone
+    JobDir.open(tmp_path, "1").update_status(
+        lambda status: status.model_copy(update={"owner": dead_owner()})
+    )
+
+    queue.requeue_interrupted()
+
+    assert JobDir.open(tmp_path, "1").get_status().status == "queued"
+    assert queue.claim() == ["1"]
+
+
+def test_launch_in_progress_is_left_alone(tmp_path):
+    """a launch (or validation) whose owner is still running isn't redone"""
+    executor = RecordingExecutor()
+    queue = JobQueue(tmp_path, max_running=1, executor=executor, preparer=executor)
+    queue.submit(Job.open("1", tmp_path))
+    assert [call[1] for call in executor.calls] == ["1"]
+    JobQueue(
+        tmp_path, max_running=1, preflight=True, executor=executor, preparer=executor
+    ).submit(Job.open("2", tmp_path))
+
+    queue.requeue_interrupted()
+    queue.dispatch()
+
+    assert [call[1] for call in executor.calls] == ["1", "2"]
+    assert JobDir.open(tmp_path, "1").get_status().status == "launching"
+    assert JobDir.open(tmp_path, "2").get_status().status == "validating"
+
+
+def test_preparation_is_kept_apart_from_launches(tmp_path):
+    """validations don't take up the threads which launch validated jobs"""
+    launches, preparations = RecordingExecutor(), RecordingExecutor()
+    queue = JobQueue(
+        tmp_path,
+        max_running=2,
+        preflight=True,
+        executor=launches,
+        preparer=preparations,
+    )
+    queue.submit(Job.open("1", tmp_path))
+    queued_job(tmp_path, "2")
+
+    queue.dispatch()
+
+    assert preparations.calls == [("validate", "1")]
+    assert launches.calls == [("launch", "2")]
+
+
+def test_failed_launch_is_recorded(tmp_path, monkeypatch):
+    """a launch which fails in the background leaves the job failed"""
+
+    def start(_job, native=True, vocab_dir=None):
+        raise RuntimeError(f"no docker here (native={native})")
+
+    monkeypatch.setattr(Job, "start", start)
+    executor = ThreadPoolExecutor(max_workers=1)
+    queue = JobQueue(tmp_path, max_running=1, executor=executor)
+
+    queue.submit(Job.open("1", tmp_path))
+    executor.shutdown(wait=True)
+
+    status = JobDir.open(tmp_path, "1").get_status()
+    assert status.status == "failed"
+    assert "no docker here" in status.error
+
+
+def test_submission_is_accepted_before_launch(app, client):
+    """job submission answers 202 with the queued job"""
+    app.config["MAX_CONCURRENT_ETL"] = 0
+    app.config["PREFLIGHT"] = False
+
+    response = client.post(
+        "/api/job/", data={"cdm_source_name": "alpha", "priority": "3"}
+    )
+
+    assert response.status_code == 202
+    job_id = response.json["job_id"]
+    assert response.headers["Location"].endswith(f"/api/job/{job_id}")
+    assert response.json["status"]["status"] == "queued"
+    assert response.json["status"]["priority"] == 3
+
+
+def test_date_format_follows_the_job_config(tmp_path):
+    """dates are validated in the format the etl is configured to read"""
+    job_dir = JobDir.open(tmp_path, "1")
+    queue = JobQueue(tmp_path, max_running=1)
+    assert queue.date_format(job_dir) == "DDMONYYYY"
+
+    job_dir.set_config({"date_format": "YYYY-MM-DD"})
+    assert queue.date_format(job_dir) == "YYYY-MM-DD"
@@ -0,0 +1,74 @@
+"""tests for the election of the process which runs the background services"""
+
+import time
+from types import SimpleNamespace
+
+from switchbox import __main__ as main
+from switchbox.services import LeaderLock
+
+
+def test_leader_lock_is_exclusive(tmp_path):
+    """only one holder at a time; the lock is free again once released"""
+    path = tmp_path / ".leader.lock"
+    first = LeaderLock(path, lambda: None)
+    second = LeaderLock(path, lambda: None)
+
+    assert first.try_acquire()
+    assert not second.try_acquire()
+
+    first.release()
+    assert second.try_acquire()
+    second.release()
+
+
+def test_leader_lock_hands_over(tmp_path):
+    """a waiting process takes over when the holder lets go"""
+    path = tmp_path / ".leader.lock"
+    started = []
+    first = LeaderLock(path, lambda: started.append("first"))
+    second = LeaderLock(path, lambda: started.append("second"))
+    second.poll_interval = 0.01
+
+    first.run()
+    second.start()
+    assert not second.acquired.wait(0.1)
+
+    first.release()
+    assert second.acquired.wait(5)
+    second.release()
+    assert started == ["first", "second"]
+
+
+class FakeServices:
+    """background services which only note when they are started & stopped"""
+
+    events: list = []
+
+    def __init__(self, config) -> None:
+        self.config = config
+
+    def start(self):
+        """note the start"""
+        self.events.append("start")
+
+    def stop(self):
+        """note the stop"""
+        self.events.append("stop")
+
+
+def test_flask_reloader_parent_runs_no_services(tmp_path, monkeypatch):
+    """with the debug reloader only the serving child runs the services"""
+    monkeypatch.setattr(main, "BackgroundServices", FakeServices)
+    monkeypatch.setattr(FakeServices, "events", [])
+    app = SimpleNamespace(run=lambda **kwargs: None)
+    config = SimpleNamespace(job_dir=tmp_path, debug=True)
+
+    monkeypatch.delenv("WERKZEUG_RUN_MAIN", raising=False)
+    main.serve_flask(app, config)
+    assert not FakeServices.events
+
+    monkeypatch.setenv("WERKZEUG_RUN_MAIN", "true")
+    # (the leader lock is taken in the background, before the app is served)
+    app.run = lambda **kwargs: time.sleep(0.2)
+    main.serve_flask(app, config)
+    assert FakeServices.events == ["start", "stop"]
@@ -0,0 +1,66 @@
+"""tests for the in-process job supervisor"""
+
+from switchbox.models.job import JobDir, JobStatus, StageStatus
+from switchbox.supervisor import JobSupervisor
+
+
+class FakeCompose:
+    """records the services it is asked to run"""
+
+    docker = None
+
+    def __init__(self):
+        self.runs = []
+
+    def run(self, service, **kwargs):
+        """record the run and answer with a container id"""
+        self.runs.append((service, kwargs))
+
+        class Result:  # pylint: disable=too-few-public-methods
+            """stand-in for subprocess.CompletedProcess"""
+
+            stdout = "ares123\n"
+
+        return Result()
+
+
+def finished_job(base, job_id, exit_code):
+    """a job whose etl has exited and whose aresindexer is waiting"""
+    job_dir = JobDir.open(base, job_id)
+    job_dir.set_status(
+        JobStatus(
+            container_id="etl1",
+            status="exited",
+            exit_code=exit_code,
+            aresindexer=StageStatus(),
+        )
+    )
+    return job_dir
+
+
+def test_successful_etl_launches_aresindexer(tmp_path):
+    """an etl exiting 0 gets its aresindexer launched and recorded"""
+    job_dir = finished_job(tmp_path, "1", 0)
+    compose = FakeCompose()
+    supervisor = JobSupervisor(tmp_path, native=False, compose=compose)
+
+    supervisor.job_changed("1")
+    supervisor.stop()
+
+    assert compose.runs[0][0] == "aresindexer"
+    stage = job_dir.get_status().aresindexer
+    assert stage.status == "created"
+    assert stage.container_id == "ares123"
+
+
+def test_failed_etl_skips_aresindexer(tmp_path):
+    """an etl exiting non-zero does not get an aresindexer run"""
+    job_dir = finished_job(tmp_path, "2", 1)
+    compose = FakeCompose()
+    supervisor = JobSupervisor(tmp_path, native=False, compose=compose)
+
+    supervisor.reconciled()
+    supervisor.stop()
+
+    assert not compose.runs
+    assert job_dir.get_status().aresindexer.status == "skipped"
@@ -0,0 +1,90 @@
+"""tests for the phase timelines of jobs"""
+
+import datetime
+from functools import partial
+
+from switchbox.models.job import JobDir, JobStatus, StageStatus
+from switchbox.utils.timeline import percentile
+
+
+def set_fields(current: JobStatus, **values) -> JobStatus:
+    """a status change setting the given fields"""
+    return current.model_copy(update=values)
+
+
+def run_job(base, job_id: str, started: datetime.datetime) -> JobDir:
+    """take a job through its phases, from upload to the end of its aresindexer"""
+    job_dir = JobDir.open(base, job_id)
+    job_dir.timeline().record("upload")
+    job_dir.update_status(partial(set_fields, status="queued"))
+    job_dir.update_status(partial(set_fields, status="launching"))
+    job_dir.update_status(partial(set_fields, launch_step="creating the container"))
+    job_dir.update_status(
+        partial(
+            set_fields,
+            status="running",
+            container_id="etl1",
+            launch_step="",
+            start_dt=started,
+            aresindexer=StageStatus(),
+        )
+    )
+    # an unrelated change is no new phase
+    job_dir.update_status(partial(set_fields, priority=1))
+    job_dir.update_status(
+        partial(
+            set_fields,
+            status="exited",
+            exit_code=0,
+            exit_dt=started + datetime.timedelta(seconds=5),
+        )
+    )
+    job_dir.update_status(
+        partial(set_fields, aresindexer=StageStatus(status="skipped"))
+    )
+    return job_dir
+
+
+def test_status_changes_are_recorded_as_phases(tmp_path):
+    """each phase is recorded once, with docker's times for the etl run"""
+    started = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(
+        seconds=60
+    )
+    spans = run_job(tmp_path, "1", started).timeline().spans()
+
+    assert [span.phase for span in spans] == [
+        "upload",
+        "queued",
+        "launching",
+        "launching: creating the container",
+        "etl",
+        "etl exited",
+        "finished",
+    ]
+    etl = spans[4]
+    assert etl.start == started
+    assert abs(etl.seconds - 5) < 0.01
+    assert spans[-1].seconds is None
+
+
+def test_phase_stats_endpoint(app, client):
+    """percentiles are reported per phase across the recent jobs, and per job"""
+    started = datetime.datetime.now(datetime.timezone.utc)
+    run_job(app.config["JOB_DIR"], "1", started - datetime.timedelta(seconds=60))
+    run_job(app.config["JOB_DIR"], "2", started - datetime.timedelta(seconds=30))
+
+    body = client.get("/api/job/timeline").get_json()
+
+    phases = {item["phase"]: item for item in body["phases"]}
+    assert phases["etl"]["count"] == 2
+    assert abs(phases["etl"]["p50"] - 5) < 0.01
+    assert "finished" not in phases
+    detail = client.get("/api/job/1").get_json()
+    assert detail["timeline"][0]["phase"] == "upload"
+
+
+def test_percentile_interpolates():
+    """percentiles fall between the nearest values"""
+    assert percentile([1, 2, 3, 4], 0.5) == 2.5
+    assert percentile([1, 2, 3, 4], 1) == 4
+    assert percentile([7], 0.9) == 7
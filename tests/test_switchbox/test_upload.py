@@ -0,0 +1,94 @@
+"""tests for streaming multipart ingestion"""
+
+import hashlib
+import io
+
+import pytest
+
+from switchbox.utils.upload import UploadError, ingest_multipart
+
+BOUNDARY = b"testboundary"
+
+
+def multipart_body(fields, files) -> bytes:
+    """build a multipart/form-data body"""
+    body = b""
+    for name, value in fields.items():
+        body += (
+            b"--" + BOUNDARY + b"\r\n"
+            b'Content-Disposition: form-data; name="'
+            + name.encode()
+            + b'"\r\n\r\n'
+            + value.encode()
+            + b"\r\n"
+        )
+    for name, content in files.items():
+        body += (
+            b"--" + BOUNDARY + b"\r\n"
+            b'Content-Disposition: form-data; name="' + name.encode() + b'"; '
+            b'filename="' + name.encode() + b'.csv"\r\n'
+            b"Content-Type: text/csv\r\n\r\n" + content + b"\r\n"
+        )
+    return body + b"--" + BOUNDARY + b"--\r\n"
+
+
+def test_ingest_writes_hashes_and_counts(tmp_path):
+    """csv parts land in the data dir with their hash and row count"""
+    content = b"patient_id;date_visit\n1;01-01-2020\n2;02-01-2020\n"
+    body = multipart_body({"input_delimiter": ";"}, {"visits": content})
+
+    fields, files = ingest_multipart(
+        io.BytesIO(body), BOUNDARY, tmp_path, {"visits": ["patient_id", "date_visit"]}
+    )
+
+    assert fields == {"input_delimiter": ";"}
+    assert (tmp_path / "visits.csv").read_bytes() == content
+    assert files[0].sha256 == hashlib.sha256(content).hexdigest()
+    assert files[0].rows == 2
+    assert files[0].size == len(content)
+    assert files[0].delimiter == ";"
+
+
+def test_ingest_rejects_bad_header(tmp_path):
+    """a csv missing a configured column is rejected and not left on disk"""
+    body = multipart_body({}, {"visits": b"patient_id,other\n1,2\n"})
+
+    with pytest.raises(UploadError) as excinfo:
+        ingest_multipart(
+            io.BytesIO(body),
+            BOUNDARY,
+            tmp_path,
+            {"visits": ["patient_id", "date_visit"]},
+        )
+
+    assert excinfo.value.param_name == "visits"
+    assert "date_visit" in str(excinfo.value)
+    assert not (tmp_path / "visits.csv").exists()
+
+
+@pytest.mark.parametrize("cut", [40, -30])
+def test_ingest_rejects_truncated_body(tmp_path, cut):
+    """a body cut short is rejected rather than failing the request"""
+    body = multipart_body({}, {"visits": b"patient_id,date_visit\n1,2\n"})
+
+    with pytest.raises(UploadError):
+        ingest_multipart(
+            io.BytesIO(body[:cut]),
+            BOUNDARY,
+            tmp_path,
+            {"visits": ["patient_id", "date_visit"]},
+        )
+    assert not (tmp_path / "visits.csv").exists()
+
+
+def test_malformed_upload_leaves_no_job(client):
+    """a malformed upload is a 400, and leaves no job behind"""
+    body = multipart_body({"cdm_source_name": "alpha"}, {})[:-12] + b"\r\n\r\ngarbage"
+    response = client.post(
+        "/api/job/",
+        data=body,
+        content_type=f"multipart/form-data; boundary={BOUNDARY.decode()}",
+    )
+
+    assert response.status_code == 400
+    assert client.get("/api/job/").get_json()["jobs"] == []
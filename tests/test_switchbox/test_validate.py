@@ -0,0 +1,91 @@
+"""tests for the pre-flight validation of input files"""
+
+from switchbox.models.job import InputFile
+from switchbox.utils.validate import validate_file, validate_inputs
+
+COLUMNS = ["patient_id", "date_visit", "sex"]
+
+
+def write_csv(tmp_path, name, content, encoding="utf-8"):
+    """write an input file and return its path"""
+    path = tmp_path / f"{name}.csv"
+    path.write_bytes(content.encode(encoding))
+    return str(path)
+
+
+def test_valid_file_passes(tmp_path):
+    """a well-formed file has no errors, and its rows are counted"""
+    path = write_csv(
+        tmp_path, "patient", "patient_id;date_visit;sex\n1;2020-01-31;F\n2;;M\n"
+    )
+
+    report = validate_file("patient", path, COLUMNS, ";", date_format="YYYY-MM-DD")
+
+    assert report.ok, report.errors
+    assert report.rows == 2
+    assert report.encoding == "utf_8"
+
+
+def test_problems_are_reported(tmp_path):
+    """the wrong delimiter, short rows and dates in another format are errors"""
+    path = write_csv(
+        tmp_path,
+        "patient",
+        "patient_id,date_visit,sex\n"
+        "1,31/01/2020,F\n"
+        "2,2020-02-01,M\n"
+        "3,31/02/2020\n"
+        "4,45/13/2020,M\n",
+        encoding="latin-1",
+    )
+
+    report = validate_file("patient", path, COLUMNS, ";", date_format="DD/MM/YYYY")
+
+    assert not report.ok
+    assert report.delimiter == ","
+    assert any("delimited by ','" in error for error in report.errors)
+    assert any("1 row(s) don't have 3 fields (lines 4)" in e for e in report.errors)
+    assert any(
+        error.startswith("column date_visit: 2 value(s)") for error in report.errors
+    )
+
+
+def test_inputs_are_validated_in_the_process_pool(tmp_path):
+    """every csv param gets a report; missing files are a warning"""
+    good = write_csv(tmp_path, "patient", "patient_id;date_visit;sex\n1;2020-01-31;F\n")
+    inputs = [
+        InputFile(
+            param_name="patient",
+            filename="p.csv",
+            path=good,
+            sha256="",
+            size=0,
+            rows=1,
+        )
+    ]
+
+    report = validate_inputs(
+        inputs, {"patient": COLUMNS, "mri": None}, ";", date_format="YYYY-MM-DD"
+    )
+
+    assert report.ok
+    assert [f.param_name for f in report.files] == ["patient", "mri"]
+    assert report.files[1].warnings == ["no file was uploaded"]
+
+
+def test_dates_in_the_etl_format(tmp_path):
+    """by default dates are expected in the etl's format, e.g. 31DEC2023"""
+    path = write_csv(
+        tmp_path,
+        "patient",
+        "patient_id;date_visit;sex\n1;31DEC2023;F\n2;1jan2024;M\n3;2024-01-02;M\n",
+    )
+
+    report = validate_file("patient", path, COLUMNS, ";")
+
+    assert report.errors == [
+        "column date_visit: 1 value(s) are not dates in the configured format "
+        "(DDMONYYYY): line 4: '2024-01-02'"
+    ]
+    report = validate_file("patient", path, COLUMNS, ";", date_format="YYYY-MM-DD")
+    assert report.errors[0].startswith("column date_visit: 2 value(s)")
@@ -0,0 +1,72 @@
+"""tests for tracking the vocabulary loaded in the cdmdb"""
+
+import os
+
+from switchbox import vocab
+from switchbox.models.job import JobStatus, get_catalog
+from switchbox.supervisor import JobSupervisor
+
+
+def test_fingerprint_only_hashes_changed_files(tmp_path, monkeypatch):
+    """unchanged files are not read again, changed ones change the fingerprint"""
+    vocab_dir = tmp_path / "vocab"
+    vocab_dir.mkdir()
+    (vocab_dir / "CONCEPT.csv").write_text("concept_id\n1\n", encoding="utf-8")
+    (vocab_dir / "VOCABULARY.csv").write_text("vocabulary_id\nx\n", encoding="utf-8")
+    hashed = []
+    file_sha256 = vocab.file_sha256
+    monkeypatch.setattr(
+        vocab, "file_sha256", lambda path: hashed.append(path.name) or file_sha256(path)
+    )
+
+    first = vocab.vocab_fingerprint(tmp_path, vocab_dir)
+    assert first.startswith("dir:")
+    assert sorted(hashed) == ["CONCEPT.csv", "VOCABULARY.csv"]
+
+    hashed.clear()
+    assert vocab.vocab_fingerprint(tmp_path, vocab_dir) == first
+    assert not hashed
+
+    concept = vocab_dir / "CONCEPT.csv"
+    concept.write_text("concept_id\n2\n", encoding="utf-8")
+    os.utime(concept, ns=(1, 1))
+    assert vocab.vocab_fingerprint(tmp_path, vocab_dir) != first
+    assert hashed == ["CONCEPT.csv"]
+
+
+def test_forced_reload_records_the_vocabulary(tmp_path):
+    """a reload forced by the job's config still records what it loads"""
+    catalog = get_catalog(tmp_path)
+    vocab.set_loaded_vocab(catalog, "dir:a")
+
+    assert vocab.decide_reload(catalog, "dir:a") == ("dir:a", False)
+    assert vocab.decide_reload(catalog, "dir:b") == ("dir:b", True)
+    assert vocab.decide_reload(catalog, "dir:a", forced="1") == ("dir:a", True)
+    # the cdmdb's vocabulary is left as it is, whatever the directory holds
+    assert vocab.decide_reload(catalog, "dir:b", forced="False") == ("", False)
+    assert vocab.decide_reload(catalog, "") == ("", None)
+
+    fingerprint, reload_vocab = vocab.decide_reload(catalog, "dir:b", forced="true")
+    JobSupervisor(tmp_path).track_vocab(
+        JobStatus(exit_code=0, vocab_fingerprint=fingerprint, reload_vocab=reload_vocab)
+    )
+    assert vocab.loaded_vocab(catalog) == "dir:b"
+
+
+def test_etl_exit_records_the_loaded_vocabulary(tmp_path):
+    """a successful etl loaded its vocabulary; a failed reload leaves it unknown"""
+    supervisor = JobSupervisor(tmp_path)
+    catalog = get_catalog(tmp_path)
+
+    supervisor.track_vocab(JobStatus(exit_code=0, vocab_fingerprint="dir:a"))
+    assert vocab.loaded_vocab(catalog) == "dir:a"
+
+    supervisor.track_vocab(
+        JobStatus(exit_code=1, vocab_fingerprint="dir:b", reload_vocab=False)
+    )
+    assert vocab.loaded_vocab(catalog) == "dir:a"
+
+    supervisor.track_vocab(
+        JobStatus(exit_code=1, vocab_fingerprint="dir:b", reload_vocab=True)
+    )
+    assert vocab.loaded_vocab(catalog) == ""
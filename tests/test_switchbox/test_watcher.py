@@ -0,0 +1,112 @@
+"""tests for the docker events status watcher"""
+
+from docker.errors import NotFound
+
+from switchbox.compose import SERVICE_LABEL
+from switchbox.models.job import JOB_ID_LABEL, JobDir, JobStatus, get_catalog
+from switchbox.watcher import StatusWatcher
+
+
+class FakeAPI:
+    """stand-in for docker.APIClient with canned inspections"""
+
+    def __init__(self, states):
+        self.states = states
+
+    def containers(self, **_kwargs):
+        """the canned containers, as listed by docker"""
+        return [
+            {"Id": container_id, "State": state["Status"]}
+            for container_id, state in self.states.items()
+        ]
+
+    def inspect_container(self, container_id):
+        """the canned state of a container"""
+        if container_id not in self.states:
+            raise NotFound(container_id)
+        return {"State": self.states[container_id]}
+
+
+class FakeClient:
+    """stand-in for docker.DockerClient"""
+
+    def __init__(self, states):
+        self.api = FakeAPI(states)
+
+
+def test_die_event_updates_job_status(tmp_path):
+    """a die event for a labelled etl container marks the job exited"""
+    job_dir = JobDir.open(tmp_path, "1")
+    job_dir.set_status(JobStatus(container_id="abc123", status="running"))
+    client = FakeClient(
+        {
+            "abc123": {
+                "Status": "exited",
+                "ExitCode": 3,
+                "StartedAt": "2024-06-01T12:00:00.123456789Z",
+                "FinishedAt": "2024-06-01T13:00:00Z",
+            }
+        }
+    )
+    watcher = StatusWatcher(tmp_path, docker_client=client)
+
+    watcher.handle_event(
+        {
+            "Action": "die",
+            "Actor": {
+                "ID": "abc123",
+                "Attributes": {SERVICE_LABEL: "etl", JOB_ID_LABEL: "1"},
+            },
+        }
+    )
+
+    status = job_dir.get_status()
+    assert status.status == "exited"
+    assert status.exit_code == 3
+    assert get_catalog(tmp_path).list_jobs()[0]["status"] == "exited"
+
+
+def test_reconcile_handles_removed_containers(tmp_path):
+    """reconciliation survives containers which no longer exist"""
+    JobDir.open(tmp_path, "2").set_status(
+        JobStatus(container_id="gone", status="running")
+    )
+    watcher = StatusWatcher(tmp_path, docker_client=FakeClient({}))
+
+    watcher.reconcile()
+
+    assert JobDir.open(tmp_path, "2").get_status().status == "running"
+
+
+def test_reconcile_only_inspects_changed_containers(tmp_path):
+    """the bulk refresh skips containers whose state matches the saved status"""
+    JobDir.open(tmp_path, "3").set_status(
+        JobStatus(container_id="aaa", status="running")
+    )
+    JobDir.open(tmp_path, "4").set_status(
+        JobStatus(container_id="bbb", status="running")
+    )
+    client = FakeClient(
+        {
+            "aaa": {
+                "Status": "running",
+                "ExitCode": 0,
+                "StartedAt": "2024-06-01T12:00:00Z",
+                "FinishedAt": "0001-01-01T00:00:00Z",
+            },
+            "bbb": {
+                "Status": "exited",
+                "ExitCode": 0,
+                "StartedAt": "2024-06-01T12:00:00Z",
+                "FinishedAt": "2024-06-01T14:00:00Z",
+            },
+        }
+    )
+    inspected = []
+    original = client.api.inspect_container
+    client.api.inspect_container = lambda cid: inspected.append(cid) or original(cid)
+
+    StatusWatcher(tmp_path, docker_client=client).reconcile()
+
+    assert inspected == ["bbb"]
+    assert JobDir.open(tmp_path, "4").get_status().status == "exited"